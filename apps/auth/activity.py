@@ -0,0 +1,96 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""auth.activity -- Track the last IP and last seen time for users.
+
+We want to know this for every request, but we don't want to write to the
+CustomUser table on every request.  Calling CustomUser.save() would also be
+overkill, since it rewrites the entire row and fires the post_save handlers.
+
+Instead we buffer the changes with a BufferedWriter and apply them in the
+background with UPDATE statements that only touch a single column.  Updates
+for the same user get merged, so each user gets at most one update per flush.
+last_seen is only updated once every LAST_SEEN_RESOLUTION.
+"""
+
+import datetime
+from collections import defaultdict
+
+from auth.models import CustomUser
+from utils.buffered_writer import BufferedWriter
+
+LAST_SEEN_RESOLUTION = datetime.timedelta(minutes=15)
+UPDATE_CHUNK_SIZE = 500
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in xrange(0, len(ids), UPDATE_CHUNK_SIZE):
+        yield ids[i:i+UPDATE_CHUNK_SIZE]
+
+class UserActivityWriter(BufferedWriter):
+    """Writes last_ip/last_seen updates.
+
+    Items are (user_id, ip, seen) tuples.  ip and seen can be None if they
+    don't need to be updated.
+    """
+    def new_batch(self):
+        return {}
+
+    def add_to_batch(self, batch, item):
+        user_id, ip, seen = item
+        current_ip, current_seen = batch.get(user_id, (None, None))
+        batch[user_id] = (ip or current_ip, seen or current_seen)
+
+    def write(self, batch):
+        ip_updates = defaultdict(list)
+        seen_updates = defaultdict(list)
+        for user_id, (ip, seen) in batch.items():
+            if ip is not None:
+                ip_updates[ip].append(user_id)
+            if seen is not None:
+                # group seen updates by minute so that we can update many
+                # users with a single statement
+                seen_updates[seen.replace(second=0, microsecond=0)].append(
+                    user_id)
+        for ip, user_ids in ip_updates.items():
+            for chunk in _chunks(user_ids):
+                CustomUser.objects.filter(pk__in=chunk).update(last_ip=ip)
+        for seen, user_ids in seen_updates.items():
+            for chunk in _chunks(user_ids):
+                CustomUser.objects.filter(pk__in=chunk).update(last_seen=seen)
+
+writer = UserActivityWriter('user-activity')
+
+def record(user, ip=None):
+    """Record that we've seen a user, possibly from a new IP address.
+
+    The user object gets updated right away, the DB gets updated in the
+    background.
+    """
+    now = datetime.datetime.now()
+    if ip is not None and ip != user.last_ip:
+        user.last_ip = ip
+    else:
+        ip = None
+    if (user.last_seen is None or
+        now - user.last_seen >= LAST_SEEN_RESOLUTION):
+        user.last_seen = seen = now
+    else:
+        seen = None
+    if ip is not None or seen is not None:
+        writer.add((user.pk, ip, seen))
@@ -0,0 +1,120 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""auth.awards -- Give out award points in the background.
+
+Users get an Awards object (and its points) the first time they do one of the
+things in Awards.TYPE_CHOICES.  Checking for that used to happen inside the
+post_save handlers for comments and subtitle versions, which meant extra
+queries in the middle of saving subtitles.
+
+Now the handlers just record the event with an AwardsWriter.  Events get
+deduplicated in memory, and each flush gives out the awards with a handful of
+queries no matter how many events there were:
+
+    - 1 query to find out which languages are original languages
+    - 1 query to find the awards that users already have
+    - 1 bulk insert for the new awards
+    - 1 update per distinct point total to add the points to the users
+"""
+
+from collections import defaultdict
+
+from django.db.models import F
+
+from auth.models import Awards, CustomUser
+from utils.buffered_writer import BufferedWriter
+
+class AwardsWriter(BufferedWriter):
+    """Gives out awards in the background.
+
+    Items are (user_id, type, language_id, first_version) tuples.  For
+    comment events type is Awards.COMMENT.  For subtitle version events type
+    is None, since it depends on whether the language is the original one,
+    which we look up when writing.
+    """
+    def new_batch(self):
+        return set()
+
+    def add_to_batch(self, batch, item):
+        batch.add(item)
+
+    def write(self, batch):
+        wanted = self.calc_awards(batch)
+        if not wanted:
+            return
+        user_ids = set(user_id for user_id, type in wanted)
+        types = set(type for user_id, type in wanted)
+        existing = set(Awards.objects
+                       .filter(user__in=user_ids, type__in=types)
+                       .values_list('user_id', 'type'))
+        new_awards = wanted - existing
+        if not new_awards:
+            return
+        Awards.objects.bulk_create([
+            Awards(user_id=user_id, type=type, points=Awards.POINTS[type])
+            for user_id, type in new_awards
+        ])
+        points = defaultdict(int)
+        for user_id, type in new_awards:
+            points[user_id] += Awards.POINTS[type]
+        users_by_points = defaultdict(list)
+        for user_id, user_points in points.items():
+            users_by_points[user_points].append(user_id)
+        for user_points, user_ids in users_by_points.items():
+            CustomUser.objects.filter(pk__in=user_ids).update(
+                award_points=F('award_points') + user_points)
+
+    def calc_awards(self, batch):
+        """Calculate the set of (user_id, type) awards for a batch."""
+        from videos.models import SubtitleLanguage
+
+        language_ids = set(language_id for (user_id, type, language_id, first)
+                           in batch if type is None)
+        if language_ids:
+            is_original = dict(SubtitleLanguage.objects
+                               .filter(pk__in=language_ids)
+                               .values_list('id', 'is_original'))
+        else:
+            is_original = {}
+        wanted = set()
+        for user_id, type, language_id, first_version in batch:
+            if type is None:
+                if language_id not in is_original:
+                    # language was deleted before we got to it
+                    continue
+                if first_version:
+                    if is_original[language_id]:
+                        type = Awards.START_SUBTITLES
+                    else:
+                        type = Awards.START_TRANSLATION
+                else:
+                    if is_original[language_id]:
+                        type = Awards.EDIT_SUBTITLES
+                    else:
+                        type = Awards.EDIT_TRANSLATION
+            wanted.add((user_id, type))
+        return wanted
+
+writer = AwardsWriter('awards')
+
+def record_comment(user_id):
+    writer.add((user_id, Awards.COMMENT, None, False))
+
+def record_version(user_id, language_id, first_version):
+    writer.add((user_id, None, language_id, bool(first_version)))
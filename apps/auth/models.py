@@ -31,7 +31,6 @@ except ImportError:
     sha1 = sha.sha
 from django.utils.translation import ugettext_lazy as _, ugettext
 from django.utils.http import urlquote
-from django.core.exceptions import MultipleObjectsReturned
 from utils.amazon import S3EnabledImageField
 from datetime import datetime, timedelta
 from django.core.cache import cache
@@ -53,6 +52,52 @@ from utils.tasks import send_templated_email_async
 ALL_LANGUAGES = [(val, _(name))for val, name in settings.ALL_LANGUAGES]
 EMAIL_CONFIRMATION_DAYS = getattr(settings, 'EMAIL_CONFIRMATION_DAYS', 3)
 
+def _add_through_rows(through, from_field, to_field, pairs):
+    """Add rows to an m2m through table, skipping ones that already exist.
+
+    pairs is an iterable of (from_id, to_id) tuples.  Returns the pairs that
+    were actually added.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return pairs
+    from_ids = set(from_id for from_id, to_id in pairs)
+    to_ids = set(to_id for from_id, to_id in pairs)
+    existing = set(through.objects.filter(**{
+        from_field + '__in': from_ids,
+        to_field + '__in': to_ids,
+    }).values_list(from_field + '_id', to_field + '_id'))
+    added = pairs - existing
+    through.objects.bulk_create([
+        through(**{from_field + '_id': from_id, to_field + '_id': to_id})
+        for from_id, to_id in added
+    ])
+    return added
+
+def _remove_through_rows(through, from_field, to_field, pairs):
+    """Remove rows from an m2m through table.
+
+    Returns the pairs that were actually removed.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return pairs
+    from_ids = set(from_id for from_id, to_id in pairs)
+    to_ids = set(to_id for from_id, to_id in pairs)
+    rows = through.objects.filter(**{
+        from_field + '__in': from_ids,
+        to_field + '__in': to_ids,
+    }).values_list('id', from_field + '_id', to_field + '_id')
+    removed = set()
+    row_ids = []
+    for row_id, from_id, to_id in rows:
+        if (from_id, to_id) in pairs:
+            removed.add((from_id, to_id))
+            row_ids.append(row_id)
+    if row_ids:
+        through.objects.filter(id__in=row_ids).delete()
+    return removed
+
 class CustomUser(BaseUser):
     AUTOPLAY_ON_BROWSER = 1
     AUTOPLAY_ON_LANGUAGES = 2
@@ -80,6 +125,9 @@ class CustomUser(BaseUser):
         choices=AUTOPLAY_CHOICES, default=AUTOPLAY_ON_BROWSER)
     award_points = models.IntegerField(default=0)
     last_ip = models.IPAddressField(blank=True, null=True)
+    # last time we saw a request from this user.  This only gets updated
+    # every so often, see auth.activity
+    last_seen = models.DateTimeField(blank=True, null=True)
     # videos witch are related to user. this is for quicker queries
     videos = models.ManyToManyField('videos.Video', blank=True)
     # for some login backends we end up with a full name but not
@@ -148,72 +196,124 @@ class CustomUser(BaseUser):
 
     def unread_messages_count(self, hidden_meassage_id=None):
         if not hasattr(self, '_unread_messages_count'):
-            self._unread_messages_count = self.unread_messages(hidden_meassage_id=hidden_meassage_id).count()
+            from messages import unread
+            self._unread_messages_count = unread.count(self, hidden_meassage_id)
         return self._unread_messages_count
 
     @classmethod
-    def video_followers_change_handler(cls, sender, instance, action, reverse, model, pk_set, **kwargs):
-        from videos.models import SubtitleLanguage
+    def follow_videos(cls, pairs):
+        """Make users follow videos.
 
-        if reverse and action == 'post_add':
-            #instance is User
-            for video_pk in pk_set:
-                cls.videos.through.objects.get_or_create(video__pk=video_pk, customuser=instance, defaults={'video_id': video_pk})
-        elif reverse and action == 'post_remove':
-            #instance is User
-            for video_pk in pk_set:
-                if not SubtitleLanguage.objects.filter(followers=instance, video__pk=video_pk).exists():
-                    instance.videos.remove(video_pk)
-        elif not reverse and action == 'post_add':
-            #instance is Video
-            for user_pk in pk_set:
-                cls.videos.through.objects.get_or_create(video=instance, customuser__pk=user_pk, defaults={'customuser_id': user_pk})
-        elif not reverse and action == 'post_remove':
-            #instance is Video
-            for user_pk in pk_set:
-                if not SubtitleLanguage.objects.filter(followers__pk=user_pk, video=instance).exists():
-                    instance.customuser_set.remove(user_pk)
-        elif reverse and action == 'post_clear':
-            #instance is User
-            cls.videos.through.objects.filter(customuser=instance) \
-                .exclude(video__subtitlelanguage__followers=instance).delete()
-        elif not reverse and action == 'post_clear':
-            #instance is Video
-            cls.videos.through.objects.filter(video=instance) \
-                .exclude(customuser__followed_languages__video=instance).delete()
+        pairs is an iterable of (user_id, video_id) tuples.  We check which
+        ones already exist with a single query and add the rest with a single
+        bulk insert.
+
+        Returns the set of pairs that were added.
+        """
+        added = _add_through_rows(cls.videos.through, 'customuser', 'video',
+                                  pairs)
+        from videos import timelines
+        timelines.follow_videos(added)
+        return added
 
     @classmethod
-    def sl_followers_change_handler(cls, sender, instance, action, reverse, model, pk_set, **kwargs):
+    def unfollow_videos(cls, pairs):
+        """Make users stop following videos.
+
+        pairs is an iterable of (user_id, video_id) tuples.  Users still
+        follow a video if they follow it directly, or if they follow one of
+        its languages, so we don't remove those pairs.
+
+        Returns the set of pairs that were removed.
+        """
         from videos.models import Video, SubtitleLanguage
 
-        if reverse and action == 'post_add':
-            #instance is User
-            for sl_pk in pk_set:
-                sl = SubtitleLanguage.objects.get(pk=sl_pk)
-                cls.videos.through.objects.get_or_create(video=sl.video, customuser=instance)
-        elif reverse and action == 'post_remove':
-            #instance is User
-            for sl_pk in pk_set:
-                if not Video.objects.filter(followers=instance, subtitlelanguage__pk=sl_pk).exists():
-                    sl = SubtitleLanguage.objects.get(pk=sl_pk)
-                    instance.videos.remove(sl.video)
-        elif not reverse and action == 'post_add':
-            #instance is SubtitleLanguage
-            for user_pk in pk_set:
-                cls.videos.through.objects.get_or_create(video=instance.video, customuser__pk=user_pk, defaults={'customuser_id': user_pk})
-        elif not reverse and action == 'post_remove':
-            #instance is SubtitleLanguage
-            for user_pk in pk_set:
-                if not Video.objects.filter(followers__pk=user_pk, subtitlelanguage=instance).exists():
-                    instance.video.customuser_set.remove(user_pk)
-        elif reverse and action == 'post_clear':
-            #instance is User
-            cls.videos.through.objects.filter(customuser=instance) \
-                .exclude(video__subtitlelanguage__followers=instance).delete()
-        elif not reverse and action == 'post_clear':
-            #instance is SubtitleLanguage
-            cls.videos.through.objects.filter(video=instance) \
-                .exclude(customuser__followed_languages__video=instance.video).delete()
+        pairs = set(pairs)
+        if not pairs:
+            return pairs
+        user_ids = set(user_id for user_id, video_id in pairs)
+        video_ids = set(video_id for user_id, video_id in pairs)
+        still_following = set(Video.followers.through.objects
+                              .filter(customuser__in=user_ids,
+                                      video__in=video_ids)
+                              .values_list('customuser_id', 'video_id'))
+        still_following.update(SubtitleLanguage.followers.through.objects
+                               .filter(customuser__in=user_ids,
+                                       subtitlelanguage__video__in=video_ids)
+                               .values_list('customuser_id',
+                                            'subtitlelanguage__video'))
+        removed = _remove_through_rows(cls.videos.through, 'customuser',
+                                       'video', pairs - still_following)
+        from videos import timelines
+        timelines.unfollow_videos(removed)
+        return removed
+
+    @classmethod
+    def follow_languages(cls, pairs):
+        """Make users follow subtitle languages.
+
+        pairs is an iterable of (user_id, subtitle_language_id) tuples for
+        subtitles.models.SubtitleLanguage.  Like follow_videos(), this uses a
+        single query and a single bulk insert.
+
+        Returns the set of pairs that were added.
+        """
+        from subtitles.models import SubtitleLanguage
+        return _add_through_rows(SubtitleLanguage.followers.through,
+                                 'customuser', 'subtitlelanguage', pairs)
+
+    @classmethod
+    def _followed_video_pairs(cls, **filters):
+        return cls.videos.through.objects.filter(**filters).values_list(
+            'customuser_id', 'video_id')
+
+    @classmethod
+    def video_followers_change_handler(cls, sender, instance, action, reverse, model, pk_set, **kwargs):
+        if action in ('post_add', 'post_remove'):
+            if reverse:
+                #instance is User
+                pairs = [(instance.pk, video_pk) for video_pk in pk_set]
+            else:
+                #instance is Video
+                pairs = [(user_pk, instance.pk) for user_pk in pk_set]
+            if action == 'post_add':
+                cls.follow_videos(pairs)
+            else:
+                cls.unfollow_videos(pairs)
+        elif action == 'post_clear':
+            if reverse:
+                #instance is User
+                pairs = cls._followed_video_pairs(customuser=instance)
+            else:
+                #instance is Video
+                pairs = cls._followed_video_pairs(video=instance)
+            cls.unfollow_videos(pairs)
+
+    @classmethod
+    def sl_followers_change_handler(cls, sender, instance, action, reverse, model, pk_set, **kwargs):
+        from videos.models import SubtitleLanguage
+
+        if action in ('post_add', 'post_remove'):
+            if reverse:
+                #instance is User
+                video_pks = (SubtitleLanguage.objects.filter(pk__in=pk_set)
+                             .values_list('video_id', flat=True))
+                pairs = [(instance.pk, video_pk) for video_pk in video_pks]
+            else:
+                #instance is SubtitleLanguage
+                pairs = [(user_pk, instance.video_id) for user_pk in pk_set]
+            if action == 'post_add':
+                cls.follow_videos(pairs)
+            else:
+                cls.unfollow_videos(pairs)
+        elif action == 'post_clear':
+            if reverse:
+                #instance is User
+                pairs = cls._followed_video_pairs(customuser=instance)
+            else:
+                #instance is SubtitleLanguage
+                pairs = cls._followed_video_pairs(video=instance.video_id)
+            cls.unfollow_videos(pairs)
 
     def get_languages(self):
         """
@@ -351,19 +451,16 @@ class Awards(models.Model):
     user = models.ForeignKey(CustomUser, null=True)
     created = models.DateTimeField(auto_now_add=True)
 
+    POINTS = {
+        COMMENT: 10,
+        START_SUBTITLES: 100,
+        START_TRANSLATION: 100,
+        EDIT_SUBTITLES: 50,
+        EDIT_TRANSLATION: 50,
+    }
+
     def _set_points(self):
-        if self.type == self.COMMENT:
-            self.points = 10
-        elif self.type == self.START_SUBTITLES:
-            self.points = 100
-        elif self.type == self.START_TRANSLATION:
-            self.points = 100
-        elif self.type == self.EDIT_SUBTITLES:
-            self.points = 50
-        elif self.type == self.EDIT_TRANSLATION:
-            self.points = 50
-        else:
-            self.points = 0
+        self.points = self.POINTS.get(self.type, 0)
 
     def save(self, *args, **kwrags):
         self.points or self._set_points()
@@ -371,33 +468,22 @@ class Awards(models.Model):
             CustomUser.objects.filter(pk=self.user.pk).update(award_points=models.F('award_points')+self.points)
         return super(Awards, self).save(*args, **kwrags)
 
+    # The signal handlers don't touch the DB.  They record the event with
+    # auth.awards, which gives out the awards in the background.
+
     @classmethod
     def on_comment_save(cls, sender, instance, created, **kwargs):
-        if created:
-            try:
-                cls.objects.get_or_create(user=instance.user, type = cls.COMMENT)
-            except MultipleObjectsReturned:
-                pass
+        if created and instance.user_id:
+            from auth import awards
+            awards.record_comment(instance.user_id)
 
     @classmethod
     def on_subtitle_version_save(cls, sender, instance, created, timestamp=None, **kwargs):
-        if not instance.user:
+        if not instance.user_id:
             return
-
-        if created and instance.version_no == 0:
-            if instance.language.is_original:
-                type = cls.START_SUBTITLES
-            else:
-                type = cls.START_TRANSLATION
-        else:
-            if instance.language.is_original:
-                type = cls.EDIT_SUBTITLES
-            else:
-                type = cls.EDIT_TRANSLATION
-        try:
-            cls.objects.get_or_create(user=instance.user, type=type)
-        except MultipleObjectsReturned:
-            pass
+        from auth import awards
+        awards.record_version(instance.user_id, instance.language_id,
+                              created and instance.version_no == 0)
 
 class UserLanguage(models.Model):
     PROFICIENCY_CHOICES = (
@@ -23,7 +23,8 @@ from django.core.urlresolvers import reverse
 from django.core import mail
 from django.test import TestCase
 from auth.models import CustomUser as User
-from auth.models import LoginToken
+from auth.models import Awards, LoginToken
+from utils import instrumentation, test_factories
 from videos.models import Video
 
 class TestModels(TestCase):
@@ -211,3 +212,162 @@ class LoginTokenViewsTest(BaseTokenTest):
        response = self.client.get(url)
        self.assertEqual(response.status_code, 403)
 
+
+class UserActivityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='activity-test')
+
+    def reload_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_record(self):
+        from auth import activity
+        activity.record(self.user, '10.0.0.1')
+        user = self.reload_user()
+        self.assertEquals(user.last_ip, '10.0.0.1')
+        self.assertNotEquals(user.last_seen, None)
+
+    def test_record_is_throttled(self):
+        from auth import activity
+        activity.record(self.user, '10.0.0.1')
+        writes = []
+        old_add = activity.writer.add
+        activity.writer.add = writes.append
+        try:
+            # same IP and seen recently, we shouldn't write anything
+            activity.record(self.user, '10.0.0.1')
+            self.assertEquals(writes, [])
+            # a new IP should be written, but last_seen shouldn't
+            activity.record(self.user, '10.0.0.2')
+            self.assertEquals(writes, [(self.user.pk, '10.0.0.2', None)])
+        finally:
+            activity.writer.add = old_add
+
+    def test_writer_merges_updates(self):
+        from auth.activity import UserActivityWriter
+        writer = UserActivityWriter('test', synchronous=False)
+        batch = writer.new_batch()
+        seen = datetime(2013, 1, 1, 12, 30)
+        writer.add_to_batch(batch, (self.user.pk, '10.0.0.1', None))
+        writer.add_to_batch(batch, (self.user.pk, None, seen))
+        writer.add_to_batch(batch, (self.user.pk, '10.0.0.2', None))
+        self.assertEquals(batch, {self.user.pk: ('10.0.0.2', seen)})
+        writer.write(batch)
+        user = self.reload_user()
+        self.assertEquals(user.last_ip, '10.0.0.2')
+        self.assertEquals(user.last_seen, seen)
+
+class FollowerSyncTest(TestCase):
+    def setUp(self):
+        self.users = [test_factories.create_user() for i in xrange(6)]
+
+    def count_queries(self, func, *args):
+        instrumentation.start('test')
+        try:
+            func(*args)
+        finally:
+            stats = instrumentation.finish()
+        return stats.queries
+
+    def test_video_followers_are_set_based(self):
+        video1 = test_factories.create_video()
+        video2 = test_factories.create_video()
+        # adding/removing many followers should take the same number of
+        # queries as a single one
+        self.assertEquals(
+            self.count_queries(video1.followers.add, self.users[0]),
+            self.count_queries(video2.followers.add, *self.users[1:]))
+        self.assertEquals(set(video2.customuser_set.all()),
+                          set(self.users[1:]))
+        self.assertEquals(
+            self.count_queries(video1.followers.remove, self.users[0]),
+            self.count_queries(video2.followers.remove, *self.users[1:]))
+        self.assertEquals(video2.customuser_set.count(), 0)
+
+    def test_follow_videos(self):
+        video = test_factories.create_video()
+        user = self.users[0]
+        self.assertEquals(User.follow_videos([(user.id, video.id)]),
+                          set([(user.id, video.id)]))
+        # following again should be a no-op
+        self.assertEquals(User.follow_videos([(user.id, video.id)]), set())
+        self.assertEquals(list(user.videos.all()), [video])
+
+    def test_unfollow_videos_keeps_language_followers(self):
+        video = test_factories.create_video()
+        language = test_factories.create_old_subtitle_language(video, 'en')
+        following_language, following_video = self.users[:2]
+        language.followers.add(following_language)
+        video.followers.add(following_video)
+        self.assertEquals(User.unfollow_videos([
+            (following_language.id, video.id),
+            (following_video.id, video.id),
+        ]), set([(following_video.id, video.id)]))
+        self.assertEquals(list(video.customuser_set.all()),
+                          [following_language])
+
+    def test_follow_languages(self):
+        video = test_factories.create_video()
+        language = video.newsubtitlelanguage_set.create(language_code='en')
+        user = self.users[0]
+        pairs = [(user.id, language.id)]
+        self.assertEquals(User.follow_languages(pairs), set(pairs))
+        self.assertEquals(User.follow_languages(pairs), set())
+        self.assertEquals(list(language.followers.all()), [user])
+
+class AwardsTest(TestCase):
+    def setUp(self):
+        from auth.awards import AwardsWriter
+        self.writer = AwardsWriter('test', flush_interval=3600,
+                                   synchronous=False)
+        self.user = test_factories.create_user()
+        video = test_factories.create_video()
+        self.original = test_factories.create_old_subtitle_language(
+            video, 'en', is_original=True)
+        self.translation = test_factories.create_old_subtitle_language(
+            video, 'fr', is_original=False)
+
+    def write(self, *items):
+        batch = self.writer.new_batch()
+        for item in items:
+            self.writer.add_to_batch(batch, item)
+        self.writer.write(batch)
+
+    def award_types(self):
+        return sorted(Awards.objects.filter(user=self.user)
+                      .values_list('type', flat=True))
+
+    def award_points(self):
+        return User.objects.get(pk=self.user.pk).award_points
+
+    def test_write(self):
+        self.write((self.user.id, Awards.COMMENT, None, False),
+                   (self.user.id, Awards.COMMENT, None, False),
+                   (self.user.id, None, self.original.id, True),
+                   (self.user.id, None, self.translation.id, False))
+        self.assertEquals(self.award_types(), [
+            Awards.COMMENT, Awards.START_SUBTITLES, Awards.EDIT_TRANSLATION])
+        self.assertEquals(self.award_points(), 10 + 100 + 50)
+
+    def test_awards_are_only_given_once(self):
+        self.write((self.user.id, Awards.COMMENT, None, False))
+        self.write((self.user.id, Awards.COMMENT, None, False),
+                   (self.user.id, None, self.original.id, False))
+        self.assertEquals(self.award_types(), [
+            Awards.COMMENT, Awards.EDIT_SUBTITLES])
+        self.assertEquals(self.award_points(), 10 + 50)
+
+    def test_record_doesnt_query(self):
+        from auth import awards
+        old_writer = awards.writer
+        awards.writer = self.writer
+        try:
+            instrumentation.start('test')
+            awards.record_comment(self.user.id)
+            awards.record_version(self.user.id, self.original.id, True)
+            self.assertEquals(instrumentation.finish().queries, 0)
+            self.writer.flush()
+        finally:
+            awards.writer = old_writer
+        self.assertEquals(self.award_types(), [
+            Awards.COMMENT, Awards.START_SUBTITLES])
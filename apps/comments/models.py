@@ -16,18 +16,86 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from collections import defaultdict
+
 from django.db import models
+from django.db.models import Count, F
+from django.db.models.fields import FieldDoesNotExist
 from django.template.loader import render_to_string
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from auth.models import CustomUser as User, Awards
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from localeurl.utils import universal_url
 
 COMMENT_MAX_LENGTH = getattr(settings,'COMMENT_MAX_LENGTH', 3000)
+THREAD_CACHE_TIMEOUT = 60 * 30
+
+def _thread_cache_key(content_type_id, object_pk):
+    return 'comments:thread:%s:%s' % (content_type_id, object_pk)
+
+class CommentCountField(models.PositiveIntegerField):
+    """Denormalized count of the comments on an object.
+
+    The count is only written by update_comment_counts().  Saving an existing
+    object leaves the column alone, so that an instance that was loaded before
+    a comment got posted doesn't overwrite the new count when it's saved.
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', 0)
+        kwargs.setdefault('editable', False)
+        super(CommentCountField, self).__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        if add:
+            return super(CommentCountField, self).pre_save(model_instance,
+                                                           add)
+        # this makes the UPDATE statement set the column to itself
+        return F(self.attname)
+
+try:
+    from south.modelsinspector import add_introspection_rules
+except ImportError:
+    pass
+else:
+    add_introspection_rules([], [
+        "^comments\.models\.CommentCountField",
+        "^apps\.comments\.models\.CommentCountField",
+    ])
+
+def update_comment_counts(pairs):
+    """Recalculate the comment_count field for some objects.
+
+    pairs is an iterable of (content_type_id, object_pk) tuples.  Only some
+    models have the field (Video and SubtitleLanguage), objects of other
+    models are skipped.  We set the field to the number of comments rather
+    than incrementing it, so any drift gets fixed.
+    """
+    object_pks = defaultdict(set)
+    for content_type_id, object_pk in pairs:
+        object_pks[content_type_id].add(unicode(object_pk))
+    for content_type_id, pks in object_pks.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        try:
+            model._meta.get_field('comment_count')
+        except FieldDoesNotExist:
+            continue
+        counts = dict((pk, 0) for pk in pks)
+        counts.update(Comment.objects
+                      .filter(content_type=content_type_id, object_pk__in=pks)
+                      .order_by().values_list('object_pk')
+                      .annotate(Count('id')))
+        pks_by_count = defaultdict(list)
+        for pk, count in counts.items():
+            pks_by_count[count].append(pk)
+        for count, pks in pks_by_count.items():
+            model.objects.filter(pk__in=pks).update(comment_count=count)
 
 
 class Comment(models.Model):
@@ -54,12 +122,52 @@ class Comment(models.Model):
         else:
             return self.objects.none()
 
+    @classmethod
+    def get_thread(cls, obj):
+        """Get the list of comments for an object.
+
+        This returns the same comments as get_for_object(), but the list is
+        cached until a comment for the object is added or deleted.
+        """
+        if not obj.pk:
+            return []
+        ct = ContentType.objects.get_for_model(obj)
+        cache_key = _thread_cache_key(ct.pk, obj.pk)
+        thread = cache.get(cache_key)
+        if thread is None:
+            thread = list(cls.get_for_object(obj))
+            cache.set(cache_key, thread, THREAD_CACHE_TIMEOUT)
+        return thread
+
+    @classmethod
+    def on_save(cls, sender, instance, created, raw, **kwargs):
+        if raw:
+            return
+        cache.delete(_thread_cache_key(instance.content_type_id,
+                                       instance.object_pk))
+        if created:
+            update_comment_counts([(instance.content_type_id,
+                                    instance.object_pk)])
+
+    @classmethod
+    def on_delete(cls, sender, instance, **kwargs):
+        cache.delete(_thread_cache_key(instance.content_type_id,
+                                       instance.object_pk))
+        update_comment_counts([(instance.content_type_id,
+                                instance.object_pk)])
+
 
 def comment_post_save_handler(sender, instance, created, **kwargs):
+    if not created:
+        return
     from messages.tasks import send_video_comment_notification
     send_video_comment_notification.delay(instance)
 
 
+post_save.connect(Comment.on_save, Comment,
+                  dispatch_uid='comments.comment.on_save')
+post_delete.connect(Comment.on_delete, Comment,
+                    dispatch_uid='comments.comment.on_delete')
 post_save.connect(Awards.on_comment_save, Comment)
 post_save.connect(comment_post_save_handler, Comment,
         dispatch_uid='notifications')
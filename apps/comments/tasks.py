@@ -15,11 +15,12 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from celery.decorators import periodic_task
+from django.core.cache import cache
 
-from apps.comments.models import Comment
+from apps.comments.models import Comment, update_comment_counts
 from utils.metrics import Gauge
 
 
@@ -27,3 +28,29 @@ from utils.metrics import Gauge
 def gauge_comments():
     Gauge('comments.Comment').report(Comment.objects.count())
 
+
+RECONCILED_UP_TO_KEY = 'comments:counts-reconciled-up-to'
+
+@periodic_task(run_every=timedelta(minutes=15))
+def reconcile_comment_counts():
+    """Recalculate comment_count for objects with new comments.
+
+    The signal handlers recalculate the count each time a comment is saved or
+    deleted, but two comments posted at the same time can each miss the
+    other's row.  Recalculate the counts for every object that got a comment
+    since the last time we ran.
+    """
+    last_id = cache.get(RECONCILED_UP_TO_KEY)
+    qs = Comment.objects.all()
+    if last_id is not None:
+        qs = qs.filter(pk__gt=last_id)
+    else:
+        qs = qs.filter(submit_date__gte=datetime.now() - timedelta(days=1))
+    rows = list(qs.order_by().values_list('id', 'content_type', 'object_pk'))
+    if not rows:
+        return
+    update_comment_counts((content_type_id, object_pk)
+                          for comment_id, content_type_id, object_pk in rows)
+    # if the key expires, we fall back to looking at the last day
+    cache.set(RECONCILED_UP_TO_KEY, max(row[0] for row in rows),
+              60 * 60 * 24)
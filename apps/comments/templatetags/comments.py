@@ -34,11 +34,13 @@ def render_comment_form(context, obj):
 
 @register.inclusion_tag('comments/list.html', takes_context=True)
 def render_comment_list(context, obj):
-    context['qs'] =  Comment.get_for_object(obj)
+    context['qs'] = Comment.get_thread(obj)
     context['content_type'] = ContentType.objects.get_for_model(obj)
     context['obj'] = obj
     return context
     
 @register.filter
 def get_comment_count(obj):
+    if hasattr(obj, 'comment_count'):
+        return obj.comment_count
     return Comment.get_for_object(obj).count()
\ No newline at end of file
@@ -19,6 +19,7 @@
 
 import datetime
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.core.urlresolvers import reverse
 from django.contrib.sites.models import Site
@@ -29,8 +30,11 @@ from apps.auth.models import CustomUser as User
 
 from django.core import mail
 from comments.models import Comment
+from comments.tasks import reconcile_comment_counts
 from localeurl.utils import universal_url, DEFAULT_PROTOCOL
 from messages.tasks import  send_video_comment_notification, SUBJECT_EMAIL_VIDEO_COMMENTED
+from subtitles.models import SubtitleLanguage
+from utils import test_factories
 
 
 class CommentEmailTests(TestCase):
@@ -129,3 +133,78 @@ class CommentEmailTests(TestCase):
         self.assertEqual(email.subject, SUBJECT_EMAIL_VIDEO_COMMENTED  % dict(user=self.comment.user.username,
                                                                           title=self.video.title_display()))
         
+
+class CommentCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = test_factories.create_user()
+        self.video = test_factories.create_video()
+        self.language = SubtitleLanguage.objects.create(
+            video=self.video, language_code='en')
+
+    def add_comment(self, obj):
+        comment = Comment(content_object=obj, user=self.user,
+                          content='comment')
+        comment.save()
+        return comment
+
+    def test_video_comment_count(self):
+        comments = [self.add_comment(self.video) for i in xrange(3)]
+        self.add_comment(self.language)
+        self.assertEquals(Video.objects.get(pk=self.video.pk).comment_count,
+                          3)
+        # saving an existing comment shouldn't change the count
+        comments[0].save()
+        comments[1].delete()
+        self.assertEquals(Video.objects.get(pk=self.video.pk).comment_count,
+                          2)
+
+    def test_stale_save_keeps_count(self):
+        # an instance loaded before a comment was posted shouldn't overwrite
+        # the count when it gets saved
+        video = Video.objects.get(pk=self.video.pk)
+        language = SubtitleLanguage.objects.get(pk=self.language.pk)
+        self.add_comment(self.video)
+        self.add_comment(self.language)
+        video.title = 'new title'
+        video.save()
+        language.save()
+        self.assertEquals(Video.objects.get(pk=self.video.pk).comment_count,
+                          1)
+        self.assertEquals(
+            SubtitleLanguage.objects.get(pk=self.language.pk).comment_count,
+            1)
+
+    def test_reconcile(self):
+        self.add_comment(self.video)
+        self.add_comment(self.video)
+        Video.objects.filter(pk=self.video.pk).update(comment_count=5)
+        reconcile_comment_counts()
+        self.assertEquals(Video.objects.get(pk=self.video.pk).comment_count,
+                          2)
+        # we should only look at new comments the next time around
+        Video.objects.filter(pk=self.video.pk).update(comment_count=5)
+        with self.assertNumQueries(1):
+            reconcile_comment_counts()
+        self.add_comment(self.video)
+        Video.objects.filter(pk=self.video.pk).update(comment_count=5)
+        reconcile_comment_counts()
+        self.assertEquals(Video.objects.get(pk=self.video.pk).comment_count,
+                          3)
+
+    def test_language_comment_count(self):
+        self.add_comment(self.language)
+        self.add_comment(self.video)
+        language = SubtitleLanguage.objects.get(pk=self.language.pk)
+        self.assertEquals(language.comment_count, 1)
+
+    def test_thread_cache(self):
+        first = self.add_comment(self.video)
+        self.assertEquals(Comment.get_thread(self.video), [first])
+        with self.assertNumQueries(0):
+            self.assertEquals(Comment.get_thread(self.video), [first])
+        # adding a comment should invalidate the cache
+        second = self.add_comment(self.video)
+        self.assertEquals(Comment.get_thread(self.video), [first, second])
+        first.delete()
+        self.assertEquals(Comment.get_thread(self.video), [second])
@@ -23,9 +23,11 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.conf import settings
 from django.utils import simplejson as json
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.core.urlresolvers import reverse
 from django.utils.html import escape, urlize
+
+from messages import unread
 Q = models.Q
 
 MESSAGE_MAX_LENGTH = getattr(settings,'MESSAGE_MAX_LENGTH', 1000)
@@ -42,6 +44,20 @@ class MessageManager(models.Manager):
     def unread(self):
         return self.get_query_set().filter(read=False)
 
+    def mark_read(self, user, message_ids=None):
+        """Mark messages for user as read.
+
+        If message_ids is None, mark all of user's messages as read.  Returns
+        the number of messages that were marked read.
+        """
+        qs = self.for_user(user).filter(read=False)
+        if message_ids is not None:
+            qs = qs.filter(pk__in=message_ids)
+        count = qs.update(read=True)
+        unread.messages_read(user.pk, message_ids, count)
+        unread.forget(user)
+        return count
+
 class Message(models.Model):
     user = models.ForeignKey(User)
     subject = models.CharField(max_length=100, blank=True)
@@ -74,8 +90,12 @@ class Message(models.Model):
 
     def delete_for_user(self, user):
         if self.user == user:
+            was_unread = self.is_unread_for_user()
             self.deleted_for_user = True
             self.save()
+            if was_unread:
+                unread.messages_read(user.pk, [self.pk], 1)
+                unread.forget(user)
         elif self.author == user:
             self.deleted_for_author = True
             self.save()
@@ -129,8 +149,26 @@ class Message(models.Model):
         if not getattr(settings, "MESSAGES_DISABLED", False):
             super (Message, self).save(*args, **kwargs)
         
+    def is_unread_for_user(self):
+        return not self.read and not self.deleted_for_user
+
+    @classmethod
+    def on_save(cls, sender, instance, created, raw, **kwargs):
+        if created and not raw and instance.is_unread_for_user():
+            unread.message_added(instance.user_id, instance.pk)
+
+    @classmethod
+    def on_message_delete(cls, sender, instance, **kwargs):
+        if instance.is_unread_for_user():
+            unread.invalidate(instance.user_id)
+
     @classmethod
     def on_delete(cls, sender, instance, **kwargs):
         ct = ContentType.objects.get_for_model(sender)
         cls.objects.filter(content_type__pk=ct.pk, object_pk=instance.pk).delete()
 
+
+post_save.connect(Message.on_save, Message,
+                  dispatch_uid='messages.message.on_save')
+post_delete.connect(Message.on_message_delete, Message,
+                    dispatch_uid='messages.message.on_message_delete')
@@ -25,15 +25,20 @@ Currently we support:
 Messages models will trigger an email to be sent if
 the user has allowed email notifications
 """
+from datetime import datetime
+
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext_lazy as _, ugettext
 from django.template.loader import render_to_string
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 
 from raven.contrib.django.models import client
 
+from celery.decorators import periodic_task
+from celery.schedules import timedelta
 from celery.task import task
 
 from auth.models import CustomUser as User
@@ -43,6 +48,7 @@ from teams.moderation_const import REVIEWED_AND_PUBLISHED, \
      REVIEWED_AND_PENDING_APPROVAL, REVIEWED_AND_SENT_BACK
 
 
+from messages import unread
 from messages.models import Message
 from utils import send_templated_email
 from utils.metrics import Meter
@@ -753,3 +759,29 @@ def send_video_comment_notification(comment_pk_or_instance, version_pk=None):
                     "version": version,
                     "body": comment.content
                 }))
+
+RECONCILED_UP_TO_KEY = 'messages:unread-reconciled-up-to'
+
+@periodic_task(run_every=timedelta(minutes=15))
+def reconcile_unread_counts():
+    """Recalculate the cached unread counts for users with new messages.
+
+    The cached counts get updated with incr()/decr(), so a race between
+    creating and reading messages can leave them slightly off.  Recalculate
+    them for everyone that got a message since the last time we ran.
+    """
+    last_id = cache.get(RECONCILED_UP_TO_KEY)
+    qs = Message.objects.all()
+    if last_id is not None:
+        qs = qs.filter(pk__gt=last_id)
+    else:
+        # first run (or the key expired), the counts for older messages
+        # have expired from the cache by now
+        qs = qs.filter(created__gte=datetime.now() - timedelta(days=1))
+    rows = list(qs.order_by().values_list('id', 'user_id'))
+    if not rows:
+        return
+    unread.reconcile(user_id for message_id, user_id in rows)
+    cache.set(RECONCILED_UP_TO_KEY,
+              max(message_id for message_id, user_id in rows),
+              unread.COUNT_TIMEOUT)
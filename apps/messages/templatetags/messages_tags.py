@@ -17,6 +17,7 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 from django import template
 
+from messages import unread
 from messages.models import Message
 
 
@@ -27,14 +28,11 @@ def messages(context):
     user = context['user']
     if user.is_authenticated():
         hidden_message_id = context['request'].COOKIES.get(Message.hide_cookie_name)
-        qs = user.unread_messages(hidden_message_id)
-        try:
-            last_unread = qs[:1].get().pk
-        except Message.DoesNotExist:
+        count, last_unread = unread.get(user)
+        if not last_unread:
             last_unread = ''
         count = user.unread_messages_count(hidden_message_id)
     else:
-        qs = Message.objects.none()
         last_unread = ''
         count = 0
 
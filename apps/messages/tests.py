@@ -17,11 +17,13 @@
 # along with this program. If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 from django.core import mail
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
 from apps.auth.models import CustomUser as User, EmailConfirmation
 from apps.messages import tasks as notifier
+from apps.messages import unread
 from apps.messages.models import Message
 from apps.subtitles import models as sub_models
 from apps.subtitles.pipeline import add_subtitles
@@ -30,7 +32,7 @@ from apps.teams.models import (
     Team, TeamMember, Application, Workflow, TeamVideo, Task
 )
 from apps.videos.models import Action, Video
-from utils import send_templated_email
+from utils import send_templated_email, test_factories
 
 
 class MessageTest(TestCase):
@@ -534,3 +536,79 @@ class TeamBlockSettingsTest(TestCase):
         team_tasks.add_videos_notification_daily()
         self.assertEquals(Message.objects.all().count(), 0,
             "%s is on, so this message should *not * be sent" % setting_name)
+
+class UnreadCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = test_factories.create_user()
+        self.author = test_factories.create_user()
+
+    def send_message(self):
+        return Message.objects.create(user=self.user, author=self.author,
+                                      subject='subject', content='content')
+
+    def get_count(self, hidden_message_id=None):
+        user = User.objects.get(pk=self.user.pk)
+        return user.unread_messages_count(hidden_message_id)
+
+    def check_count(self):
+        # the cached value should match the real count
+        self.assertEquals(self.get_count(),
+                          self.user.unread_messages().count())
+
+    def test_count(self):
+        self.assertEquals(self.get_count(), 0)
+        messages = [self.send_message() for i in xrange(3)]
+        self.assertEquals(self.get_count(), 3)
+        self.check_count()
+        Message.objects.mark_read(self.user, [messages[0].pk])
+        self.assertEquals(self.get_count(), 2)
+        self.check_count()
+        messages[1].delete_for_user(self.user)
+        self.assertEquals(self.get_count(), 1)
+        self.check_count()
+        messages[2].delete()
+        self.assertEquals(self.get_count(), 0)
+        self.check_count()
+
+    def test_mark_all_read(self):
+        for i in xrange(3):
+            self.send_message()
+        self.get_count()
+        self.assertEquals(Message.objects.mark_read(self.user), 3)
+        self.assertEquals(self.get_count(), 0)
+        # reading messages that are already read shouldn't change anything
+        self.assertEquals(Message.objects.mark_read(self.user), 0)
+        self.assertEquals(self.get_count(), 0)
+
+    def test_last_unread(self):
+        first = self.send_message()
+        second = self.send_message()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEquals(unread.get(user), (2, second.pk))
+        Message.objects.mark_read(self.user, [second.pk])
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEquals(unread.get(user), (1, first.pk))
+
+    def test_hidden_messages(self):
+        first = self.send_message()
+        self.assertEquals(self.get_count(first.pk), 0)
+        self.send_message()
+        self.assertEquals(self.get_count(first.pk), 1)
+        self.assertEquals(self.get_count(), 2)
+
+    def test_cache_hit(self):
+        self.send_message()
+        self.get_count()
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEquals(user.unread_messages_count(), 1)
+
+    def test_reconcile(self):
+        self.send_message()
+        self.get_count()
+        # change the count behind the cache's back
+        Message.objects.filter(user=self.user).update(read=True)
+        self.assertEquals(self.get_count(), 1)
+        notifier.reconcile_unread_counts()
+        self.assertEquals(self.get_count(), 0)
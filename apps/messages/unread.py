@@ -0,0 +1,161 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""messages.unread -- Cached unread message counts.
+
+The unread message count is shown on practically every page, but counting
+messages for a user can't use a covering index because of the
+deleted_for_user check.  So we keep 2 values per user in the cache:
+
+    - the number of unread messages
+    - the id of the newest unread message (for the "hide messages" cookie)
+
+Reading them is a single get_many().  If they're missing, we calculate them
+from the DB and store them.  When messages get created, read or deleted, we
+update the count with incr()/decr(), which are atomic.  If the count isn't
+in the cache, we leave it alone and it gets recalculated the next time
+someone reads it.
+
+The values expire after COUNT_TIMEOUT and the reconcile_unread_counts task
+periodically recalculates them for users that got new messages, so any
+drift from races doesn't last long.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+COUNT_TIMEOUT = 60 * 60 * 24
+
+def _count_key(user_id):
+    return 'messages:unread-count:%s' % user_id
+
+def _last_key(user_id):
+    return 'messages:last-unread:%s' % user_id
+
+def _unread_messages(user_ids):
+    from messages.models import Message
+    return (Message.objects.filter(user__in=user_ids, read=False)
+            .exclude(deleted_for_user=True))
+
+def calc(user_ids):
+    """Calculate the unread counts for users from the DB.
+
+    Returns a dict mapping user ids to (count, last_unread_id) tuples.
+    last_unread_id is 0 if there are no unread messages.
+    """
+    summaries = dict((user_id, (0, 0)) for user_id in user_ids)
+    rows = (_unread_messages(user_ids).order_by().values('user')
+            .annotate(count=Count('id'), last=Max('id')))
+    for row in rows:
+        summaries[row['user']] = (row['count'], row['last'])
+    return summaries
+
+def store(summaries):
+    data = {}
+    for user_id, (count, last_unread) in summaries.items():
+        data[_count_key(user_id)] = count
+        data[_last_key(user_id)] = last_unread
+    if data:
+        cache.set_many(data, COUNT_TIMEOUT)
+
+def reconcile(user_ids):
+    """Recalculate the cached values for users."""
+    store(calc(set(user_ids)))
+
+def get(user):
+    """Get the unread count for a user.
+
+    Returns a (count, last_unread_id) tuple.  last_unread_id is 0 if there
+    are no unread messages.  The result is memoized on the user object.
+    """
+    if hasattr(user, '_unread_summary'):
+        return user._unread_summary
+    user._unread_summary = _get(user)
+    return user._unread_summary
+
+def _get(user):
+    count_key = _count_key(user.pk)
+    last_key = _last_key(user.pk)
+    cached = cache.get_many([count_key, last_key])
+    count = cached.get(count_key)
+    last_unread = cached.get(last_key)
+    if count is None:
+        count, last_unread = calc([user.pk])[user.pk]
+        store({user.pk: (count, last_unread)})
+    elif count <= 0:
+        count = last_unread = 0
+    elif last_unread is None:
+        # the newest unread message was read, find the new one
+        last_unread = (_unread_messages([user.pk]).order_by('-id')
+                       .values_list('id', flat=True)[:1])
+        last_unread = last_unread[0] if last_unread else 0
+        cache.set(last_key, last_unread, COUNT_TIMEOUT)
+    return count, last_unread
+
+def count(user, hidden_message_id=None):
+    """Get the number of unread messages for a user.
+
+    If hidden_message_id is given, only count messages newer than it (the
+    user hid the messages up to that one).
+    """
+    unread_count, last_unread = get(user)
+    if not unread_count or not hidden_message_id:
+        return unread_count
+    try:
+        hidden_message_id = int(hidden_message_id)
+    except (TypeError, ValueError):
+        return unread_count
+    if hidden_message_id >= last_unread:
+        return 0
+    # New messages since the user hid them, we need to count them
+    return _unread_messages([user.pk]).filter(
+        pk__gt=hidden_message_id).count()
+
+def message_added(user_id, message_id):
+    try:
+        cache.incr(_count_key(user_id))
+    except ValueError:
+        # not cached, it will get calculated next time
+        return
+    cache.set(_last_key(user_id), message_id, COUNT_TIMEOUT)
+
+def messages_read(user_id, message_ids, count):
+    """Update the cached values after some unread messages were read/deleted
+
+    message_ids is a list of the ids of the messages, or None if we don't
+    know them.  count is the number of messages that went from unread to read.
+    """
+    if not count:
+        return
+    try:
+        cache.decr(_count_key(user_id), count)
+    except ValueError:
+        return
+    last_key = _last_key(user_id)
+    if (message_ids is None or
+        cache.get(last_key) in set(int(pk) for pk in message_ids)):
+        cache.delete(last_key)
+
+def forget(user):
+    """Forget the values memoized on a user object."""
+    for attr in ('_unread_summary', '_unread_messages_count'):
+        if hasattr(user, attr):
+            delattr(user, attr)
+
+def invalidate(user_id):
+    cache.delete_many([_count_key(user_id), _last_key(user_id)])
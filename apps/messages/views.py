@@ -59,8 +59,9 @@ def inbox(request, message_pk=None):
     if reply:
         try:
             reply_msg = Message.objects.get(pk=reply, user=user)
-            reply_msg.read = True
-            reply_msg.save()
+            if not reply_msg.read:
+                Message.objects.mark_read(user, [reply_msg.pk])
+                reply_msg.read = True
             extra_context['reply_msg'] = reply_msg
         except (Message.DoesNotExist, ValueError):
             pass
@@ -0,0 +1,67 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""profiles.dashboard -- Load the data for the user dashboard.
+
+The dashboard shows the user's open tasks along with the activity on their
+teams and videos.  We load the tasks with their teams, team videos and videos
+in 1 query and their primary URLs in 1 more, so the number of queries doesn't
+depend on the number of tasks.
+
+The activity lists don't need to be up to the second, so we cache them for
+each user for ACTIVITY_CACHE_TIMEOUT seconds.
+"""
+
+from django.core.cache import cache
+
+from teams.models import Task
+from videos import timelines
+
+ACTIVITY_LIMIT = 8
+ACTIVITY_CACHE_TIMEOUT = 60
+
+def load_tasks(user):
+    """Get the open tasks for a user.
+
+    The tasks have their team, team_video and team_video.video already
+    loaded, and have the cached_video_url attribute set.
+    """
+    tasks = list(user.open_tasks().select_related('team', 'team_video',
+                                                  'team_video__video'))
+    Task.add_cached_video_urls(tasks)
+    return tasks
+
+def _activity_cache_key(user_id):
+    return 'profiles:dashboard-activity:%s' % user_id
+
+def load_activity(user):
+    """Get the activity for a user's dashboard.
+
+    Returns a dict with team_activity and video_activity lists.
+    """
+    cache_key = _activity_cache_key(user.pk)
+    activity = cache.get(cache_key)
+    if activity is None:
+        activity = {
+            'team_activity': list(timelines.user_team_activity(
+                user, limit=ACTIVITY_LIMIT)),
+            'video_activity': list(timelines.user_video_activity(
+                user, limit=ACTIVITY_LIMIT)),
+        }
+        cache.set(cache_key, activity, ACTIVITY_CACHE_TIMEOUT)
+    return activity
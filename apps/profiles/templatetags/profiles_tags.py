@@ -22,6 +22,7 @@ from rosetta.views import can_translate as can_translate_func
 from auth.models import CustomUser as User
 from profiles.forms import SelectLanguageForm
 from utils.translation import get_user_languages_from_request, get_user_languages_from_cookie
+from videos import timelines
 from videos.models import Action
 
 
@@ -65,10 +66,8 @@ def user_videos_activity(context, user=None):
     user = user or context['user']
 
     if user.is_authenticated():
-        context['users_actions'] = Action.objects.select_related('video', 'language', 'language__video', 'user') \
-            .filter(video__customuser=user) \
-            .exclude(user=user) \
-            .exclude(user=User.get_anonymous())[:ACTIONS_ON_PAGE]
+        context['users_actions'] = timelines.user_video_activity(
+            user, limit=ACTIONS_ON_PAGE, exclude_anonymous=True)
     else:
         context['users_actions'] = Action.objects.none()
     return context
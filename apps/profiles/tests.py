@@ -15,10 +15,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
 from auth.models import CustomUser as User
+from profiles.dashboard import load_tasks
+from teams.models import Task
+from utils import instrumentation, test_factories
 from videos.models import Video, Action
 
 
@@ -93,3 +97,47 @@ class TestViews(TestCase):
         self.assertTrue(self.user.action_set.exists())
 
         self._simple_test('profiles:profile', [self.user.id])
+
+class DashboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = test_factories.create_user(password='password')
+        self.team = test_factories.create_team()
+        test_factories.create_team_member(self.team, self.user)
+
+    def add_tasks(self, count):
+        for i in xrange(count):
+            team_video = test_factories.create_team_video(self.team,
+                                                          self.user)
+            Task.objects.create(team=self.team, team_video=team_video,
+                                type=Task.TYPE_IDS['Subtitle'],
+                                assignee=self.user)
+
+    def count_dashboard_queries(self):
+        cache.clear()
+        instrumentation.start('test')
+        try:
+            response = self.client.get(reverse('profiles:dashboard'))
+        finally:
+            stats = instrumentation.finish()
+        self.assertEqual(response.status_code, 200)
+        return stats.queries
+
+    def test_load_tasks(self):
+        self.add_tasks(3)
+        with self.assertNumQueries(2):
+            tasks = load_tasks(self.user)
+        with self.assertNumQueries(0):
+            for task in tasks:
+                task.team_video.video.video_id
+                task.team.slug
+                task.cached_video_url
+        self.assertEqual(len(tasks), 3)
+
+    def test_query_count(self):
+        self.client.login(username=self.user.username, password='password')
+        self.add_tasks(1)
+        query_count = self.count_dashboard_queries()
+        # adding more tasks shouldn't add any queries
+        self.add_tasks(4)
+        self.assertEqual(self.count_dashboard_queries(), query_count)
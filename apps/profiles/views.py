@@ -32,16 +32,16 @@ from django.views.generic.simple import direct_to_template
 from tastypie.models import ApiKey
 
 from auth.models import CustomUser as User
+from profiles.dashboard import load_activity, load_tasks
 from profiles.forms import (EditUserForm, EditAccountForm, SendMessageForm,
                             EditAvatarForm, AdminProfileForm)
 from profiles.rpc import ProfileApiClass
 from apps.messages.models import Message
 from utils.orm import LoadRelatedQuerySet
 from utils.rpc import RpcRouter
-from teams.models import Task
 from subtitles.models import SubtitleLanguage
 from videos.models import (
-    Action, VideoUrl, Video, VIDEO_TYPE_YOUTUBE, VideoFeed
+    Action, Video, VIDEO_TYPE_YOUTUBE, VideoFeed
 )
 
 
@@ -109,26 +109,16 @@ def profile(request, user_id):
 def dashboard(request):
     user = request.user
 
-    tasks = user.open_tasks()
-
     widget_settings = {}
     from apps.widget.rpc import add_general_settings
     add_general_settings(request, widget_settings)
 
-    # For perform links on tasks
-    video_pks = [t.team_video.video_id for t in tasks]
-    video_urls = dict([(vu.video_id, vu.effective_url) for vu in
-                       VideoUrl.objects.filter(video__in=video_pks, primary=True)])
-
-    Task.add_cached_video_urls(tasks)
-
     context = {
         'user_info': user,
-        'team_activity': Action.objects.for_user_team_activity(user)[:8],
-        'video_activity': Action.objects.for_user_video_activity(user)[:8],
-        'tasks': tasks,
+        'tasks': load_tasks(user),
         'widget_settings': widget_settings,
     }
+    context.update(load_activity(user))
 
     return direct_to_template(request, 'profiles/dashboard.html', context)
 
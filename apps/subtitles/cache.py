@@ -17,6 +17,9 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
 from django.core.cache import cache
+from django.utils import simplejson as json
+
+from utils.compress import compress, decompress
 
 TIMEOUT = 60 * 60 * 24 * 5 # 5 days
 
@@ -38,3 +41,44 @@ def get_is_synced(language, public):
 def set_is_synced(language, public, value):
     cache_key = _lang_is_synced_id(language, public)
     cache.set(cache_key, value, TIMEOUT)
+
+def get_is_synced_many(languages, public):
+    """Get the cached is_synced values for several languages.
+
+    Returns a dict that maps language ids to values.  Languages that aren't
+    in the cache aren't in the dict.
+    """
+    keys = dict((_lang_is_synced_id(language, public), language.id)
+                for language in languages)
+    return dict((keys[key], value)
+                for key, value in cache.get_many(keys.keys()).items())
+
+def _editor_version_data_id(version_id):
+    return u"version-%s-editor-data" % (version_id,)
+
+def get_editor_version_data(version_ids):
+    """Get the cached editor data for a list of versions.
+
+    Returns a dict mapping version ids to the data.  Versions that aren't in
+    the cache are left out.  SubtitleVersions never change once they're
+    created, so this data never needs to be invalidated.
+    """
+    cache_keys = dict((_editor_version_data_id(version_id), version_id)
+                      for version_id in version_ids)
+    if not cache_keys:
+        return {}
+    cached = cache.get_many(cache_keys.keys())
+    return dict((cache_keys[key], json.loads(decompress(value)))
+                for key, value in cached.items())
+
+def set_editor_version_data(version_data):
+    """Store editor data for versions
+
+    version_data is a dict mapping version ids to the data.  We store it
+    compressed, since the subtitles for a version can be big.
+    """
+    if not version_data:
+        return
+    cache.set_many(dict(
+        (_editor_version_data_id(version_id), compress(json.dumps(data)))
+        for version_id, data in version_data.items()), TIMEOUT)
@@ -0,0 +1,219 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""subtitles.diff -- Diff subtitle sets.
+
+This replaces babelsubs.storage.diff/calc_changes, which run difflib over the
+full list of subtitles.  difflib is O(n*m), which gets very slow for long
+transcripts with thousands of subtitles.
+
+Most edits only touch a few subtitles, so we match sequences like this:
+
+    - strip the common prefix and suffix
+    - if what's left is small, use difflib on it
+    - otherwise, use the elements that appear exactly once in both windows as
+      anchors (like patience diff) and recurse on the windows between them
+
+For the side-by-side diff, subtitles get aligned by their timing first.
+Aligned subtitles are paired up and we only compare their text.  Subtitles in
+the windows between them are paired up in order.
+
+diff() returns data in the same format as babelsubs.storage.diff:
+
+{
+    'changed': True if there are any differences,
+    'text_changed': fraction of the text that changed (0.0 - 1.0),
+    'time_changed': fraction of the timing that changed (0.0 - 1.0),
+    'subtitle_data': [
+        {
+            'time_changed': bool,
+            'text_changed': bool,
+            'subtitles': [item from set_1, item from set_2],
+        },
+        ...
+    ],
+}
+
+If a subtitle only exists in 1 of the sets, the other item is BLANK_ITEM.
+"""
+
+import bisect
+import difflib
+from collections import defaultdict, namedtuple
+from itertools import izip_longest
+
+# Windows with at most this many (len(a) * len(b)) elements get diffed with
+# difflib.
+DIFFLIB_WINDOW_LIMIT = 64 * 64
+
+DiffItem = namedtuple('DiffItem', 'start_time end_time text meta')
+BLANK_ITEM = DiffItem(None, None, None, {})
+
+def _difflib_matches(a, alo, ahi, b, blo, bhi, matches):
+    matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi],
+                                      autojunk=False)
+    for i, j, size in matcher.get_matching_blocks():
+        for k in xrange(size):
+            matches.append((alo + i + k, blo + j + k))
+
+def _longest_increasing(pairs):
+    """Find the longest subsequence of pairs where the 2nd item increases.
+
+    pairs must be sorted by their 1st item.
+    """
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(pairs)
+    for index, (i, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos > 0:
+            previous[index] = tail_indexes[pos-1]
+        if pos == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[pos] = j
+            tail_indexes[pos] = index
+    rv = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        rv.append(pairs[index])
+        index = previous[index]
+    rv.reverse()
+    return rv
+
+def _unique_anchors(a, alo, ahi, b, blo, bhi):
+    a_counts = defaultdict(int)
+    a_positions = {}
+    for i in xrange(alo, ahi):
+        a_counts[a[i]] += 1
+        a_positions[a[i]] = i
+    b_counts = defaultdict(int)
+    b_positions = {}
+    for j in xrange(blo, bhi):
+        b_counts[b[j]] += 1
+        b_positions[b[j]] = j
+    pairs = sorted((a_positions[value], b_positions[value])
+                   for value, count in a_counts.iteritems()
+                   if count == 1 and b_counts.get(value) == 1)
+    return _longest_increasing(pairs)
+
+def _match(a, alo, ahi, b, blo, bhi, matches):
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        matches.append((alo, blo))
+        alo += 1
+        blo += 1
+    suffix_matches = []
+    while alo < ahi and blo < bhi and a[ahi-1] == b[bhi-1]:
+        ahi -= 1
+        bhi -= 1
+        suffix_matches.append((ahi, bhi))
+    if alo < ahi and blo < bhi:
+        if (ahi - alo) * (bhi - blo) <= DIFFLIB_WINDOW_LIMIT:
+            _difflib_matches(a, alo, ahi, b, blo, bhi, matches)
+        else:
+            anchors = _unique_anchors(a, alo, ahi, b, blo, bhi)
+            if anchors:
+                for i, j in anchors:
+                    _match(a, alo, i, b, blo, j, matches)
+                    matches.append((i, j))
+                    alo, blo = i + 1, j + 1
+                _match(a, alo, ahi, b, blo, bhi, matches)
+            else:
+                # No unique elements in common.  This should be rare for
+                # subtitles, fall back to difflib.
+                _difflib_matches(a, alo, ahi, b, blo, bhi, matches)
+    matches.extend(reversed(suffix_matches))
+
+def match_sequences(a, b):
+    """Find matching elements in 2 sequences.
+
+    The elements must be hashable.  Returns a list of (i, j) tuples, where
+    a[i] == b[j].  Both i and j increase through the list.
+    """
+    matches = []
+    _match(a, 0, len(a), b, 0, len(b), matches)
+    return matches
+
+def change_ratio(a, b):
+    """Calculate what fraction of 2 sequences changed.
+
+    This works like 1 - difflib.SequenceMatcher(None, a, b).ratio()
+    """
+    total = len(a) + len(b)
+    if total == 0:
+        return 0.0
+    return 1.0 - 2.0 * len(match_sequences(a, b)) / total
+
+def _timing(item):
+    return (item.start_time, item.end_time)
+
+def _items(subtitle_set, mappings):
+    if mappings is None:
+        return list(subtitle_set.subtitle_items())
+    else:
+        return list(subtitle_set.subtitle_items(mappings))
+
+def _calc_changes(items_1, items_2):
+    text_change = change_ratio([item.text for item in items_1],
+                               [item.text for item in items_2])
+    time_change = change_ratio([_timing(item) for item in items_1],
+                               [_timing(item) for item in items_2])
+    return text_change, time_change
+
+def calc_changes(set_1, set_2, mappings=None):
+    """Calculate how much changed between 2 SubtitleSets.
+
+    Returns a (text_change, time_change) tuple.
+    """
+    return _calc_changes(_items(set_1, mappings), _items(set_2, mappings))
+
+def _diff_row(item_1, item_2):
+    return {
+        'time_changed': _timing(item_1) != _timing(item_2),
+        'text_changed': item_1.text != item_2.text,
+        'subtitles': [item_1, item_2],
+    }
+
+def _unaligned_rows(items_1, items_2):
+    return [_diff_row(item_1, item_2) for item_1, item_2 in
+            izip_longest(items_1, items_2, fillvalue=BLANK_ITEM)]
+
+def diff(set_1, set_2, mappings=None):
+    """Diff 2 SubtitleSets.  See the module docstring for the format."""
+    items_1 = _items(set_1, mappings)
+    items_2 = _items(set_2, mappings)
+    text_change, time_change = _calc_changes(items_1, items_2)
+
+    subtitle_data = []
+    pos_1 = pos_2 = 0
+    aligned = match_sequences([_timing(item) for item in items_1],
+                              [_timing(item) for item in items_2])
+    for i, j in aligned:
+        subtitle_data.extend(_unaligned_rows(items_1[pos_1:i],
+                                             items_2[pos_2:j]))
+        subtitle_data.append(_diff_row(items_1[i], items_2[j]))
+        pos_1, pos_2 = i + 1, j + 1
+    subtitle_data.extend(_unaligned_rows(items_1[pos_1:], items_2[pos_2:]))
+
+    return {
+        'changed': bool(text_change or time_change),
+        'text_changed': text_change,
+        'time_changed': time_change,
+        'subtitle_data': subtitle_data,
+    }
@@ -0,0 +1,50 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from subtitles.models import SubtitleLanguage, SubtitleLanguageDependency
+
+class Command(BaseCommand):
+    help = u'Build the SubtitleLanguageDependency rows for existing languages'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=1000, help='Number of languages to handle at once'),
+        make_option('--start-id', dest='start_id', type='int', default=0,
+                    help='Start with languages after this id'),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        last_id = options['start_id']
+        count = 0
+        while True:
+            languages = list(SubtitleLanguage.objects.filter(id__gt=last_id)
+                             .order_by('id')[:options['chunk_size']])
+            if not languages:
+                break
+            for language in languages:
+                SubtitleLanguageDependency.update_for_language(language)
+            last_id = languages[-1].id
+            count += len(languages)
+            if verbosity >= 1:
+                self.stdout.write("%d languages (last id: %d)\n" % (
+                    count, last_id))
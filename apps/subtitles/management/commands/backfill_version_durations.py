@@ -0,0 +1,61 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from collections import defaultdict
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from subtitles.models import SubtitleVersion
+from utils.chunkediter import keyset_chunks
+
+class Command(BaseCommand):
+    help = u'Store the subtitle duration for versions that are missing it'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=1000, help='Number of versions to handle at once'),
+        make_option('--start-id', dest='start_id', type='int', default=0,
+                    help='Start with versions after this id'),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        versions = (SubtitleVersion.objects.full()
+                    .filter(duration=None, id__gt=options['start_id']))
+        count = 0
+        for chunk in keyset_chunks(versions, options['chunk_size']):
+            self.update_chunk(chunk)
+            count += len(chunk)
+            if verbosity >= 1:
+                self.stdout.write("%d versions (last id: %d)\n" % (
+                    count, chunk[-1].id))
+
+    def update_chunk(self, versions):
+        ids_by_duration = defaultdict(list)
+        for version in versions:
+            try:
+                duration = version.get_duration()
+            except StandardError, e:
+                self.stderr.write("Error parsing subtitles for version "
+                                  "%d: %s\n" % (version.id, e))
+                continue
+            ids_by_duration[duration].append(version.id)
+        for duration, version_ids in ids_by_duration.items():
+            (SubtitleVersion.objects.full().filter(id__in=version_ids)
+             .update(duration=duration))
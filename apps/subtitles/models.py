@@ -18,13 +18,12 @@
 
 """Django models represention subtitles."""
 
-import itertools
 from datetime import datetime, date, timedelta
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
 from django.db.models import query, Q
 from django.utils import simplejson as json
 from django.utils.translation import ugettext_lazy as _
@@ -32,12 +31,13 @@ from django.utils.translation import ugettext_lazy as _
 from apps.subtitles import cache
 from apps.subtitles import shims
 from apps.auth.models import CustomUser as User
+from apps.comments.models import CommentCountField
 from apps.videos import metadata
 from apps.videos.models import Video, Action
 from babelsubs.storage import SubtitleSet
-from babelsubs.storage import calc_changes
 from babelsubs.generators.html import HTMLGenerator
 from babelsubs import load_from
+from subtitles import diff
 from subtitles import signals
 from videos.behaviors import make_video_title
 
@@ -54,21 +54,6 @@ WRITELOCK_EXPIRATION = 30 # 30 seconds
 
 
 # Utility functions -----------------------------------------------------------
-def mapcat(fn, iterable):
-    """Mapcatenate.
-
-    Map the given function over the given iterable.  Each mapping should result
-    in an interable itself.  Concatenate these results.
-
-    E.g.:
-
-        foo = lambda i: [i, i+1]
-        mapcatenate(foo, [20, 200, 2000])
-        [20, 21, 200, 201, 2000, 2001]
-
-    """
-    return itertools.chain.from_iterable(itertools.imap(fn, iterable))
-
 def ensure_stringy(val):
     """Ensure the given value is a stringy type, like str or unicode.
 
@@ -141,6 +126,42 @@ def get_lineage(parents):
     return lineage
 
 
+# Duration --------------------------------------------------------------------
+def calc_duration(subtitles):
+    """Calculate the duration of a SubtitleSet in milliseconds.
+
+    This is the time from the start of the first subtitle to the end of the
+    last one.  Returns 0 if the subtitles aren't timed.
+    """
+    subs = list(subtitles)
+
+    for sub in subs:
+        if sub.start_time is not None:
+            start_time = sub.start_time
+            break
+        # we shouldn't have an end time set without a start time, but handle
+        # it just in case
+        if sub.end_time is not None:
+            start_time = sub.end_time
+            break
+    else:
+        return 0
+
+    for sub in reversed(subs):
+        if sub.end_time is not None:
+            end_time = sub.end_time
+            break
+        # we shouldn't have an end time not set, but check for that just in
+        # case
+        if sub.start_time is not None:
+            end_time = sub.start_time
+            break
+    else:
+        return 0
+
+    return end_time - start_time
+
+
 class SubtitleLanguagageQuerySet(query.QuerySet):
     def fetch_and_join(self, public_tips=False, private_tips=False,
                        video=None):
@@ -163,22 +184,29 @@ class SubtitleLanguagageQuerySet(query.QuerySet):
         if video is not None:
             for lang in langs:
                 lang.video = video
+        join_tips(langs, public_tips, private_tips)
+        return langs
 
-        def join_tips(base_qs, cache_name):
-            qs = base_qs.filter(subtitle_language__in=langs)
-            version_map = dict((v.subtitle_language_id, v) for v in qs)
-            for lang in langs:
-                version = version_map.get(lang.id)
-                lang.set_tip_cache(cache_name, version)
-                if version is not None:
-                    lang.optimize_loaded_version(version)
-
-        if public_tips:
-            join_tips(SubtitleVersion.objects.public_tips(), 'public')
-        if private_tips:
-            join_tips(SubtitleVersion.objects.private_tips(), 'extant')
+def join_tips(langs, public_tips=False, private_tips=False):
+    """Fetch the tips for a list of languages and set their tip caches.
 
-        return langs
+    This uses 1 query for each type of tip.  See fetch_and_join().
+    """
+    def _join_tips(base_qs, cache_name):
+        qs = base_qs.filter(subtitle_language__in=langs)
+        version_map = dict((v.subtitle_language_id, v) for v in qs)
+        for lang in langs:
+            version = version_map.get(lang.id)
+            lang.set_tip_cache(cache_name, version)
+            if version is not None:
+                lang.optimize_loaded_version(version)
+
+    if not langs:
+        return
+    if public_tips:
+        _join_tips(SubtitleVersion.objects.public_tips(), 'public')
+    if private_tips:
+        _join_tips(SubtitleVersion.objects.private_tips(), 'extant')
 
 # SubtitleLanguages -----------------------------------------------------------
 class SubtitleLanguageManager(models.Manager):
@@ -200,6 +228,40 @@ class SubtitleLanguageManager(models.Manager):
     def get_query_set(self):
         return SubtitleLanguagageQuerySet(self.model)
 
+    def translation_sources(self, languages):
+        """Get the translation sources for a list of languages.
+
+        This works like get_translation_source_language(), but uses 1 query
+        for all the languages.  Returns a dict that maps language ids to
+        (source_language_id, source_language_code) tuples.  Languages that
+        aren't translations (including forked ones) aren't in the dict.
+        """
+        language_ids = [l.id for l in languages if not l.is_forked]
+        if not language_ids:
+            return {}
+        cursor = connection.cursor()
+        cursor.execute("""\
+SELECT children.subtitle_language_id, children.version_number,
+       parents.subtitle_language_id, parents.language_code
+FROM subtitles_subtitleversion children
+JOIN subtitles_subtitleversion_parents pmap
+    ON children.id=pmap.from_subtitleversion_id
+JOIN subtitles_subtitleversion parents
+    ON parents.id=pmap.to_subtitleversion_id
+WHERE children.subtitle_language_id IN (%s) AND
+      parents.subtitle_language_id != children.subtitle_language_id""" %
+                       ', '.join(['%s'] * len(language_ids)), language_ids)
+        # like _get_translation_source_version(), use the parent of the
+        # latest version that has one from a different language
+        sources = {}
+        latest = {}
+        for (language_id, version_number, source_id,
+             source_code) in cursor.fetchall():
+            if version_number > latest.get(language_id, -1):
+                latest[language_id] = version_number
+                sources[language_id] = (source_id, source_code)
+        return sources
+
     def having_versions(self):
         """Return a QS of SLs that have at least 1 version.
 
@@ -375,15 +437,6 @@ class SubtitleLanguage(models.Model):
     # been changed to be a standalone language.
     is_forked = models.BooleanField(default=False)
 
-    # Writelocking
-    writelock_time = models.DateTimeField(null=True, blank=True,
-                                          editable=False)
-    writelock_owner = models.ForeignKey(User, null=True, blank=True,
-                                        editable=False,
-                                        related_name='writelocked_newlanguages')
-    writelock_session_key = models.CharField(max_length=255, blank=True,
-                                             editable=False)
-
     # Denormalized signoff/collaborator count fields.
     # These are stored here for speed of retrieval and filtering.
     #
@@ -405,6 +458,10 @@ class SubtitleLanguage(models.Model):
     pending_signoff_expired_count = models.PositiveIntegerField(default=0,
                                                                 editable=False)
 
+    # Denormalized count of comments on the language, maintained by the
+    # Comment save/delete signal handlers.
+    comment_count = CommentCountField()
+
     followers = models.ManyToManyField(User, blank=True,
             related_name='new_followed_languages', editable=False)
 
@@ -420,58 +477,98 @@ class SubtitleLanguage(models.Model):
         self._translation_source_version_cache = {}
 
     # Writelocking
+    #
+    # The locks are stored in SubtitleLanguageLock, so that taking and
+    # renewing them doesn't need to save the language.
+    def _get_writelock(self):
+        """Get the active SubtitleLanguageLock for this language, or None."""
+        if not hasattr(self, '_writelock'):
+            if self.pk is None:
+                self._writelock = None
+            else:
+                self._writelock = SubtitleLanguageLock.objects.get_active(
+                    self.pk)
+        return self._writelock
+
+    def set_writelock_cache(self, lock):
+        """Set the cached lock for this language.
+
+        Use this with SubtitleLanguageLock.objects.for_video() to avoid a
+        query per language.
+        """
+        self._writelock = lock
+
     @property
     def is_writelocked(self):
         """Return whether this language is writelocked for subtitling."""
-        if self.writelock_time == None:
-            return False
-        delta = datetime.now() - self.writelock_time
-        seconds = delta.days * 24 * 60 * 60 + delta.seconds
-        return seconds < WRITELOCK_EXPIRATION
+        return self._get_writelock() is not None
+
+    @property
+    def writelock_owner(self):
+        lock = self._get_writelock()
+        return lock.owner if lock is not None else None
+
+    @property
+    def writelock_session_key(self):
+        lock = self._get_writelock()
+        return lock.session_key if lock is not None else ''
+
+    @property
+    def writelock_time(self):
+        lock = self._get_writelock()
+        return lock.time if lock is not None else None
 
     def can_writelock(self, key):
         """Return whether a user with the session key can writelock this language."""
         return self.writelock_session_key == key or not self.is_writelocked
 
+    def try_writelock(self, user, key):
+        """Writelock this language unless someone else has the lock.
+
+        This checks and takes the lock atomically, so use it rather than
+        can_writelock() followed by writelock().  If we already have the lock
+        this renews it.
+
+        Returns True if we got the lock.
+        """
+        if self.pk is None:
+            self.save()
+        self._writelock = SubtitleLanguageLock.objects.acquire(self, user,
+                                                               key)
+        if self._writelock is None:
+            # someone else has it, we'll need to look it up to see who
+            del self._writelock
+            return False
+        return True
+
     def writelock(self, user, key, save=True):
-        """Writelock this language for subtitling and save it.
+        """Writelock this language for subtitling.
 
-        This method does NO permission checking.  If you want that you'll need
-        to use can_writelock() yourself before calling this (probably in
-        a transaction).
+        This method does NO permission checking.  If you want that, use
+        try_writelock() instead.
 
         `user` is the User who should own the lock.
 
         `key` is their session key which you can get through request.browser_id
 
-        `save` determines whether this method will save the SubtitleLanguage for
-        you.  Pass False if you want to handle saving yourself.
+        `save` is ignored.  Taking the lock doesn't change the language, but
+        unsaved languages get saved, since the lock needs their id.
 
         """
-        if user.is_authenticated():
-            self.writelock_owner = user
-        else:
-            self.writelock_owner = None
-
-        self.writelock_session_key = key
-        self.writelock_time = datetime.now()
-
-        if save:
+        if self.pk is None:
             self.save()
+        self._writelock = SubtitleLanguageLock.objects.acquire(
+            self, user, key, force=True)
 
     def release_writelock(self, save=True):
-        """Writelock this language for subtitling and save it.
+        """Release the writelock on this language.
 
-        `save` determines whether this method will save the SubtitleLanguage
-        for you.  Pass False if you want to handle saving yourself.
+        `save` is ignored.  Releasing the lock doesn't change the language.
 
         """
-        self.writelock_owner = None
-        self.writelock_session_key = ''
-        self.writelock_time = None
-
-        if save:
-            self.save()
+        if self.pk is not None:
+            SubtitleLanguageLock.objects.release(self.pk)
+        self._writelock = None
 
     def get_writelock_owner_name(self):
         """Return the human-readable name of the owner of this language's writelock.
@@ -770,6 +867,7 @@ class SubtitleLanguage(models.Model):
             # save the video to commit the changes to it
             self.video.save()
         self._sanity_check_parents(sv, parents)
+        sv.update_changes(commit=False)
 
         sv.full_clean()
         sv.save()
@@ -779,6 +877,7 @@ class SubtitleLanguage(models.Model):
 
         cache.invalidate_language_cache(self)
         self.clear_tip_cache()
+        SubtitleLanguageDependency.update_for_language(self)
         if sv.is_public():
             signals.public_tip_changed.send(self, version=sv)
         return sv
@@ -1006,41 +1105,21 @@ LIMIT 1;""", (self.id, self.id))
             >>> en.get_dsl(direct=True)
             [fr]
 
-        Note that this is NOT going to be very performant.
-
-        This is a shim for the existing UI.  Once the new one comes this
-        monstrosity will be torn out.
+        This is a single query using the SubtitleLanguageDependency table.
 
         """
-        # Start with all the subtitle languages for the video.
-        sls = self.video.newsubtitlelanguage_set
-
-        # Exclude this one.
-        sls = sls.exclude(id=self.id)
-
-        # Exclude those that are already forked.  They can't be dependents.
-        sls = sls.exclude(is_forked=True)
-
-        # Realize the query to get the list of remaining SubtitleLanguages that
-        # could possibly be dependents.  Hopefully there shouldn't be too many.
+        sls = SubtitleLanguage.objects.filter(is_forked=False)
+        # filter on both fields in the same call so that they use the same
+        # join
+        if direct:
+            sls = sls.filter(dependency_sources__source=self,
+                             dependency_sources__direct=True)
+        else:
+            sls = sls.filter(dependency_sources__source=self)
         sls = list(sls)
-
-        # Check the lineage maps for the candidates to determine if they're
-        # dependents.
-        results = []
         for sl in sls:
-            tip = sl.get_tip()
-            if tip and self.language_code in tip.lineage:
-                results.append(sl)
-
-        # Direct translations are restricted to those that come directly from
-        # the source language (this).
-        if direct:
-            lc = self.language_code
-            results = [sl for sl in results
-                       if sl.get_translation_source_language_code() == lc]
-
-        return results
+            sl.video = self.video
+        return sls
 
 
     def fork(self):
@@ -1116,6 +1195,105 @@ LIMIT 1;""", (self.id, self.id))
 
 
 # SubtitleVersions ------------------------------------------------------------
+class SubtitleLanguageLockManager(models.Manager):
+    def _threshold(self):
+        return datetime.now() - timedelta(seconds=WRITELOCK_EXPIRATION)
+
+    def active(self):
+        """Return a queryset of the locks that haven't expired."""
+        return self.get_query_set().filter(time__gt=self._threshold())
+
+    def get_active(self, language_id):
+        try:
+            return self.active().get(language=language_id)
+        except SubtitleLanguageLock.DoesNotExist:
+            return None
+
+    def for_video(self, video):
+        """Get the active locks for a video's languages.
+
+        Returns a dict that maps language ids to locks.
+        """
+        return dict((lock.language_id, lock)
+                    for lock in self.active().filter(video=video))
+
+    def locked_language_codes(self, video_id):
+        """Get the codes of the writelocked languages for a video.
+
+        video_id is the Video.video_id string.
+        """
+        return list(self.active().filter(video__video_id=video_id)
+                    .values_list('language__language_code', flat=True))
+
+    def acquire(self, language, user, key, force=False):
+        """Take or renew the lock for a language.
+
+        Unless force is given, this fails if a different session holds an
+        unexpired lock.  Returns the lock, or None if we didn't get it.
+        """
+        if user is not None and user.is_authenticated():
+            owner = user
+        else:
+            owner = None
+        lock = SubtitleLanguageLock(language_id=language.pk,
+                                    video_id=language.video_id, owner=owner,
+                                    session_key=key, time=datetime.now())
+        # First try to take over an existing lock with an UPDATE.  The WHERE
+        # clause makes the check and the update atomic.
+        existing = self.get_query_set().filter(language=language.pk)
+        if not force:
+            existing = existing.filter(Q(session_key=key) |
+                                       Q(time__lte=self._threshold()))
+        if existing.update(owner=owner, session_key=key, time=lock.time):
+            return lock
+        if not force and self.get_query_set().filter(
+                language=language.pk).exists():
+            return None
+        # No lock row yet.  If someone else creates it first, the INSERT
+        # fails and they have the lock.
+        sid = transaction.savepoint()
+        try:
+            lock.save(force_insert=True)
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            if force:
+                # the other lock is there now, so we can take it over
+                return self.acquire(language, user, key, force=True)
+            return None
+        transaction.savepoint_commit(sid)
+        return lock
+
+    def release(self, language_id, key=None):
+        """Release the lock for a language.
+
+        If key is given, only release it if that session holds it.
+        """
+        qs = self.get_query_set().filter(language=language_id)
+        if key is not None:
+            qs = qs.filter(session_key=key)
+        qs.delete()
+
+class SubtitleLanguageLock(models.Model):
+    """Editor writelock for a SubtitleLanguage.
+
+    Locks are leases: they expire WRITELOCK_EXPIRATION seconds after they were
+    taken or last renewed.  Expired rows get taken over by the next session
+    that wants the lock.  video is denormalized so that we can get all the
+    locks for a video with 1 query.
+    """
+    language = models.OneToOneField(SubtitleLanguage, primary_key=True,
+                                    related_name='writelock_lease')
+    video = models.ForeignKey(Video, related_name='subtitle_language_locks')
+    owner = models.ForeignKey(User, null=True, blank=True,
+                              related_name='subtitle_language_locks')
+    session_key = models.CharField(max_length=255)
+    time = models.DateTimeField()
+
+    objects = SubtitleLanguageLockManager()
+
+    def __unicode__(self):
+        return u'Lock for %s (%s)' % (self.language_id, self.session_key)
+
 class SubtitleVersionManager(models.Manager):
     use_for_related_fields = True
 
@@ -1259,6 +1437,15 @@ class SubtitleVersion(models.Model):
 
     version_number = models.PositiveIntegerField(default=1)
 
+    # How much the timing and text changed since the previous version.  These
+    # get calculated when the version is created and reset when the previous
+    # version changes (because a version got deleted, for example).  See
+    # get_changes().
+    time_change_ratio = models.FloatField(null=True, blank=True,
+                                          editable=False)
+    text_change_ratio = models.FloatField(null=True, blank=True,
+                                          editable=False)
+
     author = models.ForeignKey(User, default=User.get_anonymous,
                                related_name='newsubtitleversion_set')
 
@@ -1285,6 +1472,10 @@ class SubtitleVersion(models.Model):
     # Denormalized count of the number of subtitles this version contains, for
     # easier filtering later.
     subtitle_count = models.PositiveIntegerField(default=0)
+    # Denormalized duration of the subtitles in milliseconds, so that we
+    # don't have to parse them to bill for them.  This is None for versions
+    # created before we started storing it, use get_duration() to read it.
+    duration = models.IntegerField(null=True, blank=True, editable=False)
 
     created = models.DateTimeField(editable=False)
 
@@ -1358,6 +1549,7 @@ class SubtitleVersion(models.Model):
                                 % str(type(subtitles)))
 
         self.subtitle_count = len(subtitles)
+        self.duration = calc_duration(subtitles)
         self.serialized_subtitles = compress(subtitles.to_xml())
 
         # We cache the parsed subs for speed.
@@ -1418,6 +1610,9 @@ class SubtitleVersion(models.Model):
         if lineage != None:
             self.lineage = lineage
 
+        self._initial_visibility_override = self.__dict__.get(
+            'visibility_override')
+
     def __unicode__(self):
         return u'SubtitleVersion %s / %s / %s v%s' % (
             (self.id or '(unsaved)'), self.video.video_id,
@@ -1456,77 +1651,108 @@ class SubtitleVersion(models.Model):
         else:
             Action.create_caption_handler(self, self.created)
 
-        return super(SubtitleVersion, self).save(*args, **kwargs)
+        rv = super(SubtitleVersion, self).save(*args, **kwargs)
+
+        if (not creating and
+            self.visibility_override != self._initial_visibility_override):
+            # Deleting/undeleting a version changes which version is the
+            # previous version for the versions after it.  Reset their change
+            # ratios so that they get recalculated.
+            (SubtitleVersion.objects
+             .filter(subtitle_language=self.subtitle_language_id,
+                     version_number__gt=self.version_number)
+             .update(time_change_ratio=None, text_change_ratio=None))
+            # It can also change the tip, and with it the lineage
+            self.subtitle_language.clear_tip_cache()
+            SubtitleLanguageDependency.update_for_language(
+                self.subtitle_language)
+        self._initial_visibility_override = self.visibility_override
+
+        return rv
 
 
     def get_ancestors(self):
         """Return all ancestors of this version.  WARNING: MAY EAT YOUR DB!
 
         Returning all ancestors of a version is very database-intensive, because
-        we need to walk each relation.  It will make roughly l^b database calls,
-        where l is the length of a branch of history and b is the "branchiness".
+        we need to walk each relation.  It will make roughly one database call
+        for each ancestor.
 
         You probably don't need this.  You probably want to use the lineage
         instead.  This is mostly here for sanity tests.
 
         """
-        def _ancestors(version):
-            return [version] + list(mapcat(_ancestors, version.parents.full()))
-
-        return set(mapcat(_ancestors, self.parents.full()))
+        ancestors = set()
+        to_visit = list(self.parents.full())
+        while to_visit:
+            parent = to_visit.pop()
+            if parent not in ancestors:
+                ancestors.add(parent)
+                to_visit.extend(parent.parents.full())
+        return ancestors
+
+    def get_duration(self):
+        """Get the duration of the subtitles in milliseconds."""
+        if self.duration is None:
+            return calc_duration(self.get_subtitles())
+        return self.duration
 
     def get_subtitle_count(self):
         # TODO: babelsubs now supports len() on SubtitleSet instances
         return len([s for s in self.get_subtitles().subtitle_items()])
 
-    def get_changes(self):
-        """Return (time_change, text_change).
-
-        Beware.
-
-        This was ported over from the old data model as a hack.  There are
-        probably lots of cases where it doesn't work right.
-
-        What we *really* need to do is sit down and come up with a scheme for
-        diffing subtitle versions meaningfully.  Until then, we have this
-        monstrosity.  Godspeed.
-
-        """
-        # TODO: Time only changes aren't quite right.
-
-        if hasattr(self, '_time_change') and hasattr(self, '_text_change'):
-            return (self._time_change, self._text_change)
-
+    def _calc_changes(self):
         parent = self.previous_version()
 
         if not parent:
             return (1.0, 1.0)
 
-        self._text_change, self._time_change = calc_changes(
+        text_change, time_change = diff.calc_changes(
             parent.get_subtitles(), self.get_subtitles(),
             HTMLGenerator.MAPPINGS)
+        return time_change, text_change
 
-        return self._time_change, self._text_change
+    def update_changes(self, commit=True):
+        """Calculate and store time_change_ratio and text_change_ratio.
+
+        If commit is True, we save the values to the DB with an UPDATE
+        query.
+        """
+        self.time_change_ratio, self.text_change_ratio = self._calc_changes()
+        if commit and self.pk:
+            SubtitleVersion.objects.filter(pk=self.pk).update(
+                time_change_ratio=self.time_change_ratio,
+                text_change_ratio=self.text_change_ratio)
+
+    def get_changes(self):
+        """Return (time_change, text_change).
+
+        These are the fractions of the timing and text that changed compared
+        to the previous (non-deleted) version.  They get calculated when the
+        version is created, if they're missing we calculate them now and
+        store them.
+        """
+        if self.time_change_ratio is None or self.text_change_ratio is None:
+            self.update_changes()
+        return self.time_change_ratio, self.text_change_ratio
 
     @property
     def time_change(self):
-        if not hasattr(self, '_time_change'):
-            self.get_changes()
+        time_change = self.get_changes()[0]
 
-        if not self._time_change:
+        if not time_change:
             return '0%'
         else:
-            return '%.0f%%' % (self._time_change * 100)
+            return '%.0f%%' % (time_change * 100)
 
     @property
     def text_change(self):
-        if not hasattr(self, '_text_change'):
-            self.get_changes()
+        text_change = self.get_changes()[1]
 
-        if not self._text_change:
+        if not text_change:
             return '0%'
         else:
-            return '%.0f%%' % (self._text_change * 100)
+            return '%.0f%%' % (text_change * 100)
 
     def is_tip(self, public=True):
         qs = SubtitleVersion.objects.filter(
@@ -1790,6 +2016,78 @@ class SubtitleVersion(models.Model):
                 [self.video.video_id, self.language_code, self.subtitle_language.pk,
                  self.pk])
 
+class SubtitleLanguageDependency(models.Model):
+    """Index of which languages are translated from which other languages.
+
+    There's a row for every language in the lineage of a language's tip
+    (ignoring deleted versions).  direct is True for the language that it was
+    directly translated from.  This is what
+    SubtitleLanguage.get_dependent_subtitle_languages() returns, without
+    having to fetch the tip for every language of the video.
+
+    Rows don't depend on is_forked, since the code that forks and unforks
+    languages sets it directly.  Queries need to exclude forked languages
+    themselves.
+
+    Rows get updated by update_for_language(), which gets called when
+    versions are added and when they get deleted or undeleted.  The rows for
+    existing languages get built by a data migration, which runs the
+    backfill_language_dependencies command.
+    """
+    source = models.ForeignKey(SubtitleLanguage,
+                               related_name='dependency_translations')
+    translation = models.ForeignKey(SubtitleLanguage,
+                                    related_name='dependency_sources')
+    direct = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = [('source', 'translation')]
+
+    @classmethod
+    def calc_for_language(cls, language):
+        """Calculate the dependencies for a language.
+
+        Returns a dict mapping source language ids to the value for direct.
+        """
+        tip = language.get_tip()
+        if tip is None:
+            return {}
+        codes = set(tip.lineage) - set([language.language_code])
+        if not codes:
+            return {}
+        source_version = language._get_translation_source_version(
+            ignore_forking=True)
+        if source_version is not None:
+            direct_id = source_version.subtitle_language_id
+        else:
+            direct_id = None
+        source_ids = (SubtitleLanguage.objects
+                      .filter(video=language.video_id,
+                              language_code__in=codes)
+                      .values_list('id', flat=True))
+        return dict((source_id, source_id == direct_id)
+                    for source_id in source_ids)
+
+    @classmethod
+    def update_for_language(cls, language):
+        """Update the rows for a language after its tip changed."""
+        wanted = cls.calc_for_language(language)
+        existing = dict(cls.objects.filter(translation=language)
+                        .values_list('source_id', 'direct'))
+        if wanted == existing:
+            return
+        stale = [source_id for source_id, direct in existing.items()
+                 if wanted.get(source_id) != direct]
+        if stale:
+            (cls.objects.filter(translation=language, source__in=stale)
+             .delete())
+        cls.objects.bulk_create([
+            cls(source_id=source_id, translation_id=language.id,
+                direct=direct)
+            for source_id, direct in wanted.items()
+            if existing.get(source_id) != direct
+        ])
+
 class SubtitleVersionMetadata(models.Model):
     """This model is used to add extra metadata to SubtitleVersions.
 
@@ -56,6 +56,7 @@ a nutshell:
 
 from django.db import transaction
 
+from apps.auth.models import CustomUser as User
 from apps.subtitles.models import (
     SubtitleLanguage, SubtitleVersion, ORIGIN_ROLLBACK, ORIGIN_API,
     ORIGIN_UPLOAD, ORIGIN_WEB_EDITOR
@@ -310,7 +311,7 @@ def _update_visibility_and_tasks(team_video, version, committer, complete):
 def _update_followers(subtitle_language, author):
     """Update language followers when adding a new version."""
     if author:
-        subtitle_language.followers.add(author)
+        User.follow_languages([(author.id, subtitle_language.id)])
 
 def _update_video_data(subtitle_language, version):
     if version.is_public() and subtitle_language.is_primary_audio_language():
@@ -326,8 +327,12 @@ def _update_video_data(subtitle_language, version):
             video.save()
 
 def _fork_dependents(subtitle_language):
-    for dsl in subtitle_language.get_dependent_subtitle_languages(direct=True):
-        dsl.fork()
+    dependent_ids = [dsl.id for dsl in
+                     subtitle_language.get_dependent_subtitle_languages(
+                         direct=True)]
+    if dependent_ids:
+        (SubtitleLanguage.objects.filter(id__in=dependent_ids)
+         .update(is_forked=True))
 
 def _get_version(video, v):
     """Get the appropriate SV belonging to the given video.
@@ -324,9 +324,6 @@ def _add_sl(sl):
         video=sl.video,
         language_code=sl.language,
         subtitles_complete=sl.is_complete,
-        writelock_time=sl.writelock_time,
-        writelock_session_key=sl.writelock_session_key,
-        writelock_owner=sl.writelock_owner,
         is_forked=sl.is_forked,
     )
 
@@ -556,9 +553,6 @@ def _update_subtitle_language(sl):
     nsl.video = sl.video
     nsl.language_code = sl.language
     nsl.subtitles_complete = sl.is_complete
-    nsl.writelock_time = sl.writelock_time
-    nsl.writelock_session_key = sl.writelock_session_key
-    nsl.writelock_owner = sl.writelock_owner
     nsl.is_forked = sl.is_forked
     nsl.subtitles_fetched_counter = sl.subtitles_fetched_counter.val
 
@@ -0,0 +1,102 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import difflib
+import random
+
+from babelsubs.storage import SubtitleSet
+from django.test import TestCase
+
+from subtitles import diff
+
+class MatchSequencesTest(TestCase):
+    def check_ratio(self, a, b):
+        expected = 1 - difflib.SequenceMatcher(None, a, b).ratio()
+        self.assertAlmostEqual(diff.change_ratio(a, b), expected)
+
+    def check_matches(self, a, b):
+        matches = diff.match_sequences(a, b)
+        for i, j in matches:
+            self.assertEquals(a[i], b[j])
+        for (i1, j1), (i2, j2) in zip(matches, matches[1:]):
+            self.assertTrue(i1 < i2 and j1 < j2)
+
+    def test_simple(self):
+        self.check_ratio([], [])
+        self.check_ratio(['a'], [])
+        self.check_ratio(['a', 'b', 'c'], ['a', 'c'])
+        self.check_ratio(['a', 'b', 'c'], ['a', 'x', 'c', 'd'])
+
+    def test_large_sequences(self):
+        # large enough that we use the anchors instead of difflib
+        rng = random.Random(0)
+        a = range(1000)
+        b = list(a)
+        for i in xrange(20):
+            b[rng.randint(0, len(b) - 1)] = -i
+        del b[500:510]
+        b[100:100] = [-100, -101]
+        self.check_matches(a, b)
+        self.check_ratio(a, b)
+
+class DiffTest(TestCase):
+    def make_set(self, items):
+        return SubtitleSet.from_list('en', items)
+
+    def test_no_changes(self):
+        subs = self.make_set([(0, 1000, 'a'), (1000, 2000, 'b')])
+        result = diff.diff(subs, subs)
+        self.assertEquals(result['changed'], False)
+        self.assertEquals(result['text_changed'], 0.0)
+        self.assertEquals(result['time_changed'], 0.0)
+        self.assertFalse(any(row['text_changed'] or row['time_changed']
+                             for row in result['subtitle_data']))
+
+    def test_alignment(self):
+        subs1 = self.make_set([
+            (0, 1000, 'a'),
+            (1000, 2000, 'b'),
+            (2000, 3000, 'c'),
+        ])
+        subs2 = self.make_set([
+            (0, 1000, 'a'),
+            (1000, 1500, 'b'),
+            (2000, 3000, 'changed'),
+            (3000, 4000, 'd'),
+        ])
+        rows = diff.diff(subs1, subs2)['subtitle_data']
+        self.assertEquals([(row['time_changed'], row['text_changed'])
+                           for row in rows], [
+            (False, False),
+            (True, False),
+            (False, True),
+            (True, True),
+        ])
+        # the new subtitle gets paired with a blank item
+        self.assertEquals(rows[3]['subtitles'][0], diff.BLANK_ITEM)
+        self.assertEquals(rows[3]['subtitles'][1].text, 'd')
+
+    def test_calc_changes(self):
+        subs1 = self.make_set([(0, 1000, 'Hello there')])
+        subs2 = self.make_set([
+            (0, 1000, 'Hello there'),
+            (2000, 3000, 'How are you?'),
+        ])
+        text_change, time_change = diff.calc_changes(subs1, subs2)
+        self.assertAlmostEqual(text_change, 1/3.0)
+        self.assertAlmostEqual(time_change, 1/3.0)
@@ -20,12 +20,14 @@ import datetime
 import json
 from unittest2 import skip
 
+from django.core.cache import cache
 from django.core.urlresolvers import  reverse
 from django.test import TestCase
 
 from auth.models import CustomUser
+from subtitles import pipeline
 from subtitles.tests.utils import (
-    make_video
+    make_video, make_subtitle_set
 )
 
 class EditorViewTest(TestCase):
@@ -76,6 +78,42 @@ class EditorViewTest(TestCase):
         self.assertEqual(self.user.username, data['authHeaders']['x-api-username'])
 
 
+    def _get_editor_data(self, video, language_code, base_language=None):
+        url = reverse("subtitles:subtitle-editor",
+                      args=(video.video_id, language_code))
+        if base_language:
+            url += '?base-language=%s' % base_language
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return self._get_boostrapped_data(response)
+
+    def test_languages_data(self):
+        cache.clear()
+        video = make_video()
+        pipeline.add_subtitles(video, 'en', make_subtitle_set('en'))
+        en_tip = pipeline.add_subtitles(video, 'en', make_subtitle_set('en', 5))
+        pipeline.add_subtitles(video, 'fr', make_subtitle_set('fr'),
+                               parents=[en_tip])
+        self._login()
+        data = self._get_editor_data(video, 'fr', 'en')
+        languages = dict((l['language_code'], l) for l in data['languages'])
+        self.assertEqual(languages['en']['numVersions'], 2)
+        self.assertEqual(languages['fr']['numVersions'], 1)
+        self.assertEqual([v['version_no'] for v in
+                          languages['en']['versions']], [1, 2])
+        # we should send the subtitles for the editing version and the tip of
+        # the base language
+        self.assertTrue('subtitles' in languages['fr']['versions'][0])
+        self.assertFalse('subtitles' in languages['en']['versions'][0])
+        self.assertTrue('subtitles' in languages['en']['versions'][1])
+        self.assertEqual(languages['en']['versions'][1]['subtitles'],
+                         en_tip.get_subtitles().to_xml())
+        self.assertTrue(languages['fr']['editingLanguage'])
+        # the 2nd time, the version data comes from the cache.  It should be
+        # the same.
+        self.assertEqual(self._get_editor_data(video, 'fr', 'en')['languages'],
+                         data['languages'])
+
     def test_permission(self):
         # test public video is ok
         # test video on hidden team to non members is not ok
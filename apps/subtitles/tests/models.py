@@ -21,7 +21,10 @@
 
 from __future__ import absolute_import 
 
+import datetime
+
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.test import TestCase
 
@@ -29,10 +32,13 @@ from babelsubs.storage import SubtitleSet
 
 from apps.auth.models import CustomUser as User
 from apps.subtitles import pipeline
-from apps.subtitles.models import SubtitleLanguage, SubtitleVersion
+from apps.subtitles.models import (
+    SubtitleLanguage, SubtitleLanguageDependency, SubtitleLanguageLock,
+    SubtitleVersion, WRITELOCK_EXPIRATION
+)
 from apps.subtitles.tests.utils import (
     make_video, make_video_2, make_video_3, make_sl, refresh, ids, parent_ids,
-    ancestor_ids
+    ancestor_ids, scan_dependents
 )
 from apps.teams.models import Team, TeamMember, TeamVideo
 from utils import test_factories
@@ -494,6 +500,25 @@ class TestSubtitleVersion(TestCase):
         self.assertAlmostEqual(1/3.0, sv3.get_changes()[0])
         self.assertEquals(1.0, sv3.get_changes()[1])
 
+    def test_changes_are_stored(self):
+        from subtitles.pipeline import add_subtitles
+
+        SubtitleVersion.objects.full().delete()
+        SubtitleLanguage.objects.all().delete()
+
+        add_subtitles(self.video, 'en', [(0, 1000, 'Hello there')])
+        sv2 = add_subtitles(self.video, 'en', [
+            (0, 1000, 'Hello there'),
+            (2000, 3000, 'How are you?'),
+        ])
+        sv2 = refresh(sv2)
+        self.assertAlmostEqual(sv2.time_change_ratio, 1/3.0)
+        self.assertAlmostEqual(sv2.text_change_ratio, 1/3.0)
+        # since the ratios are stored, we don't need to load the previous
+        # version to get them
+        with self.assertNumQueries(0):
+            sv2.get_changes()
+
     def test_subtitle_count(self):
         s0 = (100, 200, "a")
         s1 = (300, 400, "b")
@@ -592,6 +617,40 @@ class TestSubtitleVersion(TestCase):
         crazy = SubtitleVersion(version_number=4, rollback_of_version_number=200)
         self.assertRaises(ValidationError, lambda: crazy.full_clean())
 
+    def test_duration(self):
+        sv = self.sl_en.add_version(subtitles=[])
+        self.assertEqual(refresh(sv).duration, 0)
+
+        sv = self.sl_en.add_version(subtitles=[
+            (100, 200, "a"),
+            (300, 1500, "b"),
+        ])
+        self.assertEqual(refresh(sv).duration, 1400)
+
+        # untimed subtitles at the start/end don't count
+        sv = self.sl_en.add_version(subtitles=[
+            (None, None, "a"),
+            (300, 400, "b"),
+            (500, 1500, "c"),
+            (None, None, "d"),
+        ])
+        self.assertEqual(refresh(sv).duration, 1200)
+
+    def test_get_duration_without_stored_value(self):
+        sv = self.sl_en.add_version(subtitles=[(100, 2100, "a")])
+        SubtitleVersion.objects.filter(pk=sv.pk).update(duration=None)
+        self.assertEqual(refresh(sv).get_duration(), 2000)
+
+    def test_backfill_durations(self):
+        versions = [
+            self.sl_en.add_version(subtitles=[(0, 1000 * i, "a")])
+            for i in xrange(1, 6)
+        ]
+        SubtitleVersion.objects.full().update(duration=None)
+        call_command('backfill_version_durations', chunk_size=2, verbosity=0)
+        self.assertEqual([refresh(sv).duration for sv in versions],
+                         [1000 * i for i in xrange(1, 6)])
+
 
 class TestHistory(TestCase):
     def setUp(self):
@@ -831,6 +890,171 @@ class TestHistory(TestCase):
         self.assertEqual(f3.lineage, {'fr': 2})
 
 
+class TestDependentLanguages(TestCase):
+    def setUp(self):
+        self.video = make_video()
+        self.sl_en = make_sl(self.video, 'en')
+        self.sl_fr = make_sl(self.video, 'fr')
+        self.sl_de = make_sl(self.video, 'de')
+        self.sl_es = make_sl(self.video, 'es')
+        self.languages = [self.sl_en, self.sl_fr, self.sl_de, self.sl_es]
+
+    def make_translations(self):
+        # en -> fr -> de
+        #   \-> es
+        en1 = self.sl_en.add_version()
+        fr1 = self.sl_fr.add_version(parents=[en1])
+        self.sl_de.add_version(parents=[fr1])
+        self.sl_es.add_version(parents=[en1])
+
+    def check_dependents(self):
+        for sl in self.languages:
+            sl = refresh(sl)
+            for direct in (False, True):
+                self.assertEqual(
+                    self.codes(sl.get_dependent_subtitle_languages(direct)),
+                    self.codes(scan_dependents(sl, direct)))
+
+    def codes(self, languages):
+        return sorted(sl.language_code for sl in languages)
+
+    def test_dependents(self):
+        self.make_translations()
+        self.assertEqual(
+            self.codes(self.sl_en.get_dependent_subtitle_languages()),
+            ['de', 'es', 'fr'])
+        self.assertEqual(
+            self.codes(self.sl_en.get_dependent_subtitle_languages(True)),
+            ['es', 'fr'])
+        self.assertEqual(
+            self.codes(self.sl_fr.get_dependent_subtitle_languages(True)),
+            ['de'])
+        self.check_dependents()
+
+    def test_forked_languages(self):
+        self.make_translations()
+        self.sl_fr.fork()
+        self.assertEqual(
+            self.codes(self.sl_en.get_dependent_subtitle_languages()),
+            ['de', 'es'])
+        self.check_dependents()
+
+    def test_new_source(self):
+        self.make_translations()
+        # es gets retranslated from fr
+        self.sl_es.add_version(parents=[self.sl_fr.get_tip()])
+        self.check_dependents()
+
+    def test_deleted_versions(self):
+        self.make_translations()
+        de1 = self.sl_de.get_tip()
+        de1.visibility_override = 'deleted'
+        de1.save()
+        self.assertEqual(
+            self.codes(self.sl_fr.get_dependent_subtitle_languages()), [])
+        self.check_dependents()
+        de1.visibility_override = ''
+        de1.save()
+        self.check_dependents()
+
+    def test_query_count(self):
+        self.make_translations()
+        with self.assertNumQueries(1):
+            self.sl_en.get_dependent_subtitle_languages()
+
+    def test_backfill(self):
+        self.make_translations()
+        rows = sorted(SubtitleLanguageDependency.objects.values_list(
+            'source', 'translation', 'direct'))
+        SubtitleLanguageDependency.objects.all().delete()
+        call_command('backfill_language_dependencies', verbosity=0)
+        self.assertEqual(sorted(SubtitleLanguageDependency.objects.values_list(
+            'source', 'translation', 'direct')), rows)
+
+
+class TestWritelock(TestCase):
+    def setUp(self):
+        self.video = make_video()
+        self.sl_en = make_sl(self.video, 'en')
+        self.sl_fr = make_sl(self.video, 'fr')
+        self.user = test_factories.create_user()
+        self.other_user = test_factories.create_user()
+
+    def expire_locks(self):
+        SubtitleLanguageLock.objects.update(
+            time=datetime.datetime.now() -
+            datetime.timedelta(seconds=WRITELOCK_EXPIRATION + 1))
+
+    def test_lock(self):
+        self.assertFalse(self.sl_en.is_writelocked)
+        self.assertTrue(self.sl_en.try_writelock(self.user, 'key'))
+        sl_en = refresh(self.sl_en)
+        self.assertTrue(sl_en.is_writelocked)
+        self.assertEqual(sl_en.writelock_owner, self.user)
+        self.assertEqual(sl_en.writelock_session_key, 'key')
+        self.assertTrue(sl_en.can_writelock('key'))
+        self.assertFalse(sl_en.can_writelock('other-key'))
+        # other languages aren't affected
+        self.assertFalse(refresh(self.sl_fr).is_writelocked)
+
+    def test_other_sessions_cant_lock(self):
+        self.assertTrue(self.sl_en.try_writelock(self.user, 'key'))
+        sl_en = refresh(self.sl_en)
+        self.assertFalse(sl_en.try_writelock(self.other_user, 'other-key'))
+        self.assertEqual(sl_en.writelock_owner, self.user)
+        # renewing our own lock works
+        self.assertTrue(sl_en.try_writelock(self.user, 'key'))
+
+    def test_expired_locks(self):
+        self.sl_en.try_writelock(self.user, 'key')
+        self.expire_locks()
+        sl_en = refresh(self.sl_en)
+        self.assertFalse(sl_en.is_writelocked)
+        self.assertTrue(sl_en.try_writelock(self.other_user, 'other-key'))
+        self.assertEqual(refresh(self.sl_en).writelock_owner,
+                         self.other_user)
+
+    def test_release(self):
+        self.sl_en.try_writelock(self.user, 'key')
+        # releasing with the wrong key doesn't do anything
+        SubtitleLanguageLock.objects.release(self.sl_en.pk, 'other-key')
+        self.assertTrue(refresh(self.sl_en).is_writelocked)
+        self.sl_en.release_writelock()
+        self.assertFalse(self.sl_en.is_writelocked)
+        self.assertFalse(refresh(self.sl_en).is_writelocked)
+
+    def test_force_lock(self):
+        self.sl_en.try_writelock(self.user, 'key')
+        sl_en = refresh(self.sl_en)
+        sl_en.writelock(self.other_user, 'other-key')
+        self.assertEqual(refresh(self.sl_en).writelock_owner,
+                         self.other_user)
+
+    def test_anonymous_user(self):
+        self.sl_en.try_writelock(User.get_anonymous(), 'key')
+        sl_en = refresh(self.sl_en)
+        self.assertTrue(sl_en.is_writelocked)
+        self.assertEqual(sl_en.writelock_owner, None)
+
+    def test_renew_query_count(self):
+        self.sl_en.try_writelock(self.user, 'key')
+        # renewing is a single UPDATE on the lock table
+        with self.assertNumQueries(1):
+            self.sl_en.try_writelock(self.user, 'key')
+
+    def test_for_video(self):
+        self.sl_en.try_writelock(self.user, 'key')
+        self.sl_fr.try_writelock(self.user, 'key')
+        self.expire_locks()
+        self.sl_en.try_writelock(self.user, 'key')
+        with self.assertNumQueries(1):
+            locks = SubtitleLanguageLock.objects.for_video(self.video)
+        self.assertEqual(locks.keys(), [self.sl_en.pk])
+        self.assertEqual(
+            SubtitleLanguageLock.objects.locked_language_codes(
+                self.video.video_id), ['en'])
+
+
 class TestSubtitleLanguageHavingQueries(TestCase):
     """Test the [not_]having[_public/_nonempty]_versions methods of the SL manager.
 
@@ -26,7 +26,9 @@ from babelsubs.storage import SubtitleSet, SubtitleLine
 
 from apps.auth.models import CustomUser as User
 from apps.subtitles import pipeline
-from apps.subtitles.models import SubtitleLanguage, SubtitleVersion
+from apps.subtitles.models import (
+    SubtitleLanguage, SubtitleVersion, ORIGIN_UPLOAD
+)
 from apps.subtitles.tests.utils import make_video, make_video_2
 
 
@@ -613,6 +615,26 @@ class TestBasicAdding(TestCase):
         _add(True, [(100,200, "hey"), (None, None, "there")])
         self.assertFalse(_get_sl_completion())
 
+class TestForking(TestCase):
+    def setUp(self):
+        self.video = make_video()
+
+    def _forked(self, language_code):
+        return SubtitleLanguage.objects.get(
+            video=self.video, language_code=language_code).is_forked
+
+    def test_fork_dependents(self):
+        # en -> fr -> de
+        en1 = pipeline.add_subtitles(self.video, 'en', None)
+        fr1 = pipeline.add_subtitles(self.video, 'fr', None, parents=[en1])
+        pipeline.add_subtitles(self.video, 'de', None, parents=[fr1])
+
+        # uploading to en should fork its direct dependents only
+        pipeline.add_subtitles(self.video, 'en', None, origin=ORIGIN_UPLOAD)
+        self.assertTrue(self._forked('fr'))
+        self.assertFalse(self._forked('de'))
+
+
 class TestRollbacks(TestCase):
     def setUp(self):
         self.video = make_video()
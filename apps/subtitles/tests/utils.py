@@ -61,6 +61,25 @@ def parent_ids(version):
 def ancestor_ids(version):
     return ids(version.get_ancestors())
 
+def scan_dependents(language, direct=False):
+    """Find the dependent languages by checking the tip of every language.
+
+    This is how get_dependent_subtitle_languages() used to work.  It doesn't
+    use the SubtitleLanguageDependency table, so we can use it to check it.
+    """
+    results = []
+    for sl in language.video.newsubtitlelanguage_set.exclude(id=language.id):
+        if sl.is_forked:
+            continue
+        tip = sl.get_tip()
+        if not tip or language.language_code not in tip.lineage:
+            continue
+        if (direct and sl.get_translation_source_language_code() !=
+            language.language_code):
+            continue
+        results.append(sl)
+    return results
+
 def make_subtitle_set(language_code, num_subs=4):
     sset = SubtitleSet(language_code)
     for x in xrange(0, num_subs):
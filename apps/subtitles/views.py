@@ -23,12 +23,14 @@ from django.contrib.auth.decorators import login_required
 
 from videos.models import Video
 from teams.models import Task
+from subtitles import cache
 from subtitles import shims
-from subtitles.models import SubtitleLanguage, SubtitleVersion
+from subtitles.models import (
+    SubtitleLanguage, SubtitleLanguageLock, SubtitleVersion
+)
 from subtitles.templatetags.new_subtitles_tags import visibility_display
 
 from django.http import HttpResponse
-from django.db.models import Count
 from django.contrib import messages
 from django.template import RequestContext
 from django.core.urlresolvers import reverse
@@ -52,31 +54,85 @@ def _version_data(version):
         'description': version.description,
     }
 
-def _language_data(language, editing_version, translated_from_version,
-                   base_language):
+def _versions_data(version_ids, loaded_versions):
+    '''
+    Get the version data for a list of version ids.
+
+    Decoding the subtitles is the slowest part of building the editor data,
+    so the data is cached per version.  loaded_versions is a list of versions
+    that we already have, we only fetch versions that are not in the cache
+    and not in that list.
+
+    Returns a dict mapping version ids to their data.
+    '''
+    data = cache.get_editor_version_data(version_ids)
+    missing = set(version_ids) - set(data)
+    if missing:
+        versions = dict((v.id, v) for v in loaded_versions
+                        if v is not None and v.id in missing)
+        to_fetch = missing - set(versions)
+        if to_fetch:
+            versions.update(SubtitleVersion.objects.in_bulk(to_fetch))
+        new_data = dict((version_id, _version_data(version))
+                        for version_id, version in versions.items())
+        cache.set_editor_version_data(new_data)
+        data.update(new_data)
+    return data
+
+def _video_versions(video):
+    '''
+    Get all versions for a video's languages with a single query.
+
+    Returns a dict mapping language ids to lists of versions.  The versions
+    only have the fields needed for the editor's version lists.
+    '''
+    versions = (SubtitleVersion.objects.full()
+                .filter(video=video)
+                .order_by('version_number')
+                .only('id', 'subtitle_language', 'version_number',
+                      'visibility', 'visibility_override'))
+    versions_by_language = {}
+    for version in versions:
+        versions_by_language.setdefault(version.subtitle_language_id,
+                                        []).append(version)
+    return versions_by_language
+
+def _editor_version_ids(languages, versions_by_language, editing_version,
+                        translated_from_version, base_language):
+    '''
+    Get the ids of the versions that we send subtitles for: the version
+    being edited, the translation source and the tip of the base language.
+    '''
+    version_ids = set()
+    if editing_version:
+        version_ids.add(editing_version.id)
+    if translated_from_version:
+        version_ids.add(translated_from_version.id)
+    for language in languages:
+        versions = versions_by_language.get(language.id)
+        if language.language_code == base_language and versions:
+            version_ids.add(versions[-1].id)
+    return version_ids
+
+def _language_data(language, versions, versions_data, editing_version,
+                   translated_from_version):
     '''
     Creates a dict with language info, suitable for encoding
     into json and bootstrapping the editor. Includes
     the version data for the version being edited and the
     original translation source, if any.
     '''
-    versions_data = []
+    versions_data_list = []
 
-    versions = list(language.subtitleversion_set.full())
-    for i, version in enumerate(versions):
+    for version in versions:
         version_data = {
             'version_no':version.version_number,
             'visibility': visibility_display(version),
         }
-        if editing_version == version:
-            version_data.update(_version_data(version))
-        elif translated_from_version == version:
-            version_data.update(_version_data(version))
-        elif (language.language_code == base_language and
-              i == len(versions) - 1):
-            version_data.update(_version_data(version))
+        if version.id in versions_data:
+            version_data.update(versions_data[version.id])
 
-        versions_data.append(version_data)
+        versions_data_list.append(version_data)
 
 
     subtitle_language = editing_version.subtitle_language if editing_version else ''
@@ -90,8 +146,8 @@ def _language_data(language, editing_version, translated_from_version,
         'language_code': language.language_code,
         'name': language.get_language_code_display(),
         'pk': language.pk,
-        'numVersions': language.num_versions,
-        'versions': versions_data,
+        'numVersions': len(versions),
+        'versions': versions_data_list,
         'subtitles_complete': language.subtitles_complete,
         'is_rtl': language.is_rtl(),
         'is_original': language.is_primary_audio_language()
@@ -101,10 +157,8 @@ def regain_lock(request, video_id, language_code):
     video = get_object_or_404(Video, video_id=video_id)
     language = video.subtitle_language(language_code)
 
-    if not language.can_writelock(request.browser_id):
+    if not language.try_writelock(request.user, request.browser_id):
         return HttpResponse(json.dumps({'ok': False}))
-
-    language.writelock(request.user, request.browser_id, save=True)
     return HttpResponse(json.dumps({'ok': True}))
 
 @login_required
@@ -113,8 +167,7 @@ def release_lock(request, video_id, language_code):
     video = get_object_or_404(Video, video_id=video_id)
     language = video.subtitle_language(language_code)
 
-    if language.can_writelock(request.browser_id):
-        language.release_writelock()
+    SubtitleLanguageLock.objects.release(language.pk, request.browser_id)
 
     return HttpResponse(json.dumps({'url': reverse('videos:video', args=(video_id,))}))
 
@@ -202,7 +255,10 @@ def subtitle_editor(request, video_id, language_code):
         messages.error(request, check_result.message)
         return redirect(video)
 
-    editing_language.writelock(request.user, request.browser_id, save=True)
+    if not editing_language.try_writelock(request.user, request.browser_id):
+        # someone else got the lock since we checked
+        messages.error(request, _("You can't edit this subtitle because it's locked"))
+        return redirect(video)
 
     # if this language is a translation, show both
     editing_version = editing_language.get_tip(public=False)
@@ -211,8 +267,15 @@ def subtitle_editor(request, video_id, language_code):
     translated_from_version = editing_language.\
         get_translation_source_version(ignore_forking=True)
 
-    languages = video.newsubtitlelanguage_set.annotate(
-        num_versions=Count('subtitleversion'))
+    languages = list(video.newsubtitlelanguage_set.all())
+    for language in languages:
+        # avoid a query per language for language.video
+        language.video = video
+    versions_by_language = _video_versions(video)
+    versions_data = _versions_data(
+        _editor_version_ids(languages, versions_by_language, editing_version,
+                            translated_from_version, base_language),
+        [editing_version, translated_from_version])
 
     video_urls = []
     for v in video.get_video_urls():
@@ -241,8 +304,10 @@ def subtitle_editor(request, video_id, language_code):
                               if editing_version else None),
         },
         'baseLanguage': base_language,
-        'languages': [_language_data(lang, editing_version,
-                                     translated_from_version, base_language)
+        'languages': [_language_data(lang,
+                                     versions_by_language.get(lang.id, []),
+                                     versions_data, editing_version,
+                                     translated_from_version)
                       for lang in languages],
         'languageCode': request.LANGUAGE_CODE,
         'oldEditorURL': editing_language.get_widget_url(),
@@ -262,7 +327,7 @@ def subtitle_editor(request, video_id, language_code):
         'version': editing_version,
         'translated_from_version': translated_from_version,
         'task': task,
-        'editor_data': json.dumps(editor_data, indent=4)
+        'editor_data': json.dumps(editor_data)
     }, context_instance=RequestContext(request))
 
 def download(request, video_id, language_code, filename, format,
@@ -16,11 +16,15 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 from collections import defaultdict
-from itertools import groupby
+from itertools import groupby, islice
 from math import ceil
+import cPickle
 import csv
 import datetime
+import heapq
 import logging
+import os
+import tempfile
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
@@ -49,10 +53,12 @@ from teams.permissions_const import (
     ROLE_CONTRIBUTOR
 )
 from videos.tasks import (
-    upload_subtitles_to_original_service, sync_latest_versions_for_video
+    upload_subtitles_to_original_service, sync_latest_versions_for_video,
+    sync_video_team_timeline
 )
 from teams import tasks
 from utils import DEFAULT_PROTOCOL
+from utils.chunkediter import keyset_chunks
 from utils.amazon import S3EnabledImageField, S3EnabledFileField
 from utils.panslugify import pan_slugify
 from utils.searching import get_terms
@@ -826,6 +832,7 @@ class TeamVideo(models.Model):
             self.project = new_team.default_project
 
         self.save()
+        sync_video_team_timeline.delay(self.video_id, new_team.id)
 
         # We need to make any as-yet-unmoderated versions public.
         # TODO: Dedupe this and the team video delete signal.
@@ -996,6 +1003,15 @@ def team_video_add_video_moderation(sender, instance, created, raw, **kwargs):
         instance.video.moderated_by = instance.team
         instance.video.save()
 
+def team_video_add_to_timelines(sender, instance, created, raw, **kwargs):
+    """Add the actions for a newly added TeamVideo to its team's timeline."""
+    if created and not raw:
+        sync_video_team_timeline.delay(instance.video_id, instance.team_id)
+
+def team_video_remove_from_timelines(sender, instance, **kwargs):
+    """Remove the actions for a deleted TeamVideo from its team's timeline."""
+    sync_video_team_timeline.delay(instance.video_id, None)
+
 def team_video_rm_video_moderation(sender, instance, **kwargs):
     """Clear the .moderated_by attribute on a newly deleted TeamVideo's Video, if necessary."""
     try:
@@ -1012,6 +1028,8 @@ post_save.connect(team_video_autocreate_task, TeamVideo, dispatch_uid='teams.tea
 post_save.connect(team_video_add_video_moderation, TeamVideo, dispatch_uid='teams.teamvideo.team_video_add_video_moderation')
 post_delete.connect(team_video_delete, TeamVideo, dispatch_uid="teams.teamvideo.team_video_delete")
 post_delete.connect(team_video_rm_video_moderation, TeamVideo, dispatch_uid="teams.teamvideo.team_video_rm_video_moderation")
+post_save.connect(team_video_add_to_timelines, TeamVideo, dispatch_uid='teams.teamvideo.team_video_add_to_timelines')
+post_delete.connect(team_video_remove_from_timelines, TeamVideo, dispatch_uid='teams.teamvideo.team_video_remove_from_timelines')
 language_deleted.connect(on_language_deleted, dispatch_uid="teams.subtitlelanguage.language_deleted")
 
 # TeamMember
@@ -1787,12 +1805,15 @@ class Task(models.Model):
     def add_cached_video_urls(tasks):
         """Add the cached_video_url attribute to a list of atkss
 
-        cached_video_url is the URL as a string for the video.
+        cached_video_url is the URL as a string for the video.  Use
+        select_related('team_video') when fetching the tasks to avoid a query
+        per task.
         """
-        team_video_pks = [t.team_video_id for t in tasks]
-        video_urls = (VideoUrl.objects
-                      .filter(video__teamvideo__id__in=team_video_pks)
-                      .filter(primary=True))
+        video_ids = set(t.team_video.video_id for t in tasks)
+        if not video_ids:
+            return
+        video_urls = VideoUrl.objects.filter(video__in=video_ids,
+                                             primary=True)
         video_url_map = dict((vu.video_id, vu.effective_url)
                              for vu in video_urls)
         for t in tasks:
@@ -2579,6 +2600,50 @@ class TeamNotificationSetting(models.Model):
         return u'NotificationSettings for team %s' % self.team
 
 
+# number of approve tasks to handle at once when generating billing reports
+REPORT_CHUNK_SIZE = 500
+# number of rows to sort in memory when generating billing reports
+REPORT_SORT_RUN_SIZE = 50000
+
+def _read_run(f):
+    while True:
+        try:
+            yield cPickle.load(f)
+        except EOFError:
+            return
+
+def _sort_rows(rows, key, run_size=None):
+    """Sort report rows by key without keeping them all in memory.
+
+    Rows get sorted in runs of run_size (REPORT_SORT_RUN_SIZE by default),
+    which are written to temp files, then merged.  Like sorted(), the sort is
+    stable.
+    """
+    if run_size is None:
+        run_size = REPORT_SORT_RUN_SIZE
+    decorated = ((key(row), i, row) for i, row in enumerate(rows))
+    runs = []
+    try:
+        while True:
+            run = sorted(islice(decorated, run_size))
+            if not runs and len(run) < run_size:
+                # everything fit in a single run
+                for k, i, row in run:
+                    yield row
+                return
+            if not run:
+                break
+            f = tempfile.TemporaryFile()
+            for item in run:
+                cPickle.dump(item, f, cPickle.HIGHEST_PROTOCOL)
+            f.seek(0)
+            runs.append(f)
+        for k, i, row in heapq.merge(*[_read_run(f) for f in runs]):
+            yield row
+    finally:
+        for f in runs:
+            f.close()
+
 class BillingReport(models.Model):
     # use BillingRecords to signify completed work
     TYPE_BILLING_RECORD = 2
@@ -2616,11 +2681,37 @@ class BillingReport(models.Model):
             team__in=self.teams.all(),
             completed__range=(self.start_date, self.end_date))
 
+    def _approved_task_chunks(self):
+        """Iterate over the approved tasks in chunks.
+
+        The team, video, version and assignee for each task get fetched with
+        the task.
+        """
+        return keyset_chunks(
+            self._get_approved_tasks(), REPORT_CHUNK_SIZE,
+            select_related=('team', 'team_video__video', 'assignee',
+                            'new_subtitle_version__subtitle_language__video'))
+
+    def _latest_tasks(self, tasks_qs, approve_tasks):
+        """Find the latest task in tasks_qs for each approve task.
+
+        Returns a dict mapping (team_video_id, language) to tasks.  We use 1
+        query for all of the approve tasks.
+        """
+        team_video_ids = set(t.team_video_id for t in approve_tasks)
+        languages = set(t.language for t in approve_tasks)
+        latest = {}
+        for task in (tasks_qs.filter(team_video__in=team_video_ids,
+                                     language__in=languages)
+                     .select_related('assignee').order_by('completed')):
+            latest[task.team_video_id, task.language] = task
+        return latest
+
     def _report_date(self, datetime):
         return datetime.strftime('%Y-%m-%d %H:%M:%S')
 
     def generate_rows_type_approval(self):
-        header = (
+        yield (
             'Team',
             'Video Title',
             'Video ID',
@@ -2631,31 +2722,32 @@ class BillingReport(models.Model):
             'Approver',
             'Date',
         )
-        rows = [header]
-        for approve_task in self._get_approved_tasks():
-            video = approve_task.team_video.video
-            version = approve_task.new_subtitle_version
-            language = version.subtitle_language
-            subtitle_task = (Task.objects.complete_subtitle_or_translate()
-                             .filter(team_video=approve_task.team_video,
-                                     language=approve_task.language)
-                             .order_by('-completed'))[0]
-            rows.append((
-                approve_task.team.name,
-                video.title_display(),
-                video.video_id,
-                approve_task.language,
-                get_minutes_for_version(version, False),
-                language.is_primary_audio_language(),
-                subtitle_task.type==Task.TYPE_IDS['Translate'],
-                unicode(approve_task.assignee),
-                self._report_date(approve_task.completed),
-            ))
-
-        return rows
+        for approve_tasks in self._approved_task_chunks():
+            subtitle_tasks = self._latest_tasks(
+                Task.objects.complete_subtitle_or_translate(), approve_tasks)
+            video_titles = {}
+            for approve_task in approve_tasks:
+                video = approve_task.team_video.video
+                version = approve_task.new_subtitle_version
+                language = version.subtitle_language
+                subtitle_task = subtitle_tasks[approve_task.team_video_id,
+                                               approve_task.language]
+                if video.id not in video_titles:
+                    video_titles[video.id] = video.title_display()
+                yield (
+                    approve_task.team.name,
+                    video_titles[video.id],
+                    video.video_id,
+                    approve_task.language,
+                    get_minutes_for_version(version, False),
+                    language.is_primary_audio_language(),
+                    subtitle_task.type==Task.TYPE_IDS['Translate'],
+                    unicode(approve_task.assignee),
+                    self._report_date(approve_task.completed),
+                )
 
     def generate_rows_type_approval_for_users(self):
-        header = (
+        yield (
             'User',
             'Task Type',
             'Team',
@@ -2669,67 +2761,68 @@ class BillingReport(models.Model):
             'Date',
             'Pay Rate',
         )
-        data_rows = []
-        for approve_task in self._get_approved_tasks():
-            video = approve_task.team_video.video
-            version = approve_task.get_subtitle_version()
-            language = version.subtitle_language
-
-            all_tasks = [approve_task]
-            try:
-                all_tasks.append((Task.objects.complete_subtitle_or_translate()
-                                  .filter(team_video=approve_task.team_video,
-                                          language=approve_task.language)
-                                  .order_by('-completed'))[0])
-            except IndexError:
-                # no subtitling task, probably the review task was manually
-                # created.
-                pass
-            try:
-                all_tasks.append((Task.objects.complete_review()
-                                  .filter(team_video=approve_task.team_video,
-                                          language=approve_task.language)
-                                  .order_by('-completed'))[0])
-            except IndexError:
-                # review not enabled
-                pass
-
-            for task in all_tasks:
-                data_rows.append((
-                    unicode(task.assignee),
-                    task.get_type_display(),
-                    approve_task.team.name,
-                    video.title_display(),
-                    video.video_id,
-                    language.language_code,
-                    get_minutes_for_version(version, False),
-                    language.is_primary_audio_language(),
-                    unicode(approve_task.assignee),
-                    unicode(task.body),
-                    self._report_date(task.completed),
-                    task.assignee.pay_rate_code,
-                ))
-
-        data_rows.sort(key=lambda row: row[0])
-        return [header] + data_rows
+        for row in _sort_rows(self._unsorted_rows_for_users(),
+                              key=lambda row: row[0]):
+            yield row
+
+    def _unsorted_rows_for_users(self):
+        for approve_tasks in self._approved_task_chunks():
+            subtitle_tasks = self._latest_tasks(
+                Task.objects.complete_subtitle_or_translate(), approve_tasks)
+            review_tasks = self._latest_tasks(Task.objects.complete_review(),
+                                              approve_tasks)
+            video_titles = {}
+            for approve_task in approve_tasks:
+                video = approve_task.team_video.video
+                version = approve_task.get_subtitle_version()
+                language = version.subtitle_language
+                key = (approve_task.team_video_id, approve_task.language)
+
+                all_tasks = [approve_task]
+                # there may not be a subtitling task if the review task was
+                # manually created, or a review task if review isn't enabled
+                if key in subtitle_tasks:
+                    all_tasks.append(subtitle_tasks[key])
+                if key in review_tasks:
+                    all_tasks.append(review_tasks[key])
+
+                if video.id not in video_titles:
+                    video_titles[video.id] = video.title_display()
+                for task in all_tasks:
+                    yield (
+                        unicode(task.assignee),
+                        task.get_type_display(),
+                        approve_task.team.name,
+                        video_titles[video.id],
+                        video.video_id,
+                        language.language_code,
+                        get_minutes_for_version(version, False),
+                        language.is_primary_audio_language(),
+                        unicode(approve_task.assignee),
+                        unicode(task.body),
+                        self._report_date(task.completed),
+                        task.assignee.pay_rate_code,
+                    )
 
     def generate_rows_type_billing_record(self):
-        rows = []
         for i,team in enumerate(self.teams.all()):
-            rows = rows + BillingRecord.objects.csv_report_for_team(team,
-                self.start_date, self.end_date, add_header=i == 0)
-        return rows
+            for row in BillingRecord.objects.csv_report_for_team(team,
+                    self.start_date, self.end_date, add_header=i == 0):
+                yield row
 
-    def generate_rows(self):
+    def iter_rows(self):
+        """Iterate over the rows for the report, starting with the header."""
         if self.type == BillingReport.TYPE_BILLING_RECORD:
-            rows = self.generate_rows_type_billing_record()
+            return self.generate_rows_type_billing_record()
         elif self.type == BillingReport.TYPE_APPROVAL:
-            rows = self.generate_rows_type_approval()
+            return self.generate_rows_type_approval()
         elif self.type == BillingReport.TYPE_APPROVAL_FOR_USERS:
-            rows = self.generate_rows_type_approval_for_users()
+            return self.generate_rows_type_approval_for_users()
         else:
             raise ValueError("Unknown type: %s" % self.type)
-        return rows
+
+    def generate_rows(self):
+        return list(self.iter_rows())
 
     def convert_unicode_to_utf8(self, rows):
         def _convert(value):
@@ -2737,33 +2830,41 @@ class BillingReport(models.Model):
                 return value.encode("utf-8")
             else:
                 return value
-        return [tuple(_convert(v) for v in row) for row in rows]
+        return (tuple(_convert(v) for v in row) for row in rows)
 
     def process(self):
         """
-        Generate the correct rows (including headers), saves it to a tempo file,
-        then set's that file to the csv_file property, which if , using the S3
-        storage will take care of exporting it to s3.
+        Generate the correct rows (including headers), streams them to a temp
+        file, then set's that file to the csv_file property, which if , using
+        the S3 storage will take care of exporting it to s3.
         """
         try:
-            rows = self.generate_rows()
+            self.csv_file = self.make_csv_file(self.iter_rows())
         except StandardError:
             logger.error("Error generating billing report: (id: %s)", self.id)
             self.csv_file = None
-        else:
-            self.csv_file = self.make_csv_file(rows)
         self.processed = datetime.datetime.utcnow()
         self.save()
 
     def make_csv_file(self, rows):
+        """Write rows to a CSV file.
+
+        rows can be any iterable, the rows get written as we iterate through
+        it.
+        """
         rows = self.convert_unicode_to_utf8(rows)
         fn = '/tmp/bill-%s-teams-%s-%s-%s-%s.csv' % (
             self.teams.all().count(),
             self.start_str, self.end_str,
             self.get_type_display(), self.pk)
-        with open(fn, 'w') as f:
-            writer = csv.writer(f)
-            writer.writerows(rows)
+        try:
+            with open(fn, 'w') as f:
+                writer = csv.writer(f)
+                for row in rows:
+                    writer.writerow(row)
+        except:
+            os.remove(fn)
+            raise
 
         return File(open(fn, 'r'))
 
@@ -2962,37 +3063,11 @@ def get_minutes_for_version(version, round_up_to_integer):
     """
     Return the number of minutes the subtitles specified in version
     """
-    subs = version.get_subtitles()
-
-    if len(subs) == 0:
-        return 0
-
-    for sub in subs:
-        if sub.start_time is not None:
-            start_time = sub.start_time
-            break
-        # we shouldn't have an end time set without a start time, but handle
-        # it just in case
-        if sub.end_time is not None:
-            start_time = sub.end_time
-            break
-    else:
-        return 0
-
-    for sub in reversed(subs):
-        if sub.end_time is not None:
-            end_time = sub.end_time
-            break
-        # we shouldn't have an end time not set, but check for that just in
-        # case
-        if sub.start_time is not None:
-            end_time = sub.start_time
-            break
-    else:
+    duration = version.get_duration()
+    if duration == 0:
         return 0
 
-    duration_seconds =  (end_time - start_time) / 1000.0
-    minutes = duration_seconds/60.0
+    minutes = duration / 1000.0 / 60.0
     if round_up_to_integer:
         minutes = int(ceil(minutes))
     return minutes
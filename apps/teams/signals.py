@@ -153,6 +153,8 @@ api_teamvideo_new = dispatch.Signal(providing_args=["video"])
 api_application_new = dispatch.Signal(providing_args=["application"])
 video_moved_from_team_to_team = dispatch.Signal(
         providing_args=["destination_team", "video"])
+# sent once per team by teams.tasks.expire_tasks, sender is the team
+tasks_expired = dispatch.Signal(providing_args=["task_ids"])
 # connect handlers
 api_subtitles_edited.connect(api_on_subtitles_edited)
 api_subtitles_approved.connect(api_on_subtitles_approved)
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import datetime
 import logging
 
@@ -8,11 +9,13 @@ from celery.schedules import crontab, timedelta
 from celery.task import task
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.db import transaction
 from django.db.models import F
 from django.utils.translation import ugettext_lazy as _
 from haystack import site
 
 from utils import send_templated_email
+from utils.chunkediter import keyset_chunks
 from utils.metrics import Gauge, Meter
 from widget.video_cache import (
     invalidate_cache as invalidate_video_cache,
@@ -63,31 +66,68 @@ def update_video_public_field(team_id):
             video.save()
             video_changed_tasks(video.id)
 
+# number of tasks to expire with each UPDATE statement
+EXPIRE_CHUNK_SIZE = 1000
+
 @periodic_task(run_every=crontab(minute=0, hour=7))
 def expire_tasks():
     """Find any tasks that are past their expiration date and unassign them.
 
     We currently run this once per day (at 7 AM server time).
 
+    Tasks get expired with an UPDATE statement per EXPIRE_CHUNK_SIZE tasks
+    rather than saving them one by one.  Once they're all done, we send a
+    single tasks_expired signal and queue a single reindex job for each team.
     """
-    from teams.models import Task
-
-    expired_tasks = Task.objects.incomplete().filter(
-        expiration_date__isnull=False,
-        expiration_date__lt=datetime.now(),
-    )
-    for task in expired_tasks:
-        task.assignee = task.expiration_date = None
-        # run each inside a try/except so that one
-        # rotten apple doesn't make a huge mess
-        try:
-            task.save()
-        except Exception as e:
-            logger.error('Error on expiring tasks', extra={
-            'task': task,
-            'exception': e,
-        })
+    from teams.models import Task, Team
+    from teams.signals import tasks_expired
+
+    with Timer('teams.expire-tasks-time'):
+        now = datetime.now()
+        expired_tasks = Task.objects.incomplete().filter(
+            expiration_date__isnull=False,
+            expiration_date__lt=now,
+        ).only('id', 'team', 'team_video')
+        task_ids_by_team = defaultdict(list)
+        team_video_ids_by_team = defaultdict(set)
+        for chunk in keyset_chunks(expired_tasks, EXPIRE_CHUNK_SIZE):
+            task_ids = [task.id for task in chunk]
+            # run each chunk inside a try/except so that one
+            # rotten apple doesn't make a huge mess
+            try:
+                with transaction.commit_on_success():
+                    # Lock the rows and check them again, since tasks can
+                    # get completed or deleted after we fetched the chunk
+                    rows = list(Task.objects.incomplete()
+                                .filter(id__in=task_ids,
+                                        expiration_date__lt=now)
+                                .select_for_update()
+                                .values_list('id', 'team', 'team_video'))
+                    Task.objects.filter(
+                        id__in=[row[0] for row in rows],
+                        completed__isnull=True,
+                        deleted=False,
+                        expiration_date__lt=now,
+                    ).update(assignee=None, expiration_date=None)
+            except Exception as e:
+                logger.error('Error on expiring tasks', extra={
+                    'task_ids': task_ids,
+                    'exception': e,
+                })
+                continue
+            for task_id, team_id, team_video_id in rows:
+                task_ids_by_team[team_id].append(task_id)
+                team_video_ids_by_team[team_id].add(team_video_id)
 
+        teams = Team.objects.in_bulk(task_ids_by_team.keys())
+        for team_id, task_ids in task_ids_by_team.items():
+            update_team_videos.delay(list(team_video_ids_by_team[team_id]))
+            if team_id in teams:
+                tasks_expired.send(sender=teams[team_id], task_ids=task_ids)
+
+    Meter('teams.tasks-expired').inc(
+        sum(len(task_ids) for task_ids in task_ids_by_team.values()))
+    Meter('teams.tasks-expired-teams').inc(len(task_ids_by_team))
 
 
 @periodic_task(run_every=crontab(minute=0, hour=23))
@@ -151,6 +191,16 @@ def update_one_team_video(team_video_id):
         tv_search_index, [team_video])
 
 
+@task()
+def update_team_videos(team_video_ids):
+    """Update the Solr index for a list of team videos."""
+    from teams.models import TeamVideo
+
+    tv_search_index = site.get_index(TeamVideo)
+    team_videos = TeamVideo.objects.filter(id__in=team_video_ids)
+    for chunk in keyset_chunks(team_videos, 100):
+        tv_search_index.backend.update(tv_search_index, chunk)
+
 @task()
 def api_notify_on_subtitles_activity(team_pk, event_name, version_pk):
     from teams.models import TeamNotificationSetting
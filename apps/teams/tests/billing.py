@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import itertools
 
 from django.test import TestCase
+import mock
 
 from teams.models import BillingRecord, BillingReport, Task
 from subtitles.pipeline import add_subtitles
@@ -194,19 +195,32 @@ class ProcessReportTest(TestCase):
             type=BillingReport.TYPE_APPROVAL)
         self.report.teams.add(self.team)
 
-    @test_utils.patch_for_test("teams.models.BillingReport.generate_rows")
-    def test_success(self, mock_generate_rows):
-        mock_generate_rows.return_value = [
+    @test_utils.patch_for_test("teams.models.BillingReport.iter_rows")
+    def test_success(self, mock_iter_rows):
+        mock_iter_rows.return_value = iter([
             ('Foo', 'Bar'),
             ('foo value', 'bar value'),
-        ]
+        ])
         self.report.process()
         self.assertNotEquals(self.report.processed, None)
         self.assertNotEquals(self.report.csv_file, None)
+        self.report.csv_file.open()
+        self.assertEquals(self.report.csv_file.read(),
+                          'Foo,Bar\r\nfoo value,bar value\r\n')
+
+    @test_utils.patch_for_test("teams.models.BillingReport.iter_rows")
+    def test_error(self, mock_iter_rows):
+        mock_iter_rows.side_effect = ValueError()
+        self.report.process()
+        self.assertNotEquals(self.report.processed, None)
+        self.assertEquals(self.report.csv_file, None)
 
-    @test_utils.patch_for_test("teams.models.BillingReport.generate_rows")
-    def test_error(self, mock_generate_rows):
-        mock_generate_rows.side_effect = ValueError()
+    @test_utils.patch_for_test("teams.models.BillingReport.iter_rows")
+    def test_error_while_streaming(self, mock_iter_rows):
+        def rows():
+            yield ('Foo', 'Bar')
+            raise ValueError()
+        mock_iter_rows.return_value = rows()
         self.report.process()
         self.assertNotEquals(self.report.processed, None)
         self.assertEquals(self.report.csv_file, None)
@@ -381,6 +395,19 @@ class ApprovalTest(ApprovalTestBase):
         self.check_language_columns(report_data)
         self.check_minutes(report_data)
 
+    @mock.patch('teams.models.REPORT_CHUNK_SIZE', 2)
+    def test_report_in_chunks(self):
+        self.test_report()
+
+    def test_minutes_use_stored_duration(self):
+        # we shouldn't need to parse the subtitles to calculate the minutes
+        with mock.patch('subtitles.models.SubtitleVersion.get_subtitles') as (
+                mock_get_subtitles):
+            report_data = self.get_report_data(self.date_maker.start_date(),
+                                               self.date_maker.end_date())
+        self.check_minutes(report_data)
+        self.assertEquals(mock_get_subtitles.call_count, 0)
+
 class ApprovalForUsersTest(ApprovalTestBase):
     def get_report_data(self, start_date, end_date):
         """Get report data in an easy to test way.
@@ -470,6 +497,11 @@ class ApprovalForUsersTest(ApprovalTestBase):
         self.check_minutes(report_data)
         self.check_pay_rates(report_data)
 
+    @mock.patch('teams.models.REPORT_CHUNK_SIZE', 2)
+    @mock.patch('teams.models.REPORT_SORT_RUN_SIZE', 4)
+    def test_report_in_chunks(self):
+        self.test_report()
+
 class SimpleApprovalTestCase(TestCase):
     @test_utils.patch_for_test('teams.models.Task.now')
     def setUp(self, mock_now):
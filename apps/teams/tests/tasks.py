@@ -9,6 +9,7 @@ import mock
 from auth.models import CustomUser as User
 from apps.teams.forms import TaskCreateForm, TaskAssignForm
 from apps.teams.models import Task, Team, TeamVideo, TeamMember
+from teams import signals, tasks
 from apps.videos.models import Video
 from utils.testeditor import TestEditor
 from utils import test_factories
@@ -646,3 +647,91 @@ class ViewsTest(TestCase):
         self.check_task_list(tv.task_set.all(), q='Person')
         self.check_task_list(tv.task_set.all(), q='person')
         self.check_task_list(tv.task_set.all(), q='pers')
+
+class ExpireTasksTest(TestCase):
+    def setUp(self):
+        self.team = test_factories.create_team(workflow_enabled=True)
+        self.other_team = test_factories.create_team(workflow_enabled=True)
+        self.user = test_factories.create_team_member(self.team).user
+        self.team_video = test_factories.create_team_video(self.team,
+                                                           self.user)
+        self.other_team_video = test_factories.create_team_video(
+            self.other_team, self.user)
+        self.now = datetime.datetime.now()
+        self.expired_signals = []
+        signals.tasks_expired.connect(self.on_tasks_expired)
+
+    def tearDown(self):
+        signals.tasks_expired.disconnect(self.on_tasks_expired)
+
+    def on_tasks_expired(self, sender, task_ids, **kwargs):
+        self.expired_signals.append((sender.id, sorted(task_ids)))
+
+    def make_task(self, team_video, language, expiration_date,
+                  completed=None):
+        return Task.objects.create(
+            team=team_video.team, team_video=team_video,
+            type=TYPE_TRANSLATE, language=language, assignee=self.user,
+            expiration_date=expiration_date, completed=completed)
+
+    def check_expired(self, task, expired):
+        task = Task.objects.get(pk=task.pk)
+        if expired:
+            self.assertEquals(task.assignee, None)
+            self.assertEquals(task.expiration_date, None)
+        else:
+            self.assertEquals(task.assignee, self.user)
+            self.assertNotEquals(task.expiration_date, None)
+
+    @mock.patch('teams.tasks.update_team_videos')
+    @mock.patch('teams.tasks.EXPIRE_CHUNK_SIZE', 2)
+    def test_expire_tasks(self, mock_update_team_videos):
+        past = self.now - datetime.timedelta(days=1)
+        future = self.now + datetime.timedelta(days=1)
+        expired = [
+            self.make_task(self.team_video, 'fr', past),
+            self.make_task(self.team_video, 'de', past),
+            self.make_task(self.team_video, 'es', past),
+        ]
+        other_expired = self.make_task(self.other_team_video, 'fr', past)
+        not_expired = self.make_task(self.team_video, 'it', future)
+        completed = self.make_task(self.team_video, 'pt', past,
+                                   completed=self.now)
+
+        tasks.expire_tasks()
+        for task in expired + [other_expired]:
+            self.check_expired(task, True)
+        self.check_expired(not_expired, False)
+        self.check_expired(completed, False)
+        # we should send 1 signal and reindex once for each team
+        self.assertEquals(sorted(self.expired_signals), sorted([
+            (self.team.id, [t.id for t in expired]),
+            (self.other_team.id, [other_expired.id]),
+        ]))
+        self.assertEquals(
+            sorted(call[0][0] for call in
+                   mock_update_team_videos.delay.call_args_list),
+            sorted([[self.team_video.id], [self.other_team_video.id]]))
+
+    @mock.patch('teams.tasks.update_team_videos')
+    def test_task_completed_while_expiring(self, mock_update_team_videos):
+        task = self.make_task(self.team_video, 'fr',
+                              self.now - datetime.timedelta(days=1))
+        real_keyset_chunks = tasks.keyset_chunks
+        def keyset_chunks(*args, **kwargs):
+            for chunk in real_keyset_chunks(*args, **kwargs):
+                # complete the task after it was fetched, but before the
+                # UPDATE statement
+                Task.objects.filter(pk=task.pk).update(completed=self.now)
+                yield chunk
+        with mock.patch('teams.tasks.keyset_chunks', keyset_chunks):
+            tasks.expire_tasks()
+        self.check_expired(task, False)
+        self.assertEquals(self.expired_signals, [])
+        self.assertFalse(mock_update_team_videos.delay.called)
+
+    def test_no_expired_tasks(self):
+        self.make_task(self.team_video, 'fr',
+                       self.now + datetime.timedelta(days=1))
+        tasks.expire_tasks()
+        self.assertEquals(self.expired_signals, [])
@@ -82,7 +82,7 @@ from utils.translation import (
 )
 from utils.chunkediter import chunkediter
 from videos.types import UPDATE_VERSION_ACTION
-from videos import metadata_manager
+from videos import metadata_manager, timelines
 from videos.tasks import (
     upload_subtitles_to_original_service, delete_captions_in_original_service,
     delete_captions_in_original_service_by_code
@@ -716,26 +716,15 @@ def activity(request, slug):
     except TeamMember.DoesNotExist:
         member = None
 
-    # This section is here to work around MySQL's poor decisions.
-    #
-    # Much like the Tasks page, this query performs extremely poorly when run
-    # normally.  So we split it into two parts here so that each will run fast.
-    action_ids = Action.objects.for_team(team, ids=True)
-    action_ids, pagination_info = paginate(action_ids, ACTIONS_ON_PAGE,
-                                           request.GET.get('page'))
-    action_ids = list(action_ids)
-
-    activity_list = list(Action.objects.filter(id__in=action_ids).select_related(
-            'video', 'user', 'new_language', 'new_language__video'
-    ).order_by())
-    activity_list.sort(key=lambda a: action_ids.index(a.pk))
+    activity_list = timelines.team_timeline(team, request.GET.get('before'),
+                                            ACTIONS_ON_PAGE)
 
     context = {
         'activity_list': activity_list,
+        'next_cursor': activity_list.next_cursor,
         'team': team,
         'member': member
     }
-    context.update(pagination_info)
 
     return context
 
@@ -2048,8 +2037,7 @@ def _writelock_languages_for_delete(request, subtitle_language):
     locked = []
 
     for sl in to_lock:
-        if sl.can_writelock(request.browser_id):
-            sl.writelock(request.user, request.browser_id)
+        if sl.try_writelock(request.user, request.browser_id):
             locked.append(sl)
         else:
             messages.error(request,
@@ -2097,10 +2085,7 @@ def delete_language(request, slug, lang_id):
                     return HttpResponseRedirect(next_url)
             finally:
                 for sl in locked:
-                    # We need to get a fresh copy of the SL here so that the
-                    # save() in release_writelock doesn't overwrite any other
-                    # changes we've made in the try block.  ORMs are fun.
-                    SubtitleLanguage.objects.get(pk=sl.pk).release_writelock()
+                    sl.release_writelock()
         else:
             for e in flatten_errorlists(form.errors):
                 messages.error(request, e)
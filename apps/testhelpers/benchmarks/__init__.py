@@ -0,0 +1,159 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""testhelpers.benchmarks -- In-process latency benchmarks.
+
+Benchmarks run inside the django process against the test database, which gets
+filled with a synthetic dataset (see testhelpers.benchmarks.dataset).  Each
+benchmark is run a number of times and for every run we record:
+
+    - wall-clock latency
+    - the number of SQL queries issued
+    - the number of cache operations made
+
+The counts come from utils.instrumentation.
+
+Results can be stored as a JSON baseline, and later runs compared against it
+to flag regressions.  Use the run_benchmarks management command to run them.
+
+Benchmarks are registered with the register() decorator.  The decorated
+function gets passed the dataset and returns a callable that performs a single
+run.
+"""
+
+import json
+import math
+import time
+
+from django.utils.importlib import import_module
+
+from utils import instrumentation
+
+# modules that define benchmarks.  They get imported by all_benchmarks().
+BENCHMARK_MODULES = [
+    'testhelpers.benchmarks.chunkediter',
+    'testhelpers.benchmarks.diff',
+    'testhelpers.benchmarks.endpoints',
+    'testhelpers.benchmarks.timelines',
+    'testhelpers.benchmarks.video_types',
+]
+
+_registry = []
+
+def register(name):
+    """Decorator to register a benchmark under name."""
+    def decorator(func):
+        _registry.append((name, func))
+        return func
+    return decorator
+
+def all_benchmarks():
+    """Get a list of (name, setup_func) tuples for all benchmarks."""
+    for module_name in BENCHMARK_MODULES:
+        import_module(module_name)
+    return list(_registry)
+
+def percentile(values, p):
+    """Calculate the p-th percentile of values using the nearest-rank method.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(math.ceil(p / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+class BenchmarkResult(object):
+    """Measurements for a single benchmark."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.query_counts = []
+        self.cache_op_counts = []
+
+    def add_run(self, ms, queries, cache_ops):
+        self.latencies.append(ms)
+        self.query_counts.append(queries)
+        self.cache_op_counts.append(cache_ops)
+
+    def _mean(self, values):
+        if not values:
+            return None
+        return round(float(sum(values)) / len(values), 2)
+
+    def summary(self):
+        return {
+            'runs': len(self.latencies),
+            'p50': percentile(self.latencies, 50),
+            'p95': percentile(self.latencies, 95),
+            'p99': percentile(self.latencies, 99),
+            'queries': self._mean(self.query_counts),
+            'cache_ops': self._mean(self.cache_op_counts),
+        }
+
+def run_benchmark(name, func, iterations, warmup=1):
+    """Run func iterations times and return a BenchmarkResult.
+
+    The first warmup runs are not recorded, so that the results aren't skewed
+    by things like importing modules and compiling templates.
+    """
+    result = BenchmarkResult(name)
+    for i in xrange(warmup + iterations):
+        instrumentation.start('benchmarks')
+        start = time.time()
+        try:
+            func()
+        finally:
+            ms = (time.time() - start) * 1000
+            stats = instrumentation.finish()
+        if i >= warmup:
+            result.add_run(ms, stats.queries, stats.cache_ops)
+    return result
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, summaries):
+    with open(path, 'w') as f:
+        json.dump(summaries, f, indent=4, sort_keys=True)
+
+def find_regressions(summary, baseline, tolerance=0.2):
+    """Compare a benchmark summary against its baseline.
+
+    Latency percentiles are allowed to grow by tolerance (a fraction of the
+    baseline value) since timings are noisy.  Query and cache operation counts
+    are deterministic, so any increase counts as a regression.
+
+    Returns a list of strings describing each regression.
+    """
+    regressions = []
+    for key in ('p50', 'p95', 'p99'):
+        if baseline.get(key) is None or summary[key] is None:
+            continue
+        limit = baseline[key] * (1 + tolerance)
+        if summary[key] > limit:
+            regressions.append('%s: %.1fms > %.1fms' % (
+                key, summary[key], baseline[key]))
+    for key in ('queries', 'cache_ops'):
+        if baseline.get(key) is None or summary[key] is None:
+            continue
+        if summary[key] > baseline[key]:
+            regressions.append('%s: %s > %s' % (
+                key, summary[key], baseline[key]))
+    return regressions
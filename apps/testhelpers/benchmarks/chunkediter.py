@@ -0,0 +1,90 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""testhelpers.benchmarks.chunkediter -- Walking large tables
+
+We fill a table with ROW_COUNT rows and compare the Paginator-based
+chunkediter against keyset iteration, both for walking the whole table and for
+fetching a single chunk deep into it.
+
+Building the table takes a while, so it only happens once, the first time one
+of these benchmarks gets set up.
+"""
+
+from datetime import datetime, timedelta
+from itertools import chain
+
+from django.core.paginator import Paginator
+
+from auth.models import Announcement
+from testhelpers.benchmarks import register
+from utils.chunkediter import keyset_iter
+
+ROW_COUNT = 1000000
+CHUNK_SIZE = 1000
+INSERT_BATCH_SIZE = 5000
+
+def paginator_iter(objects, chunk_size):
+    """The old chunkediter implementation."""
+    pages = Paginator(objects, chunk_size)
+    return chain.from_iterable(pages.page(i).object_list
+                               for i in pages.page_range)
+
+def build_table():
+    count = Announcement.objects.count()
+    start = datetime(2013, 1, 1)
+    while count < ROW_COUNT:
+        batch_size = min(INSERT_BATCH_SIZE, ROW_COUNT - count)
+        Announcement.objects.bulk_create([
+            Announcement(content='Announcement %s' % i,
+                         created=start + timedelta(seconds=i))
+            for i in xrange(count, count + batch_size)
+        ])
+        count += batch_size
+
+def _queryset():
+    return Announcement.objects.only('id')
+
+def _consume(iterator):
+    for obj in iterator:
+        pass
+
+@register('chunkediter.walk.paginator')
+def walk_paginator(dataset):
+    build_table()
+    return lambda: _consume(paginator_iter(_queryset(), CHUNK_SIZE))
+
+@register('chunkediter.walk.keyset')
+def walk_keyset(dataset):
+    build_table()
+    return lambda: _consume(keyset_iter(_queryset(), CHUNK_SIZE))
+
+@register('chunkediter.last_chunk.offset')
+def last_chunk_offset(dataset):
+    build_table()
+    offset = ROW_COUNT - CHUNK_SIZE
+    return lambda: list(_queryset().order_by('id')
+                        [offset:offset+CHUNK_SIZE])
+
+@register('chunkediter.last_chunk.keyset')
+def last_chunk_keyset(dataset):
+    build_table()
+    last_id = (_queryset().order_by('id')
+               .values_list('id', flat=True)[ROW_COUNT - CHUNK_SIZE - 1])
+    return lambda: list(_queryset().filter(id__gt=last_id).order_by('id')
+                        [:CHUNK_SIZE])
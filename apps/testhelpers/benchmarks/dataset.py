@@ -0,0 +1,106 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""testhelpers.benchmarks.dataset -- Synthetic data for the benchmarks."""
+
+from babelsubs.storage import SubtitleSet
+
+from subtitles import pipeline
+from teams.models import Task, TeamMember
+from utils import test_factories
+
+LANGUAGE_CODES = [
+    'en', 'fr', 'de', 'es', 'pt-br', 'it', 'ru', 'ja', 'zh-cn', 'ar', 'ko',
+    'nl', 'pl', 'sv', 'tr', 'cs', 'da', 'fi', 'el', 'he', 'hu', 'id', 'no',
+    'ro', 'sk', 'th', 'uk', 'vi', 'bg', 'hr', 'ca', 'fa', 'hi', 'lt', 'lv',
+    'ms', 'sl', 'sr', 'et', 'is',
+]
+
+class Dataset(object):
+    """Objects created by build_dataset().
+
+    Attributes:
+        user -- user that owns all the teams.  Their password is "password".
+        videos -- list of all videos
+        teams -- list of teams
+        team_videos -- list of TeamVideos, spread across the teams
+    """
+    password = 'password'
+
+    def __init__(self, user):
+        self.user = user
+        self.videos = []
+        self.teams = []
+        self.team_videos = []
+
+def make_subtitles(language_code, count):
+    subtitles = SubtitleSet(language_code)
+    for i in xrange(count):
+        subtitles.append_subtitle(i * 2000, i * 2000 + 1500,
+                                  'Subtitle %s in %s' % (i, language_code))
+    return subtitles
+
+def build_dataset(video_count=20, language_count=5, team_count=2,
+                  tasks_per_team=20, subtitle_count=50):
+    """Create a synthetic dataset.
+
+    We create video_count videos, each with language_count languages.  The
+    first language is the primary audio language, the rest are translations
+    from it.  Half of the videos are spread across team_count teams and each
+    team gets tasks_per_team open translate tasks.
+    """
+    if language_count > len(LANGUAGE_CODES):
+        raise ValueError("language_count can't be larger than %s" %
+                         len(LANGUAGE_CODES))
+    user = test_factories.create_user(password=Dataset.password)
+    dataset = Dataset(user)
+    for i in xrange(team_count):
+        team = test_factories.create_team()
+        test_factories.create_team_member(team, user,
+                                          role=TeamMember.ROLE_OWNER)
+        dataset.teams.append(team)
+
+    source_code = LANGUAGE_CODES[0]
+    for i in xrange(video_count):
+        video = test_factories.create_video(
+            primary_audio_language_code=source_code)
+        source_version = pipeline.add_subtitles(
+            video, source_code, make_subtitles(source_code, subtitle_count),
+            author=user, complete=True)
+        for code in LANGUAGE_CODES[1:language_count]:
+            pipeline.add_subtitles(video, code,
+                                   make_subtitles(code, subtitle_count),
+                                   author=user, parents=[source_version],
+                                   complete=True)
+        dataset.videos.append(video)
+        if team_count and i % 2 == 0:
+            team = dataset.teams[(i // 2) % team_count]
+            dataset.team_videos.append(test_factories.create_team_video(
+                team, user, video))
+
+    untranslated_codes = LANGUAGE_CODES[language_count:] or LANGUAGE_CODES
+    for team in dataset.teams:
+        team_videos = [tv for tv in dataset.team_videos if tv.team == team]
+        if not team_videos:
+            continue
+        for i in xrange(tasks_per_team):
+            Task.objects.create(
+                team=team, team_video=team_videos[i % len(team_videos)],
+                language=untranslated_codes[i % len(untranslated_codes)],
+                type=Task.TYPE_IDS['Translate'])
+    return dataset
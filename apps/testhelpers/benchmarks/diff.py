@@ -0,0 +1,74 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""testhelpers.benchmarks.diff -- Diffing large subtitle sets
+
+We benchmark subtitles.diff against the babelsubs functions it replaced, on a
+long transcript where a small fraction of the subtitles were edited.
+"""
+
+from babelsubs.generators.html import HTMLGenerator
+from babelsubs.storage import SubtitleSet
+from babelsubs import storage
+
+from subtitles import diff
+from testhelpers.benchmarks import register
+
+SUBTITLE_COUNT = 3000
+# edit every EDIT_INTERVAL-th subtitle
+EDIT_INTERVAL = 50
+
+def make_subtitle_sets():
+    before = SubtitleSet('en')
+    after = SubtitleSet('en')
+    for i in xrange(SUBTITLE_COUNT):
+        start_time = i * 2000
+        text = 'Subtitle number %s' % i
+        before.append_subtitle(start_time, start_time + 1500, text)
+        if i % EDIT_INTERVAL == 0:
+            # change the timing of one half of the edits and the text of
+            # the other half
+            if i % (EDIT_INTERVAL * 2) == 0:
+                after.append_subtitle(start_time, start_time + 1800, text)
+            else:
+                after.append_subtitle(start_time, start_time + 1500,
+                                      text + ' (edited)')
+        else:
+            after.append_subtitle(start_time, start_time + 1500, text)
+    return before, after
+
+@register('subtitles.diff.babelsubs')
+def diff_babelsubs(dataset):
+    before, after = make_subtitle_sets()
+    return lambda: storage.diff(before, after)
+
+@register('subtitles.diff.diff')
+def diff_diff(dataset):
+    before, after = make_subtitle_sets()
+    return lambda: diff.diff(before, after)
+
+@register('subtitles.diff.calc_changes.babelsubs')
+def calc_changes_babelsubs(dataset):
+    before, after = make_subtitle_sets()
+    return lambda: storage.calc_changes(before, after,
+                                        HTMLGenerator.MAPPINGS)
+
+@register('subtitles.diff.calc_changes')
+def calc_changes_diff(dataset):
+    before, after = make_subtitle_sets()
+    return lambda: diff.calc_changes(before, after, HTMLGenerator.MAPPINGS)
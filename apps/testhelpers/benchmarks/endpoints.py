@@ -0,0 +1,127 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""testhelpers.benchmarks.endpoints -- Benchmarks for our hottest views."""
+
+import itertools
+
+import simplejson as json
+from django.core.urlresolvers import reverse
+from django.test.client import Client, RequestFactory
+
+from subtitles import pipeline
+from testhelpers.benchmarks import register
+from testhelpers.benchmarks.dataset import LANGUAGE_CODES, make_subtitles
+from utils import test_factories
+from widget.views import download_subtitles
+
+class BenchmarkError(StandardError):
+    pass
+
+def logged_in_client(dataset):
+    client = Client()
+    client.login(username=dataset.user.username, password=dataset.password)
+    return client
+
+def check_response(response, url):
+    if response.status_code != 200:
+        raise BenchmarkError("%s returned status code %s" % (
+            url, response.status_code))
+
+def get_url(client, url):
+    def run():
+        check_response(client.get(url), url)
+    return run
+
+@register('widget.rpc.show_widget')
+def show_widget(dataset):
+    client = Client()
+    video = dataset.videos[0]
+    url = reverse('widget:rpc', args=['show_widget'])
+    data = {
+        'is_remote': u'false',
+        'video_url': json.dumps(video.get_video_url()),
+    }
+    def run():
+        check_response(client.post(url, data), url)
+    return run
+
+@register('videos.views.video')
+def video_page(dataset):
+    video = dataset.videos[0]
+    url = reverse('videos:video', kwargs={'video_id': video.video_id})
+    return get_url(Client(), url)
+
+@register('teams.views.detail')
+def team_detail(dataset):
+    url = reverse('teams:detail', kwargs={'slug': dataset.teams[0].slug})
+    return get_url(logged_in_client(dataset), url)
+
+@register('teams.views.dashboard')
+def team_dashboard(dataset):
+    url = reverse('teams:dashboard', kwargs={'slug': dataset.teams[0].slug})
+    return get_url(logged_in_client(dataset), url)
+
+@register('profiles.views.dashboard')
+def profile_dashboard(dataset):
+    return get_url(logged_in_client(dataset), reverse('profiles:dashboard'))
+
+@register('subtitles.views.subtitle_editor')
+def subtitle_editor(dataset):
+    # use a video with many languages, each with a few versions, since
+    # that's where building the editor data gets expensive
+    video = test_factories.create_video(primary_audio_language_code='en')
+    source_version = None
+    for code in LANGUAGE_CODES:
+        for i in xrange(3):
+            if source_version is not None:
+                parents = [source_version]
+            else:
+                parents = []
+            version = pipeline.add_subtitles(
+                video, code, make_subtitles(code, 100 + i),
+                author=dataset.user, parents=parents)
+        if code == 'en':
+            source_version = version
+    url = reverse('subtitles:subtitle-editor', args=(video.video_id, 'fr'))
+    return get_url(logged_in_client(dataset), url + '?base-language=en')
+
+@register('widget.views.download_subtitles')
+def download_subtitles_srt(dataset):
+    # download_subtitles isn't routed anywhere, so call the view directly
+    video = dataset.videos[0]
+    request = RequestFactory().get('/', {'video_id': video.video_id})
+    request.user = dataset.user
+    def run():
+        response = download_subtitles(request, 'srt')
+        if response.status_code != 200:
+            raise BenchmarkError("download_subtitles returned status code %s"
+                                 % response.status_code)
+    return run
+
+@register('subtitles.pipeline.add_subtitles')
+def add_subtitles(dataset):
+    video = dataset.videos[0]
+    language_code = video.primary_audio_language_code
+    counter = itertools.count()
+    def run():
+        # vary the subtitle count so every run creates a different version
+        subtitles = make_subtitles(language_code, 50 + counter.next())
+        pipeline.add_subtitles(video, language_code, subtitles,
+                               author=dataset.user)
+    return run
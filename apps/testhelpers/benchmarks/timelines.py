@@ -0,0 +1,77 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""testhelpers.benchmarks.timelines -- Activity feeds
+
+For each feed we benchmark both the ActionManager query and the materialized
+timeline that replaced it.
+"""
+
+from testhelpers.benchmarks import register
+from videos import timelines
+from videos.models import Action
+
+PAGE_SIZE = 20
+
+def _action_manager(get_queryset):
+    def run():
+        list(get_queryset().select_related(*timelines.ACTION_RELATED)
+             [:PAGE_SIZE])
+    return run
+
+@register('timelines.team.action_manager')
+def team_action_manager(dataset):
+    team = dataset.teams[0]
+    return _action_manager(lambda: Action.objects.for_team(team))
+
+@register('timelines.team.timeline')
+def team_timeline(dataset):
+    team = dataset.teams[0]
+    return lambda: timelines.team_timeline(team, limit=PAGE_SIZE)
+
+@register('timelines.user.action_manager')
+def user_action_manager(dataset):
+    user = dataset.user
+    return _action_manager(lambda: Action.objects.for_user(user))
+
+@register('timelines.user.timeline')
+def user_timeline(dataset):
+    user = dataset.user
+    return lambda: timelines.user_timeline(user, limit=PAGE_SIZE)
+
+@register('timelines.user_team_activity.action_manager')
+def user_team_activity_action_manager(dataset):
+    user = dataset.user
+    return _action_manager(
+        lambda: Action.objects.for_user_team_activity(user))
+
+@register('timelines.user_team_activity.timeline')
+def user_team_activity_timeline(dataset):
+    user = dataset.user
+    return lambda: timelines.user_team_activity(user, limit=PAGE_SIZE)
+
+@register('timelines.user_video_activity.action_manager')
+def user_video_activity_action_manager(dataset):
+    user = dataset.user
+    return _action_manager(
+        lambda: Action.objects.for_user_video_activity(user))
+
+@register('timelines.user_video_activity.timeline')
+def user_video_activity_timeline(dataset):
+    user = dataset.user
+    return lambda: timelines.user_video_activity(user, limit=PAGE_SIZE)
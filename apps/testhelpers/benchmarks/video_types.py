@@ -0,0 +1,81 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+
+"""testhelpers.benchmarks.video_types -- Finding the video type for URLs
+
+We benchmark VideoTypeRegistrar.video_type_class_for_url() against the linear
+scan over all video types, on a corpus of URLs for the different sites.
+"""
+
+from testhelpers.benchmarks import register
+from videos.types import video_type_registrar
+
+# URLs for each video type, plus some that don't match any.  There are no
+# dailymotion video URLs, since matching those fetches the video metadata.
+URL_TEMPLATES = [
+    'http://www.youtube.com/watch?v=abcdefg%i',
+    'http://youtu.be/abcdefg%i',
+    'http://www.youtube.com/user/someone%i',
+    'http://vimeo.com/%i',
+    'http://vimeo.com/channels/staffpicks/%i',
+    'http://blip.tv/someshow/episode-%i',
+    'http://cdnbakmi.kaltura.com/p/1/sp/100/serveFlavor/entryId/1_%i/name/a.mp4',
+    'http://link.brightcove.com/services/player/bcpid%i',
+    'http://bcove.me/abc%i',
+    'http://fast.wistia.net/embed/iframe/abc%i',
+    'http://home.wistia.com/medias/abc%i',
+    'http://www.dailymotion.com/user/someone%i',
+    'http://example.com/videos/%i.mp4',
+    'https://example.org/media/video%i.ogv',
+    'http://example.com/videos/%i.flv',
+    'http://example.com/podcast/episode-%i.mp3',
+    'http://example.com/page/%i',
+    'http://www.example.com/watch?v=%i',
+    'example.com/videos/%i.webm',
+    'not a url %i',
+]
+
+def make_url_corpus(count=10):
+    return [template % i for i in xrange(count) for template in URL_TEMPLATES]
+
+@register('videos.types.video_type_for_url.linear')
+def video_type_linear(dataset):
+    urls = make_url_corpus()
+    def run():
+        for url in urls:
+            video_type_registrar.video_type_class_for_url_linear(url)
+    return run
+
+@register('videos.types.video_type_for_url.indexed')
+def video_type_indexed(dataset):
+    urls = make_url_corpus()
+    def run():
+        # don't let the URL cache hide the cost of matching
+        video_type_registrar.url_cache.clear()
+        for url in urls:
+            video_type_registrar.video_type_class_for_url(url)
+    return run
+
+@register('videos.types.video_type_for_url.cached')
+def video_type_cached(dataset):
+    urls = make_url_corpus()
+    def run():
+        for url in urls:
+            video_type_registrar.video_type_class_for_url(url)
+    return run
@@ -0,0 +1,113 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from testhelpers import benchmarks
+from testhelpers.benchmarks.dataset import build_dataset
+
+class Command(BaseCommand):
+    args = '[benchmark name prefix ...]'
+    help = u'Run the in-process benchmarks against a synthetic test database'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--videos', dest='videos', type='int', default=20,
+                    help='Number of videos to create'),
+        make_option('--languages', dest='languages', type='int', default=5,
+                    help='Number of languages per video'),
+        make_option('--teams', dest='teams', type='int', default=2,
+                    help='Number of teams to create'),
+        make_option('--tasks', dest='tasks', type='int', default=20,
+                    help='Number of open tasks per team'),
+        make_option('--subtitles', dest='subtitles', type='int', default=50,
+                    help='Number of subtitles per language'),
+        make_option('--iterations', '-n', dest='iterations', type='int',
+                    default=50, help='Number of runs per benchmark'),
+        make_option('--warmup', dest='warmup', type='int', default=1,
+                    help='Number of unrecorded runs per benchmark'),
+        make_option('--baseline', dest='baseline',
+                    help='Compare results against this baseline file'),
+        make_option('--save-baseline', dest='save_baseline',
+                    help='Save results as a baseline to this file'),
+        make_option('--tolerance', dest='tolerance', type='float',
+                    default=0.2, help='Allowed fractional latency increase '
+                    'over the baseline'),
+    )
+
+    def handle(self, *args, **options):
+        to_run = [(name, setup) for (name, setup)
+                  in benchmarks.all_benchmarks()
+                  if not args or any(name.startswith(a) for a in args)]
+        if not to_run:
+            raise CommandError("No benchmarks match %s" % ', '.join(args))
+        if options['baseline']:
+            baseline = benchmarks.load_baseline(options['baseline'])
+        else:
+            baseline = None
+
+        setup_test_environment()
+        old_name = settings.DATABASES['default']['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write("Building dataset...\n")
+            dataset = build_dataset(options['videos'], options['languages'],
+                                    options['teams'], options['tasks'],
+                                    options['subtitles'])
+            summaries = self.run_benchmarks(to_run, dataset, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['save_baseline']:
+            benchmarks.save_baseline(options['save_baseline'], summaries)
+        if baseline is not None:
+            self.check_regressions(summaries, baseline, options['tolerance'])
+
+    def run_benchmarks(self, to_run, dataset, options):
+        self.stdout.write("%-40s %6s %9s %9s %9s %8s %9s\n" % (
+            'benchmark', 'runs', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)',
+            'queries', 'cache ops'))
+        summaries = {}
+        for name, setup in to_run:
+            result = benchmarks.run_benchmark(name, setup(dataset),
+                                              options['iterations'],
+                                              options['warmup'])
+            summary = summaries[name] = result.summary()
+            self.stdout.write("%-40s %6d %9.1f %9.1f %9.1f %8.1f %9.1f\n" % (
+                name, summary['runs'], summary['p50'], summary['p95'],
+                summary['p99'], summary['queries'], summary['cache_ops']))
+        return summaries
+
+    def check_regressions(self, summaries, baseline, tolerance):
+        found_regression = False
+        for name, summary in sorted(summaries.items()):
+            if name not in baseline:
+                self.stdout.write("%s: no baseline\n" % name)
+                continue
+            for regression in benchmarks.find_regressions(
+                summary, baseline[name], tolerance):
+                self.stdout.write("REGRESSION %s %s\n" % (name, regression))
+                found_regression = True
+        if found_regression:
+            raise CommandError("Benchmarks regressed from the baseline")
@@ -38,3 +38,37 @@ class SimpleTest(TestCase):
         en = v.subtitle_language('en')
         self.assertTrue(en.is_forked)
         self.assertEquals('ar', v.subtitle_language().language_code)
+
+class BenchmarkTest(TestCase):
+    def test_percentile(self):
+        from testhelpers.benchmarks import percentile
+        values = range(1, 101)
+        self.assertEquals(percentile(values, 50), 50)
+        self.assertEquals(percentile(values, 95), 95)
+        self.assertEquals(percentile(values, 99), 99)
+        self.assertEquals(percentile([3, 1, 2], 50), 2)
+        self.assertEquals(percentile([], 50), None)
+
+    def test_run_benchmark(self):
+        from django.core.cache import cache
+        from testhelpers.benchmarks import run_benchmark
+        def run():
+            list(models.Video.objects.all())
+            cache.get_many(['a', 'b', 'c'])
+            cache.set('a', 1)
+        result = run_benchmark('test', run, iterations=5)
+        summary = result.summary()
+        self.assertEquals(summary['runs'], 5)
+        self.assertEquals(summary['queries'], 1)
+        self.assertEquals(summary['cache_ops'], 2)
+
+    def test_find_regressions(self):
+        from testhelpers.benchmarks import find_regressions
+        baseline = {
+            'p50': 10.0, 'p95': 20.0, 'p99': 30.0,
+            'queries': 5, 'cache_ops': 2,
+        }
+        summary = dict(baseline, p95=23.0)
+        self.assertEquals(find_regressions(summary, baseline, 0.2), [])
+        summary = dict(baseline, p95=25.0, queries=6)
+        self.assertEquals(len(find_regressions(summary, baseline, 0.2)), 2)
@@ -17,7 +17,12 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
 import sys, os, shutil, subprocess, logging, time
+import errno
+import hashlib
+import json
+import multiprocessing
 import re
+import tempfile
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -126,6 +131,126 @@ def get_cache_dir():
             settings.STATIC_ROOT,
             settings.COMPRESS_OUTPUT_DIRNAME, LAST_COMMIT_GUID))
 
+# Bump this when a change to the build changes its output, to invalidate the
+# build cache.
+BUILD_CACHE_VERSION = '1'
+
+def _ensure_dir(path):
+    # bundles are built in parallel, so another worker may create the
+    # directory first
+    try:
+        os.makedirs(path)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+_digests = {}
+
+def _file_digest(path):
+    """Calculate the SHA1 of a file's contents.
+
+    The digests are memoized, since many bundles share input files.  Files
+    shouldn't change once bundle compilation starts.
+    """
+    if path not in _digests:
+        hasher = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), ''):
+                hasher.update(chunk)
+        _digests[path] = hasher.hexdigest()
+    return _digests[path]
+
+def _tree_digest(root):
+    """Calculate a SHA1 for the names and contents of files in a directory."""
+    key = ('tree', root)
+    if key not in _digests:
+        hasher = hashlib.sha1()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                hasher.update(os.path.relpath(path, root))
+                hasher.update(_file_digest(path))
+        _digests[key] = hasher.hexdigest()
+    return _digests[key]
+
+def _build_key(*parts):
+    hasher = hashlib.sha1(BUILD_CACHE_VERSION)
+    for part in parts:
+        hasher.update('\0')
+        hasher.update(part)
+    return hasher.hexdigest()
+
+def _bundle_output(bundle_name, bundle_settings):
+    """Get the path of the file a bundle compiles to, relative to temp_dir.
+
+    For bundles with a bootloader, this is the inner file that the bootloader
+    loads.
+    """
+    if bundle_settings['type'] == 'css':
+        if 'output' in bundle_settings:
+            return bundle_settings['output']
+        return os.path.join("css-compressed", "%s.css" % bundle_name)
+    if bundle_settings.get('use_closure') and 'output' in bundle_settings:
+        name = bundle_settings['output']
+        if 'bootloader' in bundle_settings:
+            name = "".join([os.path.splitext(name)[0], '-inner', os.path.splitext(name)[1]])
+        return name
+    if 'bootloader' in bundle_settings:
+        return os.path.join("js", "{0}-inner.js".format(bundle_name))
+    return os.path.join("js", "{0}.js".format(bundle_name))
+
+class BuildCache(object):
+    """Content-addressed store for compiled files.
+
+    Files are stored under a hash of everything that went into building them
+    (see _build_key()).  If the key matches we can copy the file instead of
+    running calcdeps.py or the compilers again.
+    """
+    def __init__(self, root, enabled=True):
+        self.root = root
+        self.enabled = enabled
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, key, dest):
+        """Copy the file for key to dest.
+
+        Returns True if it was in the cache.
+        """
+        if not self.enabled:
+            return False
+        path = self._path(key)
+        if not os.path.exists(path):
+            return False
+        _ensure_dir(os.path.dirname(dest))
+        shutil.copyfile(path, dest)
+        return True
+
+    def store(self, key, src):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        _ensure_dir(os.path.dirname(path))
+        # copy to a temp file and rename it, so that other workers never see
+        # a partially written file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        os.close(fd)
+        shutil.copyfile(src, temp_path)
+        os.rename(temp_path, path)
+
+_worker_command = None
+
+def _init_worker(command):
+    # The pool forks its workers, so command gets inherited instead of
+    # pickled.
+    global _worker_command
+    _worker_command = command
+
+def _build_bundle_in_worker(bundle_name):
+    return _worker_command.build_bundle(bundle_name)
+
 def sorted_ls(path):
     """
     Returns contents of dir from older to newer
@@ -153,6 +278,13 @@ class Command(BaseCommand):
         optparse.make_option('--compilation-level',
             action='store', dest='compilation_level', default='ADVANCED_OPTIMIZATIONS',
             help="How aggressive is compilation. Possible values: ADVANCED_OPTIMIZATIONS, WHITESPACE_ONLY and SIMPLE_OPTIMIZATIONS"),
+        optparse.make_option('--workers',
+            action='store', type='int', dest='workers',
+            default=multiprocessing.cpu_count(),
+            help="Number of bundles to compile at the same time."),
+        optparse.make_option('--no-build-cache',
+            action='store_false', dest='use_build_cache', default=True,
+            help="Compile every bundle, even if there's a cached build of it."),
         )
 
     def _append_version_for_debug(self, descriptor, file_type):
@@ -166,38 +298,49 @@ class Command(BaseCommand):
             """
         descriptor.write(_make_version_debug_string())
 
+    def _bundle_key(self, bundle_settings, input_paths, *extra):
+        """Calculate the build cache key for a bundle.
+
+        The key covers the bundle settings, the compilation level, the
+        contents of the input files and anything in extra (tool versions,
+        closure dependencies, ...).
+        """
+        parts = [
+            bundle_settings['type'],
+            json.dumps(bundle_settings, sort_keys=True),
+            self.compilation_level,
+        ]
+        parts.extend(_file_digest(path) for path in input_paths)
+        parts.extend(extra)
+        return _build_key(*parts)
+
     def compile_css_bundle(self, bundle_name, files):
         bundle_settings = settings.MEDIA_BUNDLES[bundle_name]
         file_list = [os.path.join(settings.STATIC_ROOT, x) for x in files]
-        for f in file_list:
-            open(f).read()
-        buffer = [open(f).read() for f in file_list]
-        
-        if 'output' in bundle_settings:
-            concatenated_path =  os.path.join(self.temp_dir, bundle_settings['output'])
-            dir_path = os.path.dirname(concatenated_path)
-        else:
-            dir_path = os.path.join(self.temp_dir, "css-compressed")
-            concatenated_path =  os.path.join(dir_path,
-                                              "%s.css" % bundle_name)
-        if os.path.exists(dir_path) is False:
-            os.makedirs(dir_path)
-        out = open(concatenated_path, 'w')
-        out.write("".join(buffer))
-        out.close()
-        filename = "%s.css" % ( bundle_name)
-        cmd_str = "%s --type=css %s" % (settings.COMPRESS_YUI_BINARY, concatenated_path)
-        if self.verbosity > 1:
-            logging.info( "calling %s" % cmd_str)
-        output, err_data  = call_command(cmd_str)
-
-
-        out = open(concatenated_path, 'w')
-        out.write(output)
-        self._append_version_for_debug(out, "css")
-        out.close()
-        #os.remove(concatenated_path)
-        return  filename
+        concatenated_path = os.path.join(
+            self.temp_dir, _bundle_output(bundle_name, bundle_settings))
+        _ensure_dir(os.path.dirname(concatenated_path))
+
+        key = self._bundle_key(bundle_settings, file_list,
+                               settings.COMPRESS_YUI_BINARY)
+        cached = self.build_cache.fetch(key, concatenated_path)
+        if not cached:
+            buffer = [open(f).read() for f in file_list]
+            with open(concatenated_path, 'w') as out:
+                out.write("".join(buffer))
+            cmd_str = "%s --type=css %s" % (settings.COMPRESS_YUI_BINARY, concatenated_path)
+            if self.verbosity > 1:
+                logging.info( "calling %s" % cmd_str)
+            output, err_data  = call_command(cmd_str)
+
+            with open(concatenated_path, 'w') as out:
+                out.write(output)
+            if output:
+                self.build_cache.store(key, concatenated_path)
+
+        with open(concatenated_path, 'a') as out:
+            self._append_version_for_debug(out, "css")
+        return cached
 
     def compile_js_bundle(self, bundle_name, files):
         self.ensure_js_dir_exists()
@@ -205,58 +348,59 @@ class Command(BaseCommand):
         if bundle_settings.get('use_closure'):
             return self.compile_js_closure_bundle(bundle_name, files)
 
-        if 'bootloader' in bundle_settings:
-            output_file_name = "{0}-inner.js".format(bundle_name)
-        else:
-            output_file_name = "{0}.js".format(bundle_name)
-        output_path = os.path.join(self.temp_dir, "js" , output_file_name)
-        with open(output_path, 'w') as output:
-            for input_filename in files:
-                input_path = to_static_root(input_filename)
-                minified = jsmin(open(input_path).read());
-                output.write('/* %s */\n' % input_filename);
-                output.write("%s;\n" % (minified,))
+        output_path = os.path.join(
+            self.temp_dir, _bundle_output(bundle_name, bundle_settings))
+        input_paths = [to_static_root(f) for f in files]
+        key = self._bundle_key(bundle_settings, input_paths)
+        cached = self.build_cache.fetch(key, output_path)
+        if not cached:
+            with open(output_path, 'w') as output:
+                for input_filename in files:
+                    input_path = to_static_root(input_filename)
+                    minified = jsmin(open(input_path).read());
+                    output.write('/* %s */\n' % input_filename);
+                    output.write("%s;\n" % (minified,))
+            self.build_cache.store(key, output_path)
 
         if 'bootloader' in bundle_settings:
             self._compile_js_bootloader(
                 bundle_name, bundle_settings['bootloader'])
+        return cached
 
     def ensure_js_dir_exists(self):
-        temp_js_dir = os.path.join(self.temp_dir, 'js')
-        if not os.path.exists(temp_js_dir):
-            os.makedirs(temp_js_dir)
-
-    def compile_js_closure_bundle(self, bundle_name, files):
-        bundle_settings = settings.MEDIA_BUNDLES[bundle_name]
-        if 'bootloader' in bundle_settings:
-            output_file_name = "{0}-inner.js".format(bundle_name)
-        else:
-            output_file_name = "{0}.js".format(bundle_name)
-
-        debug = bundle_settings.get("debug", False)
-        extra_defines = bundle_settings.get("extra_defines", None)
-        include_flash_deps = bundle_settings.get("include_flash_deps", True)
-        closure_dep_file = bundle_settings.get("closure_deps",'js/closure-dependencies.js' )
-        optimization_type = bundle_settings.get("optimizations", self.compilation_level)
+        _ensure_dir(os.path.join(self.temp_dir, 'js'))
 
-        logging.info("Starting {0}".format(output_file_name))
+    def _write_closure_deps(self, bundle_name, bundle_settings):
+        """Write the closure library dependencies for a bundle.
 
-        deps = [" --js %s " % os.path.join(JS_LIB, file) for file in files]
-        if 'output' in bundle_settings:
-            if 'bootloader' in bundle_settings:
-                name = bundle_settings['output']
-                name = "".join([os.path.splitext(name)[0], '-inner', os.path.splitext(name)[1]])
-            compiled_js = os.path.join(self.temp_dir, name)
-        else:
-            compiled_js = os.path.join(self.temp_dir, "js" , output_file_name)
-        compiler_jar = COMPILER_PATH
+        Each bundle gets its own file in work_dir, so bundles can be compiled
+        at the same time.  The calcdeps.py output only depends on the closure
+        library and the dependency files, so it's cached as well.
 
-        logging.info("Calculating closure dependencies")
+        Returns the path to the file.
+        """
+        calcdeps_js = os.path.join(self.work_dir,
+                                   '%s-calcdeps.js' % bundle_name)
+        if 'ignore_closure' in bundle_settings:
+            with open(calcdeps_js, 'w') as calcdeps_file:
+                calcdeps_file.write("\n")
+            return calcdeps_js
 
+        debug = bundle_settings.get("debug", False)
+        closure_dep_file = bundle_settings.get("closure_deps",'js/closure-dependencies.js' )
+        dep_paths = [os.path.join(JS_LIB, closure_dep_file)]
         js_debug_dep_file = ''
         if debug:
             js_debug_dep_file = '-i {0}/{1}'.format(JS_LIB, 'js/closure-debug-dependencies.js')
+            dep_paths.append(os.path.join(
+                JS_LIB, 'js/closure-debug-dependencies.js'))
+
+        key = _build_key('calcdeps', _tree_digest(CLOSURE_LIB),
+                         *[_file_digest(path) for path in dep_paths])
+        if self.build_cache.fetch(key, calcdeps_js):
+            return calcdeps_js
 
+        logging.info("Calculating closure dependencies for %s" % bundle_name)
         cmd_str = "%s/closure/bin/calcdeps.py -i %s/%s %s -p %s/ -o script"  % (
             CLOSURE_LIB,
             JS_LIB,
@@ -268,64 +412,97 @@ class Command(BaseCommand):
         output,_ = call_command(cmd_str)
 
         # This is to reduce the number of warnings in the code.
-        # The unisubs-calcdeps.js file is a concatenation of a bunch of Google Closure
+        # The calcdeps file is a concatenation of a bunch of Google Closure
         # JavaScript files, each of which has a @fileoverview tag to describe it.
         # When put all in one file, the compiler complains, so remove them all.
         output_lines = filter(lambda s: s.find("@fileoverview") == -1,
                               output.split("\n"))
 
-        calcdeps_js = os.path.join(JS_LIB, 'js', 'unisubs-calcdeps.js')
-        calcdeps_file = open(calcdeps_js, "w")
-        if 'ignore_closure' in bundle_settings:
-            calcdeps_file.write("\n")
-        else:
+        with open(calcdeps_js, "w") as calcdeps_file:
             calcdeps_file.write("\n".join(output_lines))
-        calcdeps_file.close()
-
-        logging.info("Compiling {0}".format(output_file_name))
-
-        debug_arg = ''
-        if not debug:
-            debug_arg = '--define goog.DEBUG=false'
-        extra_defines_arg = ''
-        if extra_defines is not None:
-            for k, v in extra_defines.items():
-                extra_defines_arg += ' --define {0}={1} '.format(k, v)
-        cmd_str =  ("java -jar %s --js %s %s --js_output_file %s %s %s "
-                    "--define goog.NATIVE_ARRAY_PROTOTYPES=false "
-                    "--output_wrapper (function(){%%output%%})(); "
-                    "--warning_level QUIET "
-                    "--compilation_level %s") % \
-                    (compiler_jar, calcdeps_js, deps, compiled_js,
-                     debug_arg, extra_defines_arg, optimization_type)
+        if output:
+            self.build_cache.store(key, calcdeps_js)
+        return calcdeps_js
 
-        if self.verbosity > 1:
-            logging.info( "calling %s" % cmd_str)
-        output,err = call_command(cmd_str)
-        if err:
-            # if an error comes up, is will look like:
-            sys.stderr.write("Error compiling : %s \n%s" % (bundle_name, err))
-
-        with open(compiled_js, 'r') as compiled_js_file:
-            compiled_js_text = compiled_js_file.read()
-
-        with open(compiled_js, 'w') as compiled_js_file:
-
-            # Include dependencies needed for DFXP parsing.
-            with open(os.path.join(JS_LIB, 'src', 'js', 'third-party', 'amara-jquery.min.js'), 'r') as jqueryjs_file:
-                compiled_js_file.write(jqueryjs_file.read())
-            with open(os.path.join(JS_LIB, 'src', 'js', 'dfxp', 'dfxp.js'), 'r') as dfxpjs_file:
-                compiled_js_file.write(dfxpjs_file.read())
-
-            if include_flash_deps:
-                with open(os.path.join(JS_LIB, 'js', 'swfobject.js'), 'r') as swfobject_file:
-                    compiled_js_file.write(swfobject_file.read())
-                with open(FLOWPLAYER_JS, 'r') as flowplayerjs_file:
-                    compiled_js_file.write(flowplayerjs_file.read())
-            compiled_js_file.write(compiled_js_text)
+    def compile_js_closure_bundle(self, bundle_name, files):
+        bundle_settings = settings.MEDIA_BUNDLES[bundle_name]
+        output_file_name = os.path.basename(
+            _bundle_output(bundle_name, bundle_settings))
+
+        debug = bundle_settings.get("debug", False)
+        extra_defines = bundle_settings.get("extra_defines", None)
+        include_flash_deps = bundle_settings.get("include_flash_deps", True)
+        optimization_type = bundle_settings.get("optimizations", self.compilation_level)
+
+        logging.info("Starting {0}".format(output_file_name))
+
+        deps = [" --js %s " % os.path.join(JS_LIB, file) for file in files]
+        compiled_js = os.path.join(
+            self.temp_dir, _bundle_output(bundle_name, bundle_settings))
+        _ensure_dir(os.path.dirname(compiled_js))
+        compiler_jar = COMPILER_PATH
+
+        calcdeps_js = self._write_closure_deps(bundle_name, bundle_settings)
+
+        # Include dependencies needed for DFXP parsing.
+        prepended_files = [
+            os.path.join(JS_LIB, 'src', 'js', 'third-party', 'amara-jquery.min.js'),
+            os.path.join(JS_LIB, 'src', 'js', 'dfxp', 'dfxp.js'),
+        ]
+        if include_flash_deps:
+            prepended_files.extend([
+                os.path.join(JS_LIB, 'js', 'swfobject.js'),
+                FLOWPLAYER_JS,
+            ])
+
+        key = self._bundle_key(
+            bundle_settings,
+            [os.path.join(JS_LIB, file) for file in files] + prepended_files,
+            _file_digest(calcdeps_js), _file_digest(compiler_jar))
+        cached = self.build_cache.fetch(key, compiled_js)
+        err = ''
+        if cached:
+            logging.info("Using cached build of {0}".format(output_file_name))
+        else:
+            logging.info("Compiling {0}".format(output_file_name))
+
+            debug_arg = ''
+            if not debug:
+                debug_arg = '--define goog.DEBUG=false'
+            extra_defines_arg = ''
+            if extra_defines is not None:
+                for k, v in extra_defines.items():
+                    extra_defines_arg += ' --define {0}={1} '.format(k, v)
+            cmd_str =  ("java -jar %s --js %s %s --js_output_file %s %s %s "
+                        "--define goog.NATIVE_ARRAY_PROTOTYPES=false "
+                        "--output_wrapper (function(){%%output%%})(); "
+                        "--warning_level QUIET "
+                        "--compilation_level %s") % \
+                        (compiler_jar, calcdeps_js, deps, compiled_js,
+                         debug_arg, extra_defines_arg, optimization_type)
+
+            if self.verbosity > 1:
+                logging.info( "calling %s" % cmd_str)
+            output,err = call_command(cmd_str)
+            if err:
+                # if an error comes up, is will look like:
+                sys.stderr.write("Error compiling : %s \n%s" % (bundle_name, err))
+
+            with open(compiled_js, 'r') as compiled_js_file:
+                compiled_js_text = compiled_js_file.read()
+
+            with open(compiled_js, 'w') as compiled_js_file:
+                for path in prepended_files:
+                    with open(path, 'r') as prepended_file:
+                        compiled_js_file.write(prepended_file.read())
+                compiled_js_file.write(compiled_js_text)
+            if len(output) > 0:
+                logging.info("compiler.jar output: %s" % output)
+            if not err:
+                self.build_cache.store(key, compiled_js)
+
+        with open(compiled_js, 'a') as compiled_js_file:
             self._append_version_for_debug(compiled_js_file, "js")
-        if len(output) > 0:
-            logging.info("compiler.jar output: %s" % output)
 
         if 'bootloader' in bundle_settings:
             self._compile_js_bootloader(
@@ -335,6 +512,7 @@ class Command(BaseCommand):
             logging.info("stderr: %s" % err)
         else:
             logging.info("Successfully compiled {0}".format(output_file_name))
+        return cached
 
     def _compile_js_bootloader(self, bundle_name, bootloader_settings):
         bundle_settings = settings.MEDIA_BUNDLES[bundle_name]
@@ -352,6 +530,11 @@ class Command(BaseCommand):
         output_override = bundle_settings.get('output', None)
         if output_override:
             file_name = os.path.join(self.temp_dir, output_override)
+        _ensure_dir(os.path.dirname(file_name))
+        key = _build_key('bootloader', rendered.encode('utf-8'),
+                         self.compilation_level, _file_digest(COMPILER_PATH))
+        if self.build_cache.fetch(key, file_name):
+            return
         uncompiled_file_name = os.path.join(
                 self.temp_dir, "js", "{0}-uncompiled.js".format(bundle_name))
         with open(uncompiled_file_name, 'w') as f:
@@ -359,11 +542,25 @@ class Command(BaseCommand):
         cmd_str = ("java -jar {0} --js {1} --js_output_file {2} "
                    "--compilation_level {3}").format(
             COMPILER_PATH, uncompiled_file_name, file_name, self.compilation_level)
-        call_command(cmd_str)
+        output, err = call_command(cmd_str)
         os.remove(uncompiled_file_name)
+        if os.path.exists(file_name) and not err:
+            self.build_cache.store(key, file_name)
 
     def compile_media_bundle(self, bundle_name, bundle_type, files):
-        getattr(self, "compile_%s_bundle" % bundle_type)(bundle_name, files)
+        return getattr(self, "compile_%s_bundle" % bundle_type)(bundle_name, files)
+
+    def build_bundle(self, bundle_name):
+        """Compile a bundle into temp_dir.
+
+        Returns a (bundle_name, seconds, cached) tuple.
+        """
+        start = time.time()
+        data = settings.MEDIA_BUNDLES[bundle_name]
+        logging.info("compiling %s: %s" % (data['type'], bundle_name))
+        cached = self.compile_media_bundle(
+            bundle_name, data['type'], data["files"])
+        return bundle_name, time.time() - start, bool(cached)
 
     def _create_temp_dir(self):
         commit_hash = LAST_COMMIT_GUID
@@ -473,13 +670,45 @@ class Command(BaseCommand):
             f.write(rendered)
 
     def _compile_media_bundles(self, restrict_bundles, args):
-        bundles = settings.MEDIA_BUNDLES
-        for bundle_name, data in bundles.items():
-            if restrict_bundles and bundle_name not in args:
-                continue
-            print "compiling %s: %s" % (data['type'], bundle_name)
-            self.compile_media_bundle(
-                bundle_name, data['type'], data["files"])
+        bundle_names = [bundle_name for bundle_name in settings.MEDIA_BUNDLES
+                        if not restrict_bundles or bundle_name in args]
+        if any(settings.MEDIA_BUNDLES[bundle_name].get('use_closure')
+               for bundle_name in bundle_names):
+            # Calculate these once, before forking, so that the workers
+            # inherit them.
+            _tree_digest(CLOSURE_LIB)
+            _file_digest(COMPILER_PATH)
+
+        start = time.time()
+        workers = max(1, min(self.workers, len(bundle_names)))
+        self.work_dir = tempfile.mkdtemp(prefix='static-deps-')
+        try:
+            if workers > 1:
+                pool = multiprocessing.Pool(workers, _init_worker, (self,))
+                try:
+                    results = list(pool.imap_unordered(
+                        _build_bundle_in_worker, bundle_names))
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = [self.build_bundle(bundle_name)
+                           for bundle_name in bundle_names]
+        finally:
+            shutil.rmtree(self.work_dir)
+        self._report_timings(results, time.time() - start, workers)
+
+    def _report_timings(self, results, total_time, workers):
+        if self.verbosity < 1:
+            return
+        print "Bundle timings:"
+        for bundle_name, seconds, cached in sorted(results,
+                                                  key=lambda r: -r[1]):
+            print "  %-35s %7.2fs %s" % (bundle_name, seconds,
+                                          'cached' if cached else 'compiled')
+        print "  %d bundles (%d cached) in %.2fs with %d worker(s)" % (
+            len(results), len([r for r in results if r[2]]), total_time,
+            workers)
 
     def _remove_cache_dirs_before(self, num_to_keep):
         """
@@ -554,6 +783,9 @@ class Command(BaseCommand):
         self.test_str_version = bool(options.get('test_str_version'))
         self.keeps_previous = bool(options.get('keeps_previous'))
         self.compilation_level = options.get('compilation_level')
+        self.workers = int(options.get('workers') or 1)
+        self.build_cache = BuildCache(settings.COMPRESS_BUILD_CACHE_DIR,
+                                      options.get('use_build_cache', True))
         restrict_bundles = bool(args)
 
         os.chdir(settings.PROJECT_ROOT)
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from django.db import models
 from django.utils.functional import Promise
 from django.utils.encoding import force_unicode
@@ -113,7 +115,10 @@ class WidgetDialogLog(models.Model):
     log = models.TextField()
 
 class WidgetDialogCall(models.Model):
-    date_saved = models.DateTimeField(auto_now_add=True)
+    # not auto_now_add, since that would set it when the writer flushes its
+    # buffer rather than when the call happened
+    date_saved = models.DateTimeField(default=datetime.now, editable=False,
+                                      blank=True)
     browser_id = models.CharField(max_length=127)
     method = models.CharField(max_length=127)
     request_args = GzippedDictField()
@@ -0,0 +1,38 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""uslogging.writers -- Buffered writers for our logging models."""
+
+from uslogging.models import WidgetDialogCall
+from utils.buffered_writer import BufferedWriter
+
+class WidgetDialogCallWriter(BufferedWriter):
+    """Bulk-inserts WidgetDialogCall rows in the background.
+
+    Items are unsaved WidgetDialogCall objects.
+    """
+    # request_args can hold a full set of subtitles, so keep the buffer
+    # smaller than the default.
+    max_size = 1000
+
+    def write(self, batch):
+        # bulk_create uses the router to pick the uslogging DB and commits
+        # the transaction itself.
+        WidgetDialogCall.objects.bulk_create(batch)
+
+widget_dialog_call_writer = WidgetDialogCallWriter('widget-dialog-calls')
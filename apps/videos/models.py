@@ -45,7 +45,7 @@ from videos import metadata
 from videos import signals
 from videos.types import video_type_registrar
 from videos.feed_parser import VideoImporter
-from comments.models import Comment
+from comments.models import Comment, CommentCountField
 from statistic import hitcounts
 from widget import video_cache
 from utils.redis_utils import RedisSimpleField
@@ -207,6 +207,9 @@ class Video(models.Model):
     followers = models.ManyToManyField(User, blank=True, related_name='followed_videos', editable=False)
     complete_date = models.DateTimeField(null=True, blank=True, editable=False)
     featured = models.DateTimeField(null=True, blank=True)
+    # Denormalized count of comments on the video, maintained by the Comment
+    # save/delete signal handlers.
+    comment_count = CommentCountField()
     # Metadata fields for this video.  These are translatable strings for
     # metadata on the video.  One example is Speaker name for TED videos.
     #
@@ -926,12 +929,6 @@ class Video(models.Model):
         return SL.objects.filter(video=self).exclude(
                 language_code=self.primary_audio_language_code)
 
-    def comment_count(self):
-        if hasattr(self, '_comment_count'):
-            return self._comment_count
-        self._comment_count = Comment.get_for_object(self).count()
-        return self._comment_count
-
     class Meta(object):
         permissions = (
             ("can_moderate_version"   , "Can moderate version" ,),
@@ -1787,6 +1784,58 @@ class Action(models.Model):
 
 post_save.connect(Action.create_comment_handler, Comment)
 
+# TimelineEntry
+class TimelineEntry(models.Model):
+    """An Action in one of our materialized activity timelines.
+
+    We add entries when Actions are created (see videos.timelines) so that
+    activity feeds can be read with a single index range scan instead of
+    joining/ORing across the teams, followers and actions tables.
+    """
+    TEAM = 1
+    TEAM_VIDEOS = 2
+    USER = 3
+    VIDEO = 4
+    FOLLOWED_VIDEOS = 5
+    TYPES = (
+        (TEAM, 'team'),
+        (TEAM_VIDEOS, 'team videos'),
+        (USER, 'user'),
+        (VIDEO, 'video'),
+        (FOLLOWED_VIDEOS, 'followed videos'),
+    )
+    timeline_type = models.PositiveSmallIntegerField(choices=TYPES)
+    # id of the Team/User/Video the timeline belongs to, depending on
+    # timeline_type
+    owner_id = models.PositiveIntegerField()
+    action = models.ForeignKey(Action)
+    # copied from the action, so we can order and filter without a join
+    created = models.DateTimeField()
+    actor_id = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        # This also serves as the index to read a timeline in order.  Since
+        # created is copied from the action, it still stops us from adding an
+        # action to a timeline twice.
+        unique_together = (('timeline_type', 'owner_id', 'created', 'action'),)
+
+    def __unicode__(self):
+        return u'%s %s: %s' % (self.get_timeline_type_display(),
+                               self.owner_id, self.action_id)
+
+def _timeline_handler(name):
+    # videos.timelines imports this module, so import it lazily
+    def handler(sender, **kwargs):
+        from videos import timelines
+        getattr(timelines, name)(sender, **kwargs)
+    return handler
+
+post_save.connect(_timeline_handler('on_action_save'), Action, weak=False,
+                  dispatch_uid='videos.action.timelines')
+models.signals.m2m_changed.connect(
+    _timeline_handler('on_followed_videos_changed'), User.videos.through,
+    weak=False, dispatch_uid='videos.followed_video.timelines')
+
 
 # UserTestResult
 class UserTestResult(models.Model):
@@ -182,10 +182,7 @@ class VideosApiClass(object):
         rest = rest.filter(featured__gt=datetime.datetime(datetime.MINYEAR, 1, 1)) \
             .order_by('-featured')
 
-        count = rel.count() + rest.count()
-
         mqs = MultiQuerySet(rel, rest)
-        mqs.set_count(count)
 
         return render_page(page, mqs, request=request)
 
@@ -198,10 +195,7 @@ class VideosApiClass(object):
         rel = rel.filter(requests_exact__in=user_langs)
         rest = rest.filter(requests_exact__in=user_langs)
 
-        count = rel.count() + rest.count()
-
         mqs = MultiQuerySet(rel, rest)
-        mqs.set_count(count)
 
         return render_page(page, mqs, request=request)
 
@@ -211,10 +205,7 @@ class VideosApiClass(object):
         rel = rel.order_by('-created')
         rest = rest.order_by('-created')
 
-        count = rel.count() + rest.count()
-
         mqs = MultiQuerySet(rel, rest)
-        mqs.set_count(count)
 
         return render_page(page, mqs, request=request)
 
@@ -235,10 +226,7 @@ class VideosApiClass(object):
         rel = rel.order_by('-%s' % sort_field)
         rest = rest.order_by('-%s' % sort_field)
 
-        count = rel.count() + rest.count()
-
         mqs = MultiQuerySet(rel, rest)
-        mqs.set_count(count)
 
         return render_page(page, mqs,  request=request)
 
@@ -289,10 +277,7 @@ class VideosApiClass(object):
         rel = rel.order_by('-%s' % sort_field)[:5]
         rest = rest.order_by('-%s' % sort_field)[:5]
 
-        count = rel.count() + rest.count()
-
         mqs = MultiQuerySet(rel, rest)
-        mqs.set_count(count)
 
         context = {
             'video_list': mqs
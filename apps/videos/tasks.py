@@ -29,7 +29,7 @@ from haystack import site
 from raven.contrib.django.models import client
 import requests
 
-from babelsubs.storage import diff as diff_subtitles
+from subtitles.diff import diff as diff_subtitles
 from messages.models import Message
 from messages import tasks
 from utils import send_templated_email, DEFAULT_PROTOCOL
@@ -41,6 +41,7 @@ from subtitles.models import (
 from auth.models import CustomUser as User
 from videos.types import video_type_registrar
 from videos.types import UPDATE_VERSION_ACTION, DELETE_LANGUAGE_ACTION
+from videos import timelines
 from apps.videos.types import VideoTypeError
 
 celery_logger = logging.getLogger('celery.task')
@@ -433,6 +434,11 @@ def gague_billing_records():
     from teams.models import BillingRecord
     Gauge('teams.BillingRecord').report(BillingRecord.objects.count())
 
+@task
+def sync_video_team_timeline(video_id, team_id):
+    """Update the TEAM_VIDEOS timelines after a video changes teams."""
+    timelines.sync_video_team(video_id, team_id)
+
 @task
 def sync_latest_versions_for_video(video_pk):
     video = Video.objects.get(pk=video_pk)
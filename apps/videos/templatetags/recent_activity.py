@@ -17,7 +17,7 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
 from django import template
-from videos.models import Action
+from videos import timelines
 from django.conf import settings
 from datetime import date
 from django.utils.dateformat import format as date_format
@@ -28,18 +28,14 @@ LIMIT = settings.RECENT_ACTIVITIES_ONPAGE
 
 @register.inclusion_tag('videos/_recent_activity.html')
 def recent_activity(user):
-    qs = Action.objects.for_user(user=user)
-
     return {
-        'events': qs[:LIMIT],
+        'events': timelines.user_timeline(user, limit=LIMIT),
         'user_info': user
     }
 
 @register.inclusion_tag('videos/_video_activity.html')
 def video_activity(video):
-    qs = Action.objects.for_video(video)
-
     return {
-        'events': qs[:LIMIT],
+        'events': timelines.video_timeline(video, limit=LIMIT),
         'video': video
     }
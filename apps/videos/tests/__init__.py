@@ -12,3 +12,4 @@ from apps.videos.tests.video_types import *
 from apps.videos.tests.video_urls import *
 from apps.videos.tests.views import *
 from apps.videos.tests.importer import *
+from apps.videos.tests.timelines import *
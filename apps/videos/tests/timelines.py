@@ -0,0 +1,196 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import datetime
+import itertools
+
+from django.core.management import call_command
+from django.test import TestCase
+import mock
+
+from utils import test_factories
+from videos import timelines
+from videos.models import Action, TimelineEntry
+
+class TimelinesTest(TestCase):
+    def setUp(self):
+        self.user = test_factories.create_user()
+        self.other_user = test_factories.create_user()
+        self.team = test_factories.create_team()
+        test_factories.create_team_member(self.team, self.user)
+        self.team_video = test_factories.create_team_video(
+            self.team, self.user)
+        self.video = self.team_video.video
+        self.other_video = test_factories.create_video()
+        # start with empty timelines, so that the only actions are the ones
+        # created by the tests
+        Action.objects.all().delete()
+        self.times = (datetime.datetime(2013, 1, 1) +
+                      datetime.timedelta(minutes=i)
+                      for i in itertools.count())
+
+    def make_action(self, **kwargs):
+        return Action.objects.create(action_type=Action.COMMENT,
+                                     created=self.times.next(), **kwargs)
+
+    def make_actions(self):
+        return [
+            self.make_action(team=self.team, user=self.other_user),
+            self.make_action(video=self.video, user=self.user),
+            self.make_action(video=self.video, user=self.other_user),
+            self.make_action(video=self.other_video, user=self.other_user),
+            self.make_action(video=self.other_video, user=self.user),
+        ]
+
+    def check_timeline(self, timeline, manager_qs):
+        self.assertEquals([a.id for a in timeline],
+                          [a.id for a in manager_qs])
+
+    def test_team_timeline(self):
+        self.make_actions()
+        self.check_timeline(timelines.team_timeline(self.team),
+                            Action.objects.for_team(self.team))
+
+    def test_user_timeline(self):
+        self.make_actions()
+        self.check_timeline(timelines.user_timeline(self.user),
+                            Action.objects.for_user(self.user))
+
+    def test_user_team_activity(self):
+        self.make_actions()
+        self.make_action(team=self.team, user=self.user)
+        self.check_timeline(timelines.user_team_activity(self.user),
+                            Action.objects.for_user_team_activity(self.user))
+
+    def test_user_video_activity(self):
+        self.user.videos.add(self.video)
+        self.make_actions()
+        self.check_timeline(timelines.user_video_activity(self.user),
+                            Action.objects.for_user_video_activity(self.user))
+
+    def test_video_timeline(self):
+        self.make_actions()
+        self.check_timeline(timelines.video_timeline(self.video),
+                            Action.objects.for_video(self.video))
+
+    def test_pagination(self):
+        actions = [self.make_action(video=self.video) for i in xrange(5)]
+        actions.reverse()
+        page = timelines.video_timeline(self.video, limit=2)
+        self.assertEquals(list(page), actions[:2])
+        page = timelines.video_timeline(self.video, page.next_cursor, 2)
+        self.assertEquals(list(page), actions[2:4])
+        page = timelines.video_timeline(self.video, page.next_cursor, 2)
+        self.assertEquals(list(page), actions[4:])
+        self.assertEquals(page.next_cursor, None)
+
+    def test_pagination_with_same_timestamp(self):
+        created = self.times.next()
+        actions = [Action.objects.create(action_type=Action.COMMENT,
+                                         video=self.video, created=created)
+                   for i in xrange(3)]
+        actions.reverse()
+        page = timelines.video_timeline(self.video, limit=2)
+        self.assertEquals(list(page), actions[:2])
+        page = timelines.video_timeline(self.video, page.next_cursor, 2)
+        self.assertEquals(list(page), actions[2:])
+
+    def test_invalid_cursor(self):
+        action = self.make_action(video=self.video)
+        self.assertEquals(list(timelines.video_timeline(self.video, 'foo')),
+                          [action])
+
+    def test_follow_and_unfollow(self):
+        self.make_actions()
+        self.user.videos.add(self.other_video)
+        self.check_timeline(timelines.user_video_activity(self.user),
+                            Action.objects.for_user_video_activity(self.user))
+        self.user.videos.remove(self.other_video)
+        self.check_timeline(timelines.user_video_activity(self.user),
+                            Action.objects.for_user_video_activity(self.user))
+        self.assertFalse(any(a.video_id == self.other_video.id for a in
+                             timelines.user_video_activity(self.user)))
+
+    def test_follow_backfill_limit(self):
+        # the limit should apply to each video, the busy video shouldn't
+        # crowd out the actions for the other one
+        other_action = self.make_action(video=self.other_video,
+                                        user=self.other_user)
+        actions = [self.make_action(video=self.video, user=self.other_user)
+                   for i in xrange(3)]
+        TimelineEntry.objects.all().delete()
+        with mock.patch.object(timelines, 'FOLLOW_BACKFILL', 2):
+            timelines.follow_videos([(self.user.id, self.video.id),
+                                     (self.user.id, self.other_video.id)])
+        self.assertEquals(
+            [a.id for a in timelines.user_video_activity(self.user)],
+            [actions[2].id, actions[1].id, other_action.id])
+        # the actions for all the videos should be fetched with 1 query
+        with self.assertNumQueries(1):
+            timelines._recent_video_actions([self.video.id,
+                                             self.other_video.id], 2)
+
+    def test_move_team_video(self):
+        self.make_actions()
+        other_team = test_factories.create_team()
+        self.team_video.move_to(other_team)
+        self.check_timeline(timelines.team_timeline(self.team),
+                            Action.objects.for_team(self.team))
+        self.check_timeline(timelines.team_timeline(other_team),
+                            Action.objects.for_team(other_team))
+
+    def test_move_team_video_in_chunks(self):
+        self.make_actions()
+        for i in xrange(3):
+            self.make_action(video=self.video, user=self.other_user)
+        other_team = test_factories.create_team()
+        with mock.patch.object(timelines, 'SYNC_CHUNK_SIZE', 2):
+            self.team_video.move_to(other_team)
+        self.check_timeline(timelines.team_timeline(other_team),
+                            Action.objects.for_team(other_team))
+
+    def test_remove_team_video(self):
+        self.make_actions()
+        self.team_video.delete()
+        self.check_timeline(timelines.team_timeline(self.team),
+                            Action.objects.for_team(self.team))
+
+    def test_backfill(self):
+        self.make_actions()
+        entries = sorted(TimelineEntry.objects.values_list(
+            'timeline_type', 'owner_id', 'action', 'actor_id'))
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timelines', verbosity=0)
+        self.assertEquals(sorted(TimelineEntry.objects.values_list(
+            'timeline_type', 'owner_id', 'action', 'actor_id')), entries)
+        # running it again shouldn't create duplicates
+        call_command('backfill_timelines', verbosity=0)
+        self.assertEquals(TimelineEntry.objects.count(), len(entries))
+
+    def test_query_count(self):
+        self.make_actions()
+        # 1 query for the timeline entries and 1 for the actions
+        with self.assertNumQueries(2):
+            timelines.video_timeline(self.video)
+        # the team timeline is made from 2 timelines
+        with self.assertNumQueries(3):
+            timelines.team_timeline(self.team)
+        action_id = Action.objects.filter(video=self.video)[0].id
+        # 1 more to look up the cursor
+        with self.assertNumQueries(3):
+            timelines.video_timeline(self.video, before=action_id)
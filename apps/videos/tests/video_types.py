@@ -29,7 +29,7 @@ from apps.subtitles import pipeline
 from apps.subtitles.models import SubtitleLanguage, SubtitleVersion
 from apps.videos.models import Video, VIDEO_TYPE_BRIGHTCOVE
 from apps.videos.types import video_type_registrar, VideoTypeError
-from apps.videos.types.base import VideoType, VideoTypeRegistrar
+from apps.videos.types.base import LRUCache, VideoType, VideoTypeRegistrar
 from apps.videos.types.bliptv import BlipTvVideoType
 from apps.videos.types.brigthcove  import BrightcoveVideoType
 from apps.videos.types.dailymotion import DailymotionVideoType
@@ -42,6 +42,7 @@ from apps.videos.types.youtube import (
     YoutubeVideoType,
     _prepare_subtitle_data_for_version, add_credit, should_add_credit
 )
+from apps.testhelpers.benchmarks.video_types import make_url_corpus
 from utils import test_utils
 
 class YoutubeVideoTypeTest(TestCase):
@@ -299,6 +300,93 @@ class VideoTypeRegistrarTest(TestCase):
         self.assertRaises(VideoTypeError, video_type_registrar.video_type_for_url,
                           'http://youtube.com/v=100500')
 
+    def test_matches_linear_scan(self):
+        video_type_registrar.url_cache.clear()
+        urls = make_url_corpus(count=3) + [
+            'http://blip.tv/file/get/Coldguy-SpineBreakersLiveAWizardOfEarthsea210.FLV',
+            'http://BLIP.TV/someshow/episode-1',
+            'http://youtube.com:80/watch?v=abcdefg',
+            'http://www.youtube.com@example.com/watch?v=abcdefg',
+            'http://www.dailymotion.com',
+            '',
+        ]
+        for url in urls:
+            expected = video_type_registrar.video_type_class_for_url_linear(
+                url)
+            self.assertEquals(
+                video_type_registrar.video_type_class_for_url(url),
+                expected, url)
+            # again, from the cache
+            self.assertEquals(
+                video_type_registrar.video_type_class_for_url(url),
+                expected, url)
+
+    def test_candidate_types(self):
+        candidates = video_type_registrar.candidate_types(
+            'http://www.youtube.com/watch?v=abcdefg')
+        self.assertTrue(YoutubeVideoType in candidates)
+        self.assertTrue(HtmlFiveVideoType in candidates)
+        self.assertFalse(VimeoVideoType in candidates)
+        self.assertFalse(BlipTvVideoType in candidates)
+        candidates = video_type_registrar.candidate_types(
+            'http://example.com/video.flv')
+        self.assertEquals([vt for vt in candidates if vt.url_hosts], [])
+        # the order stays the same as the registration order
+        self.assertEquals(
+            candidates,
+            [vt for vt in video_type_registrar.type_list if vt in candidates])
+
+    def test_register_clears_cache(self):
+        registrar = VideoTypeRegistrar()
+        registrar.register(HtmlFiveVideoType)
+        url = 'http://mockup.example.com/video'
+        self.assertEquals(registrar.video_type_class_for_url(url), None)
+
+        class MockupVideoType(VideoType):
+            abbreviation = 'mockup'
+            name = 'MockUp'
+            url_hosts = ('mockup.example.com',)
+
+            @classmethod
+            def matches_video_url(cls, url):
+                return True
+
+        registrar.register(MockupVideoType)
+        self.assertEquals(registrar.video_type_class_for_url(url),
+                          MockupVideoType)
+
+    def test_no_match_not_cached(self):
+        class FlakyVideoType(VideoType):
+            abbreviation = 'flaky'
+            name = 'Flaky'
+            url_hosts = ('flaky.example.com',)
+            site_available = False
+
+            @classmethod
+            def matches_video_url(cls, url):
+                # like a type that asks the video site about the URL
+                return cls.site_available
+
+        registrar = VideoTypeRegistrar()
+        registrar.register(FlakyVideoType)
+        url = 'http://flaky.example.com/video'
+        self.assertEquals(registrar.video_type_class_for_url(url), None)
+        FlakyVideoType.site_available = True
+        self.assertEquals(registrar.video_type_class_for_url(url),
+                          FlakyVideoType)
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEquals(cache.get('a'), 1)
+        # b is the least recently used now
+        cache.set('c', 3)
+        self.assertEquals(cache.get('b'), None)
+        self.assertEquals(cache.get('a'), 1)
+        self.assertEquals(cache.get('c'), 3)
+        self.assertEquals(len(cache), 2)
+
 class BrightcoveVideoTypeTest(TestCase):
     def setUp(self):
         self.vt = BrightcoveVideoType
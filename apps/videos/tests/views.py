@@ -22,7 +22,7 @@ import json
 
 from BeautifulSoup import BeautifulSoup
 
-from babelsubs.storage import SubtitleSet, diff
+from babelsubs.storage import SubtitleSet
 from django.core import mail
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
@@ -32,6 +32,7 @@ from vidscraper.sites import blip
 
 from apps.auth.models import CustomUser as User
 from apps.subtitles import pipeline
+from apps.subtitles.diff import diff
 from apps.teams.models import Task
 from apps.teams.permissions_const import ROLE_ADMIN
 from apps.videos.share_utils import _make_email_url
@@ -0,0 +1,329 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""videos.timelines -- Materialized activity timelines.
+
+The ActionManager queries for activity feeds OR together conditions across
+several joins (team membership, team videos, followed videos), which MySQL
+can't answer with a single index.  Instead, we fan out Actions when they get
+created: each action gets a TimelineEntry for every timeline it belongs to:
+
+    - TEAM: actions for the team itself (members joining/leaving, ...)
+    - TEAM_VIDEOS: actions on the team's videos
+    - USER: actions done by the user
+    - VIDEO: actions on the video
+    - FOLLOWED_VIDEOS: actions on the videos a user follows
+
+Reading a feed is then a bounded index range scan per timeline, plus one bulk
+fetch of the Action rows.  Feeds are paginated with a cursor -- the id of the
+last action on the previous page -- instead of an offset.
+
+We also keep the timelines up to date when team videos get added, moved or
+removed and when users follow/unfollow videos.  The timelines for existing
+actions get built by a data migration, which runs the backfill_timelines
+command.
+"""
+
+from django.db import connection
+from django.db.models import Q
+
+from auth.models import CustomUser as User
+from utils.chunkediter import keyset_chunks
+from videos.models import Action, TimelineEntry
+
+PAGE_SIZE = 20
+# when a user starts following a video, add this many of its recent actions
+# to their timeline
+FOLLOW_BACKFILL = 50
+# max number of videos to fetch the recent actions for in one query
+FOLLOW_QUERY_BATCH = 100
+# number of actions to handle at once when a video changes teams
+SYNC_CHUNK_SIZE = 1000
+
+ACTION_RELATED = ('user', 'video', 'team', 'language', 'language__video',
+                  'new_language', 'new_language__video')
+
+FollowedVideo = User.videos.through
+
+class TimelinePage(list):
+    """List of actions for a page of a timeline.
+
+    next_cursor is the value to pass as before to get the next page, or None
+    if this is the last page.
+    """
+    def __init__(self, actions, next_cursor):
+        list.__init__(self, actions)
+        self.next_cursor = next_cursor
+
+def _team_video_map(video_ids):
+    from teams.models import TeamVideo
+    return dict(TeamVideo.objects.filter(video__in=video_ids)
+                .values_list('video_id', 'team_id'))
+
+def _followers_map(video_ids):
+    followers = {}
+    for user_id, video_id in (FollowedVideo.objects
+                              .filter(video__in=video_ids)
+                              .values_list('customuser_id', 'video_id')):
+        followers.setdefault(video_id, []).append(user_id)
+    return followers
+
+def _entry(timeline_type, owner_id, action):
+    return TimelineEntry(timeline_type=timeline_type, owner_id=owner_id,
+                         action_id=action.id, created=action.created,
+                         actor_id=action.user_id)
+
+def _insert(entries, skip_existing=False):
+    if skip_existing and entries:
+        action_ids = set(e.action_id for e in entries)
+        existing = set(TimelineEntry.objects
+                       .filter(action__in=action_ids)
+                       .values_list('timeline_type', 'owner_id', 'action'))
+        entries = [e for e in entries
+                   if (e.timeline_type, e.owner_id, e.action_id)
+                   not in existing]
+    if entries:
+        TimelineEntry.objects.bulk_create(entries)
+
+def add_actions(actions, skip_existing=False):
+    """Add actions to all of the timelines they belong to.
+
+    Set skip_existing if some of the actions may already be in their
+    timelines.
+    """
+    video_ids = set(a.video_id for a in actions if a.video_id)
+    if video_ids:
+        team_videos = _team_video_map(video_ids)
+        followers = _followers_map(video_ids)
+    else:
+        team_videos = followers = {}
+    entries = []
+    for action in actions:
+        if action.team_id:
+            entries.append(_entry(TimelineEntry.TEAM, action.team_id, action))
+        if action.user_id:
+            entries.append(_entry(TimelineEntry.USER, action.user_id, action))
+        if action.video_id:
+            entries.append(_entry(TimelineEntry.VIDEO, action.video_id,
+                                  action))
+            if action.video_id in team_videos:
+                entries.append(_entry(TimelineEntry.TEAM_VIDEOS,
+                                      team_videos[action.video_id], action))
+            for user_id in followers.get(action.video_id, []):
+                entries.append(_entry(TimelineEntry.FOLLOWED_VIDEOS, user_id,
+                                      action))
+    _insert(entries, skip_existing)
+
+def add_action(action):
+    add_actions([action])
+
+def sync_video_team(video_id, team_id):
+    """Update the TEAM_VIDEOS timelines after a video changes teams.
+
+    This removes the video's actions from the timeline of any other team and
+    adds them to the timeline for team_id.  Pass None for team_id if the video
+    was removed from its team.
+
+    Videos can have a lot of actions, so this gets run by the
+    sync_video_team_timeline task rather than during the request.
+    """
+    stale = TimelineEntry.objects.filter(
+        timeline_type=TimelineEntry.TEAM_VIDEOS, action__video=video_id)
+    if team_id is not None:
+        stale = stale.exclude(owner_id=team_id)
+    stale_ids = list(stale.values_list('id', flat=True))
+    if stale_ids:
+        TimelineEntry.objects.filter(id__in=stale_ids).delete()
+    if team_id is not None:
+        actions = Action.objects.filter(video=video_id).only(
+            'id', 'created', 'user')
+        for chunk in keyset_chunks(actions, SYNC_CHUNK_SIZE):
+            _insert([_entry(TimelineEntry.TEAM_VIDEOS, team_id, action)
+                     for action in chunk], skip_existing=True)
+
+def _recent_video_actions(video_ids, limit):
+    """Get the most recent actions for several videos.
+
+    Returns a dict mapping video ids to lists of actions.  Each video gets
+    its own LIMIT inside a UNION ALL, so a busy video can't use up the limit
+    for the others, and we still only make one query per FOLLOW_QUERY_BATCH
+    videos.
+    """
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(c) for c in ('id', 'created', 'user_id',
+                                        'video_id'))
+    def part_sql(i):
+        # wrap each part in a subquery, since the databases don't agree on
+        # whether ORDER BY/LIMIT are allowed in a UNION otherwise
+        return ('SELECT * FROM (SELECT %s FROM %s WHERE %s = %%s '
+                'ORDER BY %s DESC, %s DESC LIMIT %d) AS %s' % (
+                    columns, qn(Action._meta.db_table), qn('video_id'),
+                    qn('created'), qn('id'), limit, qn('recent%d' % i)))
+    video_ids = list(video_ids)
+    actions_by_video = {}
+    for start in xrange(0, len(video_ids), FOLLOW_QUERY_BATCH):
+        batch = video_ids[start:start+FOLLOW_QUERY_BATCH]
+        sql = ' UNION ALL '.join(part_sql(i) for i in xrange(len(batch)))
+        for action in Action.objects.raw(sql, batch):
+            actions_by_video.setdefault(action.video_id, []).append(action)
+    return actions_by_video
+
+def follow_videos(pairs):
+    """Add recent video actions to users' FOLLOWED_VIDEOS timelines.
+
+    pairs is an iterable of (user_id, video_id) tuples.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    video_ids = set(video_id for user_id, video_id in pairs)
+    actions_by_video = _recent_video_actions(video_ids, FOLLOW_BACKFILL)
+    _insert([_entry(TimelineEntry.FOLLOWED_VIDEOS, user_id, action)
+             for user_id, video_id in pairs
+             for action in actions_by_video.get(video_id, [])],
+            skip_existing=True)
+
+def unfollow_videos(pairs):
+    """Remove video actions from users' FOLLOWED_VIDEOS timelines.
+
+    pairs is an iterable of (user_id, video_id) tuples.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    user_ids = set(user_id for user_id, video_id in pairs)
+    video_ids = set(video_id for user_id, video_id in pairs)
+    entries = TimelineEntry.objects.filter(
+        timeline_type=TimelineEntry.FOLLOWED_VIDEOS, owner_id__in=user_ids,
+        action__video__in=video_ids).values_list('id', 'owner_id',
+                                                 'action__video')
+    entry_ids = [entry_id for (entry_id, user_id, video_id) in entries
+                 if (user_id, video_id) in pairs]
+    if entry_ids:
+        TimelineEntry.objects.filter(id__in=entry_ids).delete()
+
+def on_action_save(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        add_action(instance)
+
+def on_followed_videos_changed(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    """m2m_changed handler for CustomUser.videos.
+
+    This handles code that changes the relation directly.  The follower sync
+    code in auth.models writes to the through table and calls
+    follow_videos()/unfollow_videos() itself.
+    """
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            pairs = [(user_id, instance.pk) for user_id in pk_set]
+        else:
+            pairs = [(instance.pk, video_id) for video_id in pk_set]
+    elif action == 'pre_clear':
+        if reverse:
+            qs = FollowedVideo.objects.filter(video=instance)
+        else:
+            qs = FollowedVideo.objects.filter(customuser=instance)
+        pairs = qs.values_list('customuser_id', 'video_id')
+    else:
+        return
+    if action == 'post_add':
+        follow_videos(pairs)
+    else:
+        unfollow_videos(pairs)
+
+def _parse_cursor(before):
+    if before is None:
+        return None
+    try:
+        before = int(before)
+    except (TypeError, ValueError):
+        return None
+    try:
+        return Action.objects.filter(pk=before).values_list(
+            'created', 'id')[0]
+    except IndexError:
+        return None
+
+def _read(timelines, before=None, limit=PAGE_SIZE, exclude_actors=None):
+    """Read a page of actions from one or more timelines.
+
+    timelines is a list of (timeline_type, owner_ids) tuples.  We make one
+    bounded query for each of them and merge the results.
+    """
+    cursor = _parse_cursor(before)
+    rows = set()
+    for timeline_type, owner_ids in timelines:
+        if not owner_ids:
+            continue
+        qs = TimelineEntry.objects.filter(timeline_type=timeline_type,
+                                          owner_id__in=owner_ids)
+        if cursor is not None:
+            created, action_id = cursor
+            qs = qs.filter(Q(created__lt=created) |
+                           Q(created=created, action__lt=action_id))
+        if exclude_actors:
+            qs = qs.exclude(actor_id__in=exclude_actors)
+        # order by action__id rather than action, which would join the
+        # actions table to use its default ordering
+        rows.update(qs.order_by('-created', '-action__id')
+                    .values_list('created', 'action')[:limit+1])
+    rows = sorted(rows, reverse=True)
+    action_ids = [action_id for created, action_id in rows[:limit]]
+    if len(rows) > limit:
+        next_cursor = action_ids[-1]
+    else:
+        next_cursor = None
+    actions = Action.objects.select_related(*ACTION_RELATED).in_bulk(
+        action_ids)
+    return TimelinePage([actions[action_id] for action_id in action_ids
+                         if action_id in actions], next_cursor)
+
+def team_timeline(team, before=None, limit=PAGE_SIZE):
+    """Actions for a team and its videos (the team activity page)."""
+    return _read([
+        (TimelineEntry.TEAM, [team.id]),
+        (TimelineEntry.TEAM_VIDEOS, [team.id]),
+    ], before, limit)
+
+def user_timeline(user, before=None, limit=PAGE_SIZE):
+    """Actions done by a user, or for the teams they belong to."""
+    team_ids = list(user.teams.values_list('id', flat=True))
+    return _read([
+        (TimelineEntry.USER, [user.id]),
+        (TimelineEntry.TEAM, team_ids),
+    ], before, limit)
+
+def user_team_activity(user, before=None, limit=PAGE_SIZE):
+    """Actions for a user's teams, done by other users."""
+    team_ids = list(user.teams.values_list('id', flat=True))
+    return _read([(TimelineEntry.TEAM, team_ids)], before, limit,
+                 exclude_actors=[user.id])
+
+def user_video_activity(user, before=None, limit=PAGE_SIZE,
+                        exclude_anonymous=False):
+    """Actions for videos a user follows, done by other users."""
+    exclude_actors = [user.id]
+    if exclude_anonymous:
+        exclude_actors.append(User.get_anonymous().id)
+    return _read([(TimelineEntry.FOLLOWED_VIDEOS, [user.id])], before, limit,
+                 exclude_actors=exclude_actors)
+
+def video_timeline(video, before=None, limit=PAGE_SIZE):
+    """Actions for a video."""
+    return _read([(TimelineEntry.VIDEO, [video.id])], before, limit)
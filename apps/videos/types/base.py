@@ -16,13 +16,23 @@
 # along with this program.  If not, see 
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+import threading
+from collections import OrderedDict
 from urlparse import urlparse
+
 from django.core.exceptions import ValidationError
 
+# number of URLs that VideoTypeRegistrar remembers the video type for
+URL_CACHE_SIZE = 1000
+
 class VideoType(object):
 
     abbreviation = None
     name = None    
+    # Hostnames that matches_video_url() can match, subdomains included.
+    # VideoTypeRegistrar only checks the type for URLs on these hosts.  Leave
+    # it empty if the type can match URLs on any host.
+    url_hosts = ()
 
     CAN_IMPORT_SUBTITLES = False
 
@@ -62,7 +72,54 @@ class VideoType(object):
         parsed_url = urlparse(url.strip())
         return '%s://%s%s' % (parsed_url.scheme or 'http', parsed_url.netloc, parsed_url.path)    
     
+class LRUCache(object):
+    """Thread-safe dict-like cache that holds up to size items.
+
+    When it's full, the least recently used item gets dropped.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+            # re-insert it to mark it as the most recently used
+            self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            if len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+_missing = object()
+
 class VideoTypeRegistrar(dict):
+    """Registry of video types.
+
+    To find the type for a URL, we check the types in the order they were
+    registered and use the first one that matches.  Most types only match
+    URLs for a couple of sites (see VideoType.url_hosts), so we index them by
+    hostname and only check the types for the URL's host plus the generic
+    ones that can match any host (HTML5, FLV, ...).  The matched type is
+    cached per URL.  We don't cache URLs that didn't match anything, since
+    some types (like Dailymotion) ask the video site and a network error
+    makes them fail to match.
+    """
     
     domains = []
     
@@ -70,6 +127,8 @@ class VideoTypeRegistrar(dict):
         super(VideoTypeRegistrar, self).__init__(*args, **kwargs)
         self.choices = []
         self.type_list = []
+        self.host_index = {}
+        self.url_cache = LRUCache(URL_CACHE_SIZE)
         
     def register(self, video_type):
         self[video_type.abbreviation] = video_type
@@ -77,11 +136,57 @@ class VideoTypeRegistrar(dict):
         self.choices.append((video_type.abbreviation, video_type.name))
         domain = getattr(video_type, 'site', None)
         domain and self.domains.append(domain)
+        for host in video_type.url_hosts:
+            self.host_index.setdefault(host.lower(), set()).add(video_type)
+        self.url_cache.clear()
         
     def video_type_for_url(self, url):
-        for video_type in self.type_list:
+        video_type = self.video_type_class_for_url(url)
+        if video_type is not None:
+            return video_type(url)
+
+    def video_type_class_for_url(self, url):
+        """Find the VideoType subclass that matches a URL.
+
+        Returns None if no type matches.  Unlike video_type_for_url(), this
+        doesn't create a VideoType object, which usually means fetching
+        data from the video site.
+        """
+        video_type = self.url_cache.get(url, _missing)
+        if video_type is _missing:
+            video_type = self._match(url, self.candidate_types(url))
+            if video_type is not None:
+                self.url_cache.set(url, video_type)
+        return video_type
+
+    def video_type_class_for_url_linear(self, url):
+        """Find the VideoType subclass for a URL by checking every type.
+
+        This is the slow path that video_type_class_for_url() optimizes.
+        """
+        return self._match(url, self.type_list)
+
+    def candidate_types(self, url):
+        """Get the types that could match a URL, in registration order."""
+        try:
+            hostname = urlparse(url.strip()).hostname
+        except ValueError:
+            hostname = None
+        if not hostname:
+            # some types match URLs without a scheme, check them all
+            return self.type_list
+        site_types = set()
+        parts = hostname.split('.')
+        for i in xrange(len(parts)):
+            site_types.update(self.host_index.get('.'.join(parts[i:]), ()))
+        return [video_type for video_type in self.type_list
+                if not video_type.url_hosts or video_type in site_types]
+
+    def _match(self, url, video_types):
+        for video_type in video_types:
             if video_type.matches_video_url(url):
-                return video_type(url)
+                return video_type
+        return None
             
 class VideoTypeError(Exception):
     pass
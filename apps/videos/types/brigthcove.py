@@ -40,6 +40,7 @@ class BrightcoveVideoType(VideoType):
     abbreviation = 'C'
     name = 'Brightcove'   
     site = 'brightcove.com'
+    url_hosts = ('brightcove.com', 'bcove.me')
     js_url = "http://admin.brightcove.com/js/BrightcoveExperiences_all.js"
     
     def __init__(self, url):
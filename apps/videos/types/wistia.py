@@ -30,6 +30,9 @@ class WistiaVideoType(VideoType):
     abbreviation = 'W'
     name = 'Wistia.com'   
     site = 'wistia.com'
+    # WISTIA_REGEX matches wistia URLs that are embedded in URLs for other
+    # hosts, so we can't limit it to the wistia hostnames.
+    url_hosts = ()
     linkurl = None
 
     requires_url_exists = True
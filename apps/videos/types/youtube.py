@@ -328,6 +328,7 @@ class YoutubeVideoType(VideoType):
     ]]
 
     HOSTNAMES = ( "youtube.com", "youtu.be", "www.youtube.com",)
+    url_hosts = HOSTNAMES
 
     abbreviation = 'Y'
     name = 'Youtube'
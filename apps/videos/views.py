@@ -22,7 +22,6 @@ import urllib, urllib2
 from collections import namedtuple
 
 import simplejson as json
-from babelsubs.storage import diff as diff_subs
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
@@ -53,6 +52,7 @@ from widget import rpc as widget_rpc
 from apps.auth.models import CustomUser as User
 from apps.statistic.models import EmailShareStatistic
 from apps.subtitles import models as sub_models
+from apps.subtitles.diff import diff as diff_subs
 from apps.subtitles.forms import SubtitlesUploadForm
 from apps.subtitles.pipeline import rollback_to
 from apps.teams.models import Task
@@ -972,7 +972,7 @@ def video_debug(request, video_id):
         "get_video_languages": cache.get(vc._video_languages_key(vid)),
 
         "get_video_languages_verbose": cache.get(vc._video_languages_verbose_key(vid)),
-        "writelocked_langs": cache.get(vc._video_writelocked_langs_key(vid)),
+        "writelocked_langs": vc.writelocked_langs(vid),
     }
 
     tasks = Task.objects.filter(team_video=video)
@@ -51,9 +51,11 @@ from widget.models import SubtitlingSession
 from libs.bulkops import insert_many
 
 from functools import partial
+from apps.subtitles import cache as sub_cache
 from apps.subtitles import pipeline
-from apps.subtitles.models import ORIGIN_LEGACY_EDITOR
-from babelsubs.storage import SubtitleSet, diff
+from apps.subtitles.diff import diff
+from apps.subtitles.models import ORIGIN_LEGACY_EDITOR, SubtitleLanguageLock
+from babelsubs.storage import SubtitleSet
 
 
 yt_logger = logging.getLogger("youtube-ei-error")
@@ -254,15 +256,12 @@ class Rpc(BaseRpc):
         my_languages.extend([l[:l.find('-')] for l in my_languages if l.find('-') > -1])
         video = models.Video.objects.get(video_id=video_id)
         team_video = video.get_team_video()
-        languages = (new_models.SubtitleLanguage.objects.having_public_versions()
-                                                        .filter(video=video))
-        video_languages = [language_summary(l, team_video, request.user) for l
-                           in languages]
+        video_languages = language_summaries(video, team_video, request.user)
 
         original_language = video.primary_audio_language_code
 
-        tv = video.get_team_video()
-        writable_langs = list(tv.team.get_writable_langs()) if tv else []
+        writable_langs = (list(team_video.team.get_writable_langs())
+                          if team_video else [])
 
         blocked_langs = self._get_blocked_languages(team_video, request.user)
 
@@ -385,8 +384,9 @@ class Rpc(BaseRpc):
             return locked
 
         # just lock the video *after* we verify if team moderation happened
-        language.writelock(request.user, request.browser_id)
-        language.save()
+        if not language.try_writelock(request.user, request.browser_id):
+            return { "can_edit": False,
+                     "locked_by": unicode(language.writelock_owner) }
 
         # Create the subtitling session and subtitle version for these edits.
 
@@ -444,9 +444,6 @@ class Rpc(BaseRpc):
         if original_language_code:
             self._save_original_language(video_id, original_language_code)
 
-        # Writelock this language for this video before we successfully return.
-        video_cache.writelock_add_lang(video_id, language.language_code)
-
         return return_dict
 
 
@@ -463,10 +460,8 @@ class Rpc(BaseRpc):
         if error:
             return {'response': 'cannot_resume'}
 
-        if language.can_writelock(request.browser_id) and \
-                session.parent_version == language.version():
-
-            language.writelock(request.user, request.browser_id)
+        if session.parent_version == language.version() and \
+                language.try_writelock(request.user, request.browser_id):
 
             version_for_subs, version_number = self._get_version_to_edit(language, session)
 
@@ -497,21 +492,15 @@ class Rpc(BaseRpc):
 
     # Locking
     def release_lock(self, request, session_pk):
-        language = SubtitlingSession.objects.get(pk=session_pk).language
-        if language.can_writelock(request.browser_id):
-            language.release_writelock()
-            language.save()
-            video_cache.writelocked_langs_clear(language.video.video_id)
+        language_id = SubtitlingSession.objects.get(pk=session_pk).language_id
+        SubtitleLanguageLock.objects.release(language_id, request.browser_id)
         return { "response": "ok" }
 
     def regain_lock(self, request, session_pk):
         language = SubtitlingSession.objects.get(pk=session_pk).language
-        if not language.can_writelock(request.browser_id):
+        if not language.try_writelock(request.user, request.browser_id):
             return { 'response': 'unlockable' }
         else:
-            language.writelock(request.user, request.browser_id)
-            video_cache.writelock_add_lang(
-                language.video.video_id, language.language_code)
             return { 'response': 'ok' }
 
     # Permissions
@@ -1229,46 +1218,99 @@ class Rpc(BaseRpc):
 def language_summary(language, team_video=-1, user=None):
     """Return a dictionary of info about the given SubtitleLanguage.
 
-    The team video can be given to avoid an extra database lookup.
+    The team video can be given to avoid an extra database lookup.  If you
+    need summaries for several languages, use language_summaries().
 
     """
-    if team_video == -1:
-        team_video = language.video.get_team_video()
+    return language_summaries(language.video, team_video, user,
+                              [language])[0]
 
-    translation_source = language.get_translation_source_language()
-    is_translation = bool(translation_source)
-    summary = {
-        'pk': language.pk,
-        'language': language.language_code,
-        'dependent': is_translation,
-        'subtitle_count': language.get_subtitle_count(),
-        'in_progress': language.is_writelocked,
-        'disabled_from': False }
+def _incomplete_tasks_by_language(team_video):
+    tasks = {}
+    for task in (team_video.task_set.incomplete()
+                 .select_related('assignee')):
+        tasks.setdefault(task.language, task)
+    return tasks
 
-    if team_video:
-        tasks = team_video.task_set.incomplete().filter(language=language.language_code)
-        if tasks:
-            task = tasks[0]
-            summary['disabled_to'] = user and user != task.assignee
+def _complete_and_synced(languages):
+    """Calculate is_complete_and_synced() for several languages.
+
+    This uses the cached sync flags, so we only need to parse the subtitles
+    for languages that aren't in the cache.
+    """
+    candidates = [l for l in languages
+                  if l.subtitles_complete and l.get_tip() is not None]
+    synced = sub_cache.get_is_synced_many(candidates, False)
+    for language in candidates:
+        if language.id not in synced:
+            synced[language.id] = language.get_tip().is_synced()
+            sub_cache.set_is_synced(language, False, synced[language.id])
+    return synced
 
-    latest_version = language.get_tip()
+def language_summaries(video, team_video=-1, user=None, languages=None):
+    """Return a list of dictionaries of info about a video's languages.
 
-    if latest_version and language.is_complete_and_synced() and 'disabled_to' not in summary:
-        # Languages with existing subtitles cannot be selected as a "to"
-        # language in the "add new translation" dialog.  If you want to work on
-        # that language, select it and hit "Improve these Subtitles" instead.
-        summary['disabled_to'] = True
-    elif not latest_version or not latest_version.has_subtitles:
-        # Languages with *no* existing subtitles cannot be selected as a "from"
-        # language in the "add new translation" dialog.  There's nothing to work
-        # from!
-        summary['disabled_from'] = True
+    By default we summarize the languages with public versions.  Pass a list
+    or queryset of the video's languages as languages to use them instead.
 
+    The tips, translation sources, tasks and locks for all the languages get
+    loaded together, so this uses the same number of queries no matter how
+    many languages there are.
 
-    if is_translation:
-        summary['standard_pk'] = translation_source.pk
-        summary['translated_from'] = translation_source.language_code
-    summary['is_complete'] = language.subtitles_complete
-    summary['is_public'] = True if language.get_public_tip() else False
+    """
+    if team_video == -1:
+        team_video = video.get_team_video()
+    if languages is None:
+        languages = (new_models.SubtitleLanguage.objects
+                     .having_public_versions().filter(video=video))
+    languages = list(languages)
+    for language in languages:
+        language.video = video
+    new_models.join_tips(languages, public_tips=True, private_tips=True)
+    sources = new_models.SubtitleLanguage.objects.translation_sources(
+        languages)
+    locks = SubtitleLanguageLock.objects.for_video(video.id)
+    if team_video:
+        tasks = _incomplete_tasks_by_language(team_video)
+    else:
+        tasks = {}
+    complete_and_synced = _complete_and_synced(languages)
+
+    summaries = []
+    for language in languages:
+        latest_version = language.get_tip()
+        translation_source = sources.get(language.id)
+        summary = {
+            'pk': language.pk,
+            'language': language.language_code,
+            'dependent': translation_source is not None,
+            'subtitle_count': (latest_version.subtitle_count
+                               if latest_version else 0),
+            'in_progress': language.id in locks,
+            'disabled_from': False }
+
+        task = tasks.get(language.language_code)
+        if task is not None:
+            summary['disabled_to'] = user and user != task.assignee
 
-    return summary
+        if (latest_version and complete_and_synced.get(language.id) and
+            'disabled_to' not in summary):
+            # Languages with existing subtitles cannot be selected as a "to"
+            # language in the "add new translation" dialog.  If you want to
+            # work on that language, select it and hit "Improve these
+            # Subtitles" instead.
+            summary['disabled_to'] = True
+        elif not latest_version or not latest_version.has_subtitles:
+            # Languages with *no* existing subtitles cannot be selected as a
+            # "from" language in the "add new translation" dialog.  There's
+            # nothing to work from!
+            summary['disabled_from'] = True
+
+        if translation_source is not None:
+            summary['standard_pk'] = translation_source[0]
+            summary['translated_from'] = translation_source[1]
+        summary['is_complete'] = language.subtitles_complete
+        summary['is_public'] = language.get_public_tip() is not None
+        summaries.append(summary)
+
+    return summaries
@@ -25,6 +25,7 @@ Replace these with more appropriate tests for your application.
 """
 
 import json
+import mock
 
 from django.test import TestCase
 from babelsubs.storage import SubtitleSet
@@ -33,15 +34,17 @@ from auth.models import CustomUser
 from videos.models import Video, Action, SubtitleLanguage
 from videos import models
 from subtitles import models as sub_models
+from apps.subtitles import pipeline
 from apps.subtitles.pipeline import rollback_to
 from widget.models import SubtitlingSession
-from widget.rpc import Rpc
+from teams.models import Task
+from widget.rpc import Rpc, language_summaries
 from widget.null_rpc import NullRpc
 from django.core.urlresolvers import reverse
 from widget import video_cache
 from datetime import datetime, timedelta
 from django.conf import settings
-from utils import test_utils, test_factories
+from utils import instrumentation, test_utils, test_factories
 
 VIDEO_URL = 'http://videos.mozilla.org/firefox/3.5/switch/switch.ogv'
 
@@ -116,6 +119,28 @@ class TestRpcView(TestCase):
         response = self.client.post(url, data=data)
         self.assertEqual(response.status_code, 200)
 
+    def test_log_call(self):
+        from uslogging.models import WidgetDialogCall
+        from uslogging.writers import WidgetDialogCallWriter
+        from widget import views
+        writer = WidgetDialogCallWriter('test', flush_interval=3600,
+                                        synchronous=False)
+        call_time = datetime(2013, 1, 1)
+        with mock.patch.object(views, 'widget_dialog_call_writer', writer):
+            with mock.patch.object(views, 'datetime') as mock_datetime:
+                mock_datetime.now.return_value = call_time
+                views._log_call('browser-id', 'save_subtitles', {'a': 1})
+                views._log_call('browser-id', 'show_widget', {'a': 1})
+            # the call should be buffered, not saved inside the request
+            self.assertEqual(WidgetDialogCall.objects.count(), 0)
+            writer.flush()
+        calls = list(WidgetDialogCall.objects.all())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0].method, 'save_subtitles')
+        self.assertEqual(calls[0].request_args, {'a': 1})
+        # the date is when the call happened, not when we flushed the buffer
+        self.assertEqual(calls[0].date_saved, call_time)
+
 
 class TestRpc(TestCase):
     fixtures = ['test_widget.json', 'test.json']
@@ -1174,3 +1199,122 @@ class TestLineageOnRPC(TestCase):
         self.assertIn('en', de_v2.lineage)
         self.assertEquals(de_v2.lineage['en'], 3)
         self.assertEqual(en, de.get_translation_source_language())
+
+class TestLanguageSummaries(TestCase):
+    def setUp(self):
+        self.user = test_factories.create_user()
+        self.other_user = test_factories.create_user()
+        self.team_video = test_factories.create_team_video()
+        self.video = self.team_video.video
+        self.en = pipeline.add_subtitles(self.video, 'en',
+                                         create_subtitle_set(3),
+                                         complete=True)
+
+    def add_translations(self, language_codes):
+        for language_code in language_codes:
+            pipeline.add_subtitles(self.video, language_code,
+                                   create_subtitle_set(2), parents=[self.en])
+            Task(team=self.team_video.team, team_video=self.team_video,
+                 language=language_code, assignee=self.other_user,
+                 type=Task.TYPE_IDS['Review']).save()
+
+    def summaries(self):
+        video = Video.objects.get(pk=self.video.pk)
+        return dict((s['language'], s) for s in
+                    language_summaries(video, self.team_video, self.user))
+
+    def test_summaries(self):
+        self.add_translations(['fr', 'de'])
+        sub_models.SubtitleLanguage.objects.get(
+            video=self.video, language_code='de').try_writelock(self.user,
+                                                                'key')
+        summaries = self.summaries()
+        self.assertEquals(sorted(summaries.keys()), ['de', 'en', 'fr'])
+        en = summaries['en']
+        self.assertEquals(en['pk'], self.en.subtitle_language_id)
+        self.assertEquals(en['subtitle_count'], 4)
+        self.assertFalse(en['dependent'])
+        self.assertTrue(en['is_complete'])
+        self.assertTrue(en['is_public'])
+        # complete and synced, so it can't be translated into
+        self.assertTrue(en['disabled_to'])
+        self.assertFalse(en['in_progress'])
+        fr = summaries['fr']
+        self.assertTrue(fr['dependent'])
+        self.assertEquals(fr['translated_from'], 'en')
+        self.assertEquals(fr['standard_pk'], self.en.subtitle_language_id)
+        self.assertEquals(fr['subtitle_count'], 3)
+        # assigned to a different user
+        self.assertTrue(fr['disabled_to'])
+        self.assertTrue(summaries['de']['in_progress'])
+
+    def old_language_summary(self, language):
+        """Summarize a language one query at a time.
+
+        This is how language_summary() used to work before it used
+        language_summaries(), so we can check the batched version against it.
+        """
+        translation_source = language.get_translation_source_language()
+        summary = {
+            'pk': language.pk,
+            'language': language.language_code,
+            'dependent': bool(translation_source),
+            'subtitle_count': language.get_subtitle_count(),
+            'in_progress': language.is_writelocked,
+            'disabled_from': False }
+        tasks = self.team_video.task_set.incomplete().filter(
+            language=language.language_code)
+        if tasks:
+            summary['disabled_to'] = self.user and self.user != tasks[0].assignee
+        latest_version = language.get_tip()
+        if (latest_version and language.is_complete_and_synced() and
+            'disabled_to' not in summary):
+            summary['disabled_to'] = True
+        elif not latest_version or not latest_version.has_subtitles:
+            summary['disabled_from'] = True
+        if translation_source:
+            summary['standard_pk'] = translation_source.pk
+            summary['translated_from'] = translation_source.language_code
+        summary['is_complete'] = language.subtitles_complete
+        summary['is_public'] = bool(language.get_public_tip())
+        return summary
+
+    def test_matches_old_language_summary(self):
+        self.add_translations(['fr', 'de'])
+        # a language with a task assigned to our user
+        pipeline.add_subtitles(self.video, 'es', create_subtitle_set(2),
+                               parents=[self.en])
+        Task(team=self.team_video.team, team_video=self.team_video,
+             language='es', assignee=self.user,
+             type=Task.TYPE_IDS['Translate']).save()
+        # a complete language that isn't a translation
+        pipeline.add_subtitles(self.video, 'pt', create_subtitle_set(1),
+                               complete=True)
+        # an incomplete language without any subtitles
+        pipeline.add_subtitles(self.video, 'it', SubtitleSet('it'))
+        sub_models.SubtitleLanguage.objects.get(
+            video=self.video, language_code='de').try_writelock(self.user,
+                                                                'key')
+        summaries = self.summaries()
+        languages = sub_models.SubtitleLanguage.objects.filter(
+            video=self.video)
+        self.assertEquals(sorted(summaries.keys()),
+                          sorted(l.language_code for l in languages))
+        for language in languages:
+            self.assertEquals(summaries[language.language_code],
+                              self.old_language_summary(language))
+
+    def test_query_count(self):
+        self.add_translations(['fr'])
+        video = Video.objects.get(pk=self.video.pk)
+        self.summaries() # fill the sync cache
+        instrumentation.start('test')
+        language_summaries(video, self.team_video, self.user)
+        query_count = instrumentation.finish().queries
+
+        self.add_translations(['de', 'es', 'it', 'pt', 'ja', 'ru', 'pl',
+                               'sv', 'tr', 'zh-cn'])
+        video = Video.objects.get(pk=self.video.pk)
+        self.summaries()
+        with self.assertNumQueries(query_count):
+            language_summaries(video, self.team_video, self.user)
@@ -15,7 +15,6 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
-import datetime
 
 from django.conf import settings
 from django.core.cache import cache
@@ -145,9 +144,6 @@ def _video_languages_verbose_key(video_id):
 def _video_completed_languages(video_id):
     return "video_completed_verbose_{0}".format(video_id)
 
-def _video_writelocked_langs_key(video_id):
-    return "writelocked_langs_{0}".format(video_id)
-
 def _subtitle_language_pk_key(video_id, language_code):
     return "sl_pk_{0}{1}".format(video_id, language_code)
 
@@ -221,7 +217,7 @@ def get_subtitles_dict(video_id, language_pk, version_number,
     return cached_value
 
 def get_video_languages(video_id):
-    from apps.widget.rpc import language_summary
+    from apps.widget.rpc import language_summaries
 
     cache_key = _video_languages_key(video_id)
     value = cache.get(cache_key)
@@ -236,7 +232,7 @@ def get_video_languages(video_id):
         if team_video:
             languages = languages.filter(language_code__in=team_video.team.get_readable_langs())
 
-        value = [language_summary(l) for l in languages]
+        value = language_summaries(video, team_video, languages=languages)
         cache.set(cache_key, value, TIMEOUT)
 
     return value
@@ -346,38 +342,11 @@ def get_visibility_policies(video_id):
     return value
 
 # Writelocking
-def _writelocked_store_langs(video_id, langs):
-    cache_key = _video_writelocked_langs_key(video_id)
-    cache.set(cache_key, langs, 5 * 60)
-    return langs
-
 def writelocked_langs(video_id):
-    from videos.models import WRITELOCK_EXPIRATION, Video
-    cache_key = _video_writelocked_langs_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        treshold = datetime.datetime.now() - datetime.timedelta(seconds=WRITELOCK_EXPIRATION)
-        video = Video.objects.get(video_id=video_id)
-        langs = list(video.subtitlelanguage_set.filter(writelock_time__gte=treshold))
-        value = _writelocked_store_langs(video_id, [x.language for x in langs])
+    """Get the codes of the writelocked languages for a video.
 
-    return value
-
-def writelock_add_lang(video_id, language_code):
-    writelocked_langs_clear(video_id)
-    langs = writelocked_langs(video_id)
-
-    if not language_code in langs:
-        langs.append(language_code)
-        _writelocked_store_langs(video_id, langs)
-
-def writelock_remove_lang(video_id, language_code):
-    langs = writelocked_langs(video_id)
-    if language_code in langs:
-        langs.remove(language_code)
-        _writelocked_store_langs(video_id, langs)
-
-def writelocked_langs_clear(video_id):
-    cache_key = _video_writelocked_langs_key(video_id)
-    cache.delete(cache_key)
+    The locks are stored in SubtitleLanguageLock, which can answer this with
+    1 query, so we don't cache them.
+    """
+    from subtitles.models import SubtitleLanguageLock
+    return SubtitleLanguageLock.objects.locked_language_codes(video_id)
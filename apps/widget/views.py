@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
+from datetime import datetime
 import re
 import time
 import traceback
@@ -43,6 +44,7 @@ from auth.models import CustomUser
 from teams.models import Task
 from teams.permissions import get_member
 from uslogging.models import WidgetDialogCall
+from uslogging.writers import widget_dialog_call_writer
 from utils import DEFAULT_PROTOCOL
 from utils.metrics import Meter
 from videos import models
@@ -439,8 +441,10 @@ def jsonp(request, method_name, null=False):
 def _log_call(browser_id, method_name, request_args):
     if method_name in ['start_editing', 'fork', 'set_title',
                        'save_subtitles', 'finished_subtitles']:
-        call = WidgetDialogCall(
+        # The calls get saved in the background so that the editor doesn't
+        # have to wait for an extra INSERT.
+        widget_dialog_call_writer.add(WidgetDialogCall(
+            date_saved=datetime.now(),
             browser_id=browser_id,
             method=method_name,
-            request_args=request_args)
-        call.save()
+            request_args=request_args))
@@ -82,6 +82,7 @@ NOSE_ARGS = ['--logging-filter=test_steps, -remote_connection, '
             ]
 
 CELERY_ALWAYS_EAGER = True
+BUFFERED_WRITER_SYNCHRONOUS = True
 import logging
 logging.getLogger('pysolr').setLevel(logging.ERROR)
 
@@ -39,6 +39,7 @@ DEFAULT_PROTOCOL = 'http'
 TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
 NOSE_PLUGINS = ['utils.test_utils.UnisubsTestPlugin']
 CELERY_ALWAYS_EAGER = True
+BUFFERED_WRITER_SYNCHRONOUS = True
 
 STATIC_URL_BASE = STATIC_URL = "/site_media/"
 MEDIA_URL = "/user-data/"
@@ -9,18 +9,22 @@ IMPORTERS = (
     vimeo,
     )
 
-def bulk_import(feed_url, parsed_feed=None):
+def bulk_import(feed_url, parsed_feed=None, start_page=0, max_pages=None):
     """
     Takes a URL for a feed, and returns a feedparser instance with the entries
     filled in with all of the videos from that feed.  It'll take care of paging
     through videos from services like blip.tv and Vimeo or services which
     support OpenSearch (like YouTube).
+
+    Pages get fetched concurrently.  To import a big feed in chunks, pass
+    max_pages, then call bulk_import() again with start_page set to the
+    next_page attribute of the result until it's None.
     """
     if parsed_feed is None:
         parsed_feed = feedparser.parse(feed_url)
     for importer in IMPORTERS:
         if importer.video_count(parsed_feed) is not None:
-            return importer.bulk_import(parsed_feed)
+            return importer.bulk_import(parsed_feed, start_page, max_pages)
 
     # if we can't figure out how to bulk import the feed, just return the items
     # in the feed
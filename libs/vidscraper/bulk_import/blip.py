@@ -1,8 +1,6 @@
 import urllib2
 import re
 
-import feedparser
-
 from vidscraper.bulk_import import util
 
 VIDEO_COUNT_RE = re.compile('totalPages: (\d+)')
@@ -30,17 +28,22 @@ def video_count(parsed_feed):
     return count
 
 
-def bulk_import(parsed_feed):
+def bulk_import(parsed_feed, start_page=0, max_pages=None):
     base_url = parsed_feed.feed.summary_detail.base
-    feeds = []
-    while len(parsed_feed.entries):
-        feeds.append(parsed_feed)
-        parsed_feed = feedparser.parse(
-            '%s?page=%i' % (base_url,
-                            len(feeds) + 1))
+    # the count is 12 * the number of pages.  It's approximate, so keep
+    # going after the last page until we get an empty one.
+    page_count = video_count(parsed_feed) // 12
+
+    def page_url(page):
+        return '%s?page=%i' % (base_url, page + 1)
+
+    feed = util.import_pages(parsed_feed, page_url, page_count,
+                             util.parse_entries, start_page, max_pages,
+                             open_ended=True,
+                             known_pages={0: parsed_feed.entries})
 
     # clear the count cache
     if parsed_feed.feed.link in _cached_video_count:
         del _cached_video_count[parsed_feed.feed.link]
 
-    return util.join_feeds(feeds)
+    return feed
@@ -23,18 +23,20 @@ def video_count(parsed_feed):
         return None # not a valid OpenSearch feed
     return int(_opensearch_get(parsed_feed, 'totalresults'))
 
-def bulk_import(parsed_feed):
+def bulk_import(parsed_feed, start_page=0, max_pages=None):
     startindex = int(_opensearch_get(parsed_feed, 'startindex'))
     itemsperpage = int(_opensearch_get(parsed_feed, 'itemsperpage'))
     totalresults = int(_opensearch_get(parsed_feed, 'totalresults'))
-    feeds = []
-    for i in range(startindex, max(totalresults, itemsperpage),
-                   itemsperpage):
+    page_starts = range(startindex, max(totalresults, itemsperpage),
+                        itemsperpage)
+
+    def page_url(page):
         if '?' in parsed_feed.href:
-            postfix = '&start-index=%i' % (i,)
+            postfix = '&start-index=%i' % (page_starts[page],)
         else:
-            postfix = '?start-index=%i' % (i,)
-        feeds.append(feedparser.parse(parsed_feed.href + postfix))
+            postfix = '?start-index=%i' % (page_starts[page],)
+        return parsed_feed.href + postfix
 
-    return util.join_feeds(feeds)
+    return util.import_pages(parsed_feed, page_url, len(page_starts),
+                             util.parse_entries, start_page, max_pages)
 
@@ -1,10 +1,137 @@
+from multiprocessing.pool import ThreadPool
+
+import feedparser
+
+# maximum number of pages to fetch at the same time
+MAX_WORKERS = 4
+
+
+def _entry_key(entry):
+    return entry.get('id') or entry.get('link')
+
+def merge_entries(pages):
+    """
+    Takes an iterable of lists of entries and returns a single list with the
+    entries in order.  Entries that show up more than once (feeds can shift
+    while we're paging through them) are only included the first time.
+    """
+    seen = set()
+    entries = []
+    for page in pages:
+        for entry in page:
+            key = _entry_key(entry)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            entries.append(entry)
+    return entries
+
 def join_feeds(feeds):
     """
     Takes an interable of feedparser instances, and returns a single feedparser
     intance with the entries from each combined into one.
     """
-    entries = []
-    [entries.extend(feed.entries) for feed in feeds]
+    feeds = list(feeds)
     feed = feeds[0]
-    feed.entries = entries
+    feed.entries = merge_entries(f.entries for f in feeds)
+    return feed
+
+def parse_entries(url):
+    """
+    Fetch function for import_pages() that parses a page with feedparser.
+    """
+    parsed = feedparser.parse(url)
+    if parsed.get('status', 200) >= 400:
+        raise IOError('error fetching %s: HTTP %s' % (url, parsed.status))
+    return parsed.entries
+
+def _fetch_page(args):
+    fetch, url = args
+    try:
+        return fetch(url), None
+    except Exception, e:
+        return None, e
+
+def fetch_pages(urls, fetch, workers=MAX_WORKERS):
+    """
+    Calls fetch(url) for each URL, with up to workers calls running at the
+    same time.  Returns a list of (result, exception) tuples in the same order
+    as urls.  exception is None unless fetch raised one.
+    """
+    urls = list(urls)
+    workers = min(workers, len(urls))
+    if workers <= 1:
+        return [_fetch_page((fetch, url)) for url in urls]
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(_fetch_page, [(fetch, url) for url in urls],
+                        chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def import_pages(parsed_feed, page_url, page_count, fetch, start_page=0,
+                 max_pages=None, open_ended=False, known_pages=None,
+                 workers=MAX_WORKERS):
+    """
+    Fetch the pages of a feed and return a copy of parsed_feed with all of
+    their entries.
+
+    page_url(i) returns the URL for page i (counting from 0) and fetch(url)
+    returns the list of entries on a page.  An empty list (or None) means
+    that we're past the end of the feed.
+
+    The first page_count pages get fetched concurrently.  If open_ended is
+    True, the page count is just an estimate and we keep fetching pages one
+    at a time until we get an empty one.  known_pages is a dict mapping page
+    numbers to entries we already have.
+
+    start_page and max_pages can be used to import a feed in chunks.  The
+    returned feed has a next_page attribute with the page to start from to
+    continue the import, or None if we got all the pages.  If fetching a page
+    fails, we stop there and next_page points to it.
+    """
+    if known_pages is None:
+        known_pages = {}
+    if max_pages is None:
+        end = page_count
+    else:
+        end = min(page_count, start_page + max_pages)
+
+    to_fetch = [i for i in range(start_page, end) if i not in known_pages]
+    results = dict((i, (entries, None))
+                   for i, entries in known_pages.items())
+    for i, result in zip(to_fetch, fetch_pages(
+            [page_url(i) for i in to_fetch], fetch, workers)):
+        results[i] = result
+
+    pages = []
+    next_page = start_page
+    finished = False
+    while True:
+        if max_pages is not None and next_page >= start_page + max_pages:
+            break
+        if next_page in results:
+            result = results[next_page]
+        elif next_page >= page_count and open_ended:
+            result = _fetch_page((fetch, page_url(next_page)))
+        else:
+            finished = True
+            break
+        entries, error = result
+        if error is not None:
+            break
+        if not entries:
+            finished = True
+            break
+        pages.append(entries)
+        next_page += 1
+
+    feed = feedparser.FeedParserDict(parsed_feed.copy())
+    feed.entries = merge_entries(pages)
+    if finished:
+        feed.next_page = None
+    else:
+        feed.next_page = next_page
     return feed
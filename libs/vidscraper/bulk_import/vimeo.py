@@ -5,20 +5,22 @@ import re
 import feedparser
 import simplejson
 
+from vidscraper.bulk_import import util
 from vidscraper.util import open_url_while_lying_about_agent
 
 USERNAME_RE = re.compile(r'http://(www\.)?vimeo\.com/'
                          r'(?P<name>((channels|groups)/)?\w+)'
                          r'(/(?P<type>(videos|likes)))?')
 
+API_URL = 'http://vimeo.com/api/v2'
+
 _cached_video_count = {}
 
 def _post_url(username, type, query=None):
     if 'channels/' in username:
         username = username.replace('channels/', 'channel/')
-    return 'http://vimeo.com/api/v2/%s/%s.json%s' % (username, type,
-                                                     query and '?%s' % query or
-                                                     '')
+    return '%s/%s/%s.json%s' % (API_URL, username, type,
+                                query and '?%s' % query or '')
 
 def video_count(parsed_feed):
     if not parsed_feed.feed.get('generator', '').endswith('Vimeo'):
@@ -39,7 +41,17 @@ def video_count(parsed_feed):
     return count
 
 
-def bulk_import(parsed_feed):
+def _fetch_videos(url):
+    response = open_url_while_lying_about_agent(url)
+    if response.getcode() != 200:
+        return None
+    data = response.read()
+    if not data:
+        return None
+    return [feedparser_dict(_json_to_feedparser(video))
+            for video in simplejson.loads(data)]
+
+def bulk_import(parsed_feed, start_page=0, max_pages=None):
     match = USERNAME_RE.search(parsed_feed.feed.link)
     username = match.group('name')
     if parsed_feed.feed.link in _cached_video_count:
@@ -47,25 +59,19 @@ def bulk_import(parsed_feed):
     else:
         count = video_count(parsed_feed)
     post_url = _post_url(username, match.group('type') or 'videos', 'page=%i')
-    parsed_feed = feedparser.FeedParserDict(parsed_feed.copy())
-    parsed_feed.entries = []
-    for i in range(1, int(math.ceil(count / 20.0)) + 1):
-        response = open_url_while_lying_about_agent(post_url % i)
-        if response.getcode() != 200:
-            break
-        data = response.read()
-        if not data:
-            break
-        json_data = simplejson.loads(data)
-        for video in json_data:
-            parsed_feed.entries.append(feedparser_dict(
-                    _json_to_feedparser(video)))
+
+    def page_url(page):
+        return post_url % (page + 1)
+
+    feed = util.import_pages(parsed_feed, page_url,
+                             int(math.ceil((count or 0) / 20.0)),
+                             _fetch_videos, start_page, max_pages)
 
     # clean up cache
     if parsed_feed.feed.link in _cached_video_count:
         del _cached_video_count[parsed_feed.feed.link]
 
-    return parsed_feed
+    return feed
 
 def feedparser_dict(obj):
     if isinstance(obj, dict):
@@ -0,0 +1,246 @@
+# Copyright 2009 - Participatory Culture Foundation
+#
+# This file is part of vidscraper.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import BaseHTTPServer
+import SocketServer
+import threading
+import time
+import unittest
+import urllib2
+
+import feedparser
+import mock
+import simplejson
+
+from vidscraper.tests import org_parse
+from vidscraper.bulk_import import opensearch, util
+from vidscraper.bulk_import import vimeo as bulk_vimeo
+
+OPENSEARCH_PAGE = """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"
+      xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+  <title>Test Feed</title>
+  <link rel="alternate" href="http://example.com/"/>
+  <opensearch:totalResults>%(total)i</opensearch:totalResults>
+  <opensearch:startIndex>%(start)i</opensearch:startIndex>
+  <opensearch:itemsPerPage>%(per_page)i</opensearch:itemsPerPage>
+  %(entries)s
+</feed>
+"""
+
+OPENSEARCH_ENTRY = """<entry>
+    <id>http://example.com/videos/%(id)i</id>
+    <title>Video %(id)i</title>
+    <link rel="alternate" href="http://example.com/videos/%(id)i"/>
+  </entry>"""
+
+def opensearch_page(total, start, per_page, ids):
+    entries = '\n  '.join(OPENSEARCH_ENTRY % {'id': i} for i in ids)
+    return OPENSEARCH_PAGE % {'total': total, 'start': start,
+                              'per_page': per_page, 'entries': entries}
+
+def vimeo_video(id):
+    return {
+        'id': str(id),
+        'title': 'Video %i' % id,
+        'description': 'Description %i' % id,
+        'url': 'http://vimeo.com/%i' % id,
+        'upload_date': '2012-01-01 12:00:00',
+        'tags': 'foo, bar',
+        'user_name': 'Test User',
+        'user_url': 'http://vimeo.com/testuser',
+        'thumbnail_medium': 'http://example.com/%i.jpg' % id,
+    }
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight,
+                                       server.in_flight)
+        try:
+            time.sleep(server.delay)
+            body = server.pages.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/xml')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           StubHandler)
+        self.pages = {}
+        self.requests = []
+        self.delay = 0
+        self.lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+
+    def url(self, path):
+        return 'http://127.0.0.1:%i%s' % (self.server_address[1], path)
+
+
+class BulkImportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        # the package setup() replaces feedparser.parse with a version that
+        # reads from testdata; we want to hit the stub server
+        self.patch = mock.patch('feedparser.parse', org_parse)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_opensearch_pages(self):
+        # 25 videos, 10 per page.  The 2nd page overlaps with the 1st, like
+        # when a video gets added while paging
+        self.server.pages.update({
+            '/feed': opensearch_page(25, 1, 10, range(1, 11)),
+            '/feed?start-index=1': opensearch_page(25, 1, 10, range(1, 11)),
+            '/feed?start-index=11': opensearch_page(25, 11, 10,
+                                                    range(10, 21)),
+            '/feed?start-index=21': opensearch_page(25, 21, 10,
+                                                    range(21, 26)),
+        })
+        return feedparser.parse(self.server.url('/feed'))
+
+    def titles(self, feed):
+        return [entry.title for entry in feed.entries]
+
+    def test_opensearch(self):
+        parsed_feed = self.add_opensearch_pages()
+        self.assertEquals(opensearch.video_count(parsed_feed), 25)
+        feed = opensearch.bulk_import(parsed_feed)
+        self.assertEquals(self.titles(feed),
+                          ['Video %i' % i for i in range(1, 26)])
+        self.assertEquals(feed.next_page, None)
+
+    def test_resume(self):
+        parsed_feed = self.add_opensearch_pages()
+        feed = opensearch.bulk_import(parsed_feed, max_pages=2)
+        self.assertEquals(self.titles(feed),
+                          ['Video %i' % i for i in range(1, 21)])
+        self.assertEquals(feed.next_page, 2)
+        feed = opensearch.bulk_import(parsed_feed, start_page=feed.next_page)
+        self.assertEquals(self.titles(feed),
+                          ['Video %i' % i for i in range(21, 26)])
+        self.assertEquals(feed.next_page, None)
+
+    def test_failed_page(self):
+        parsed_feed = self.add_opensearch_pages()
+        page = self.server.pages.pop('/feed?start-index=11')
+        feed = opensearch.bulk_import(parsed_feed)
+        # we should stop at the failed page, even though the one after it
+        # worked
+        self.assertEquals(self.titles(feed),
+                          ['Video %i' % i for i in range(1, 11)])
+        self.assertEquals(feed.next_page, 1)
+        self.server.pages['/feed?start-index=11'] = page
+        feed = opensearch.bulk_import(parsed_feed, start_page=feed.next_page)
+        self.assertEquals(self.titles(feed),
+                          ['Video %i' % i for i in range(10, 26)])
+        self.assertEquals(feed.next_page, None)
+
+    def test_open_ended(self):
+        # we think there's 2 pages, but there's actually 3
+        for page in range(3):
+            ids = range(page * 10 + 1, page * 10 + 11)
+            self.server.pages['/feed?page=%i' % (page + 1)] = (
+                opensearch_page(30, 1, 10, ids))
+        self.server.pages['/feed?page=4'] = opensearch_page(30, 1, 10, [])
+        parsed_feed = feedparser.parse(self.server.url('/feed?page=1'))
+
+        def page_url(page):
+            return self.server.url('/feed?page=%i' % (page + 1))
+
+        feed = util.import_pages(parsed_feed, page_url, 2, util.parse_entries,
+                                 open_ended=True,
+                                 known_pages={0: parsed_feed.entries})
+        self.assertEquals(self.titles(feed),
+                          ['Video %i' % i for i in range(1, 31)])
+        self.assertEquals(feed.next_page, None)
+        # we had the 1st page already
+        self.assertEquals(self.server.requests.count('/feed?page=1'), 1)
+
+    def test_bounded_concurrency(self):
+        self.server.delay = 0.05
+        for i in range(10):
+            self.server.pages['/page/%i' % i] = str(i)
+
+        def fetch(url):
+            return urllib2.urlopen(url).read()
+
+        urls = [self.server.url('/page/%i' % i) for i in range(10)]
+        results = util.fetch_pages(urls, fetch, workers=3)
+        self.assertEquals(results, [(str(i), None) for i in range(10)])
+        self.assertEquals(sorted(self.server.requests),
+                          sorted('/page/%i' % i for i in range(10)))
+        self.assert_(self.server.max_in_flight <= 3,
+                     self.server.max_in_flight)
+
+    def test_vimeo(self):
+        self.server.pages['/api/v2/testuser/info.json'] = simplejson.dumps({
+            'total_videos_uploaded': 45})
+        for page in range(3):
+            videos = [vimeo_video(i) for i in
+                      range(page * 20 + 1, min(page * 20 + 21, 46))]
+            self.server.pages['/api/v2/testuser/videos.json?page=%i' % (
+                page + 1)] = simplejson.dumps(videos)
+        parsed_feed = feedparser.FeedParserDict({
+            'feed': feedparser.FeedParserDict({
+                'link': 'http://vimeo.com/testuser',
+                'generator': 'Vimeo',
+            }),
+            'entries': [],
+        })
+        with mock.patch.object(bulk_vimeo, 'API_URL',
+                               self.server.url('/api/v2')):
+            self.assertEquals(bulk_vimeo.video_count(parsed_feed), 45)
+            feed = bulk_vimeo.bulk_import(parsed_feed)
+        self.assertEquals(self.titles(feed),
+                          ['Video %i' % i for i in range(1, 46)])
+        self.assertEquals(feed.next_page, None)
@@ -7,12 +7,15 @@ import django.db.backends.mysql.base
 from debug_toolbar.middleware import DebugToolbarMiddleware
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.urlresolvers import resolve, Resolver404
 from django.core.validators import validate_ipv4_address
 from django.db.backends.mysql.base import CursorWrapper as _CursorWrapper
 from django.utils.cache import patch_vary_headers
 from django.utils.hashcompat import sha_constructor
 from django.utils.http import cookie_date
 
+from auth import activity
+from utils import instrumentation
 from utils.metrics import ManualTimer, Meter, Timer
 
 
@@ -25,16 +28,18 @@ SECTIONS = {
 
 
 class SaveUserIp(object):
+    """Record the IP address and last seen time of authenticated users.
+
+    The DB writes happen in the background, see auth.activity.
+    """
     def process_request(self, request):
         if request.user.is_authenticated():
             ip = request.META.get('REMOTE_ADDR', '')
             try:
                 validate_ipv4_address(ip)
-                if request.user.last_ip != ip:
-                    request.user.last_ip = ip
-                    request.user.save()
             except ValidationError:
-                pass
+                ip = None
+            activity.record(request.user, ip)
 
 class ResponseTimeMiddleware(object):
     """Middleware for recording response times.
@@ -94,6 +99,38 @@ class ResponseTimeMiddleware(object):
 
         return response
 
+class OperationCountMiddleware(object):
+    """Middleware for counting DB queries and cache operations.
+
+    The counts get reported to Riemann using the URL name of the view (see
+    utils.instrumentation).  Requests that don't resolve to a named URL are
+    counted, but not reported.
+
+    This should go right after ResponseTimeMiddleware in settings.py so that
+    it sees the operations for the other middleware as well.
+    """
+    def process_request(self, request):
+        request._operation_stats = instrumentation.start('requests')
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.url_name:
+            if match.namespace:
+                name = '%s:%s' % (match.namespace, match.url_name)
+            else:
+                name = match.url_name
+            instrumentation.set_name(name)
+        return None
+
+    def process_response(self, request, response):
+        if hasattr(request, '_operation_stats'):
+            instrumentation.finish()
+        return response
+
 class P3PHeaderMiddleware(object):
     def process_response(self, request, response):
         response['P3P'] = settings.P3P_COMPACT
@@ -89,6 +89,8 @@ CSS_USE_COMPILED = True
 
 COMPRESS_YUI_BINARY = "java -jar ./css-compression/yuicompressor-2.4.6.jar"
 COMPRESS_OUTPUT_DIRNAME = "static-cache"
+# compile_media keeps compiled bundles here, keyed by a hash of their inputs
+COMPRESS_BUILD_CACHE_DIR = os.path.join("/tmp", "static-build-cache")
 
 
 USER_LANGUAGES_COOKIE_NAME = 'unisub-languages-cookie'
@@ -353,6 +355,7 @@ TEMPLATE_LOADERS = (
 
 MIDDLEWARE_CLASSES = (
     'middleware.ResponseTimeMiddleware',
+    'middleware.OperationCountMiddleware',
     'middleware.StripGoogleAnalyticsCookieMiddleware',
     'utils.ajaxmiddleware.AjaxErrorMiddleware',
     'localeurl.middleware.LocaleURLMiddleware',
@@ -440,8 +443,13 @@ INSTALLED_APPS = (
 
 STARTUP_MODULES = [
     'externalsites.signalhandlers',
+    'utils.instrumentation',
 ]
 
+# Maps URL names/celery task names to the maximum number of DB queries and
+# cache operations they should make.  See utils.instrumentation.
+OPERATION_BUDGETS = {}
+
 # Celery settings
 
 # import djcelery
@@ -916,6 +924,11 @@ LOGGING = {
             'handlers': ['console'],
             'propagate': False
         },
+        'instrumentation': {
+            'level': 'WARNING',
+            'handlers': ['sentry', 'console'],
+            'propagate': False
+        },
     },
 }
 
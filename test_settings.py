@@ -36,6 +36,7 @@ DEFAULT_PROTOCOL = 'https'
 TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
 NOSE_PLUGINS = ['utils.test_utils.UnisubsTestPlugin']
 CELERY_ALWAYS_EAGER = True
+BUFFERED_WRITER_SYNCHRONOUS = True
 
 # Use MD5 password hashing, other algorithms are purposefully slow to increase
 # security.  Also include the SHA1 hasher since some of the tests use it.
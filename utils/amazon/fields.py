@@ -2,31 +2,106 @@ from StringIO import StringIO
 from hashlib import sha1
 from time import time
 from uuid import uuid4
+import math
 import os
 
 from boto.s3.connection import S3Connection
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db import models
 from django.db.models.fields.files import FieldFile
+from django.db.models.loading import get_model
 from easy_thumbnails.processors import scale_and_crop
 from south.modelsinspector import add_introspection_rules
 from PIL import Image
 
 THUMB_SIZES = getattr(settings, 'THUMBNAILS_SIZE', ())
+# How long to wait for a thumbnail job before scheduling another one for an
+# image with missing thumbnails.
+THUMBNAIL_PENDING_TIMEOUT = 60 * 60
+
+def _pending_key(name):
+    return 'thumbnails-pending:%s' % sha1(name.encode('utf-8')).hexdigest()
+
+def _decode_image(image, sizes):
+    """Decode an image so that it can be used for all thumbnail sizes.
+
+    For JPEGs, the decoder can scale the image down while decoding it, which
+    is a lot faster than decoding the full image.  We let it scale down as
+    long as the result is still big enough for the largest thumbnail.
+    """
+    width, height = image.size
+    if width and height and sizes:
+        scale = max(max(float(w) / width, float(h) / height)
+                    for (w, h) in sizes)
+        if scale < 1:
+            image.draft(image.mode, (int(math.ceil(width * scale)),
+                                     int(math.ceil(height * scale))))
+    image.load()
+    if image.mode not in ('RGB', 'L'):
+        # we save the thumbnails as JPEGs
+        image = image.convert('RGB')
+    return image
+
+def create_thumbnails(app_label, model_name, field_name, name):
+    """Create the thumbnails for an image stored in a S3EnabledImageField.
+
+    This is what the generate_thumbnails task runs.  We only need the file
+    name, so we don't have to fetch the object that the image belongs to.
+    """
+    field = get_model(app_label, model_name)._meta.get_field(field_name)
+    field.attr_class(None, field, name).recreate_all_thumbnails()
 
 class S3ImageFieldFile(FieldFile):
     def thumb_url(self, width, height):
+        """Get the URL for a thumbnail of the image.
+
+        Thumbnails get created in the background.  If the image was just
+        saved on this instance, this returns the URL of the original image
+        instead.  We don't check anything for other instances, since pages
+        can render a lot of thumbnails and the job usually finishes before
+        anyone loads them.
+        """
         if not self.name:
             return ''
 
+        if self.thumbnails_pending():
+            return self.storage.url(self.name)
+
         size = (width, height)
         name = self._get_thumbnail_name(size)
 
         if not settings.USE_AMAZON_S3 and not self.storage.exists(name):
-            self._create_thumbnail(self._open_image(), size)
+            if cache.get(_pending_key(self.name)) is None:
+                self.schedule_thumbnails()
+            return self.storage.url(self.name)
         return self.storage.url(name)
 
+    def thumbnails_pending(self):
+        """Check if we scheduled the thumbnails for this image.
+
+        This only knows about the thumbnails scheduled for our instance, so it
+        doesn't need any I/O.
+        """
+        pending = getattr(self.instance, '_pending_thumbnails', ())
+        return self.name in pending
+
+    def schedule_thumbnails(self):
+        """Create the thumbnails for the image in a celery task."""
+        from utils.tasks import generate_thumbnails
+
+        if self.instance is not None:
+            if not hasattr(self.instance, '_pending_thumbnails'):
+                self.instance._pending_thumbnails = set()
+            self.instance._pending_thumbnails.add(self.name)
+        # this stops thumb_url() from scheduling the job again for missing
+        # thumbnails
+        cache.set(_pending_key(self.name), True, THUMBNAIL_PENDING_TIMEOUT)
+        opts = self.field.model._meta
+        generate_thumbnails.delay(opts.app_label, opts.object_name,
+                                  self.field.name, self.name)
+
     def _open_image(self):
         content = self.storage.open(self.name).read()
         return Image.open(StringIO(content))
@@ -50,10 +125,14 @@ class S3ImageFieldFile(FieldFile):
     def recreate_all_thumbnails(self):
         """Recreate thumbnails for each size for our field's thumb_sizes """
         self._create_all_thumbnails(self._open_image())
+        cache.delete(_pending_key(self.name))
 
     def _create_all_thumbnails(self, image):
-        """Create thumbnails for each size for our field's thumb_sizes """
+        """Create thumbnails for each size for our field's thumb_sizes
 
+        The image only gets decoded once for all of the sizes.
+        """
+        image = _decode_image(image, self.field.thumb_sizes)
         for size in self.field.thumb_sizes:
             self._create_thumbnail(image, size)
 
@@ -86,8 +165,7 @@ class S3ImageFieldFile(FieldFile):
         self._size = len(content)
         self._committed = True
 
-        content.seek(0)
-        self._create_all_thumbnails(Image.open(content))
+        self.schedule_thumbnails()
 
         # Save the object because it has changed, unless save is False
         if save:
@@ -106,6 +184,7 @@ class S3ImageFieldFile(FieldFile):
         for size in self.field.thumb_sizes:
             name = self._get_thumbnail_name(size)
             self.storage.delete(name)
+        cache.delete(_pending_key(self.name))
 
         self.name = None
         setattr(self.instance, self.field.name, self.name)
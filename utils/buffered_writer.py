@@ -0,0 +1,137 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""utils.buffered_writer -- Write data to the DB in the background.
+
+Some writes happen so often that doing them inside the request is too
+expensive, but it's okay if they happen a few seconds late (or get lost if
+the process dies).  BufferedWriter handles this case.  Calling add() stores the
+item in memory, then a background thread periodically calls write() with
+everything that has been added since the last flush.
+
+The buffer is bounded.  Once it holds max_size items, new items get dropped
+and counted in a metric named "<name>.dropped".
+
+If the BUFFERED_WRITER_SYNCHRONOUS setting is True, add() calls write()
+right away.  The test settings use this so that tests don't have to deal with
+background threads.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_connection, transaction
+
+from utils.metrics import Meter
+
+logger = logging.getLogger('buffered_writer')
+
+FLUSH_INTERVAL = getattr(settings, 'BUFFERED_WRITER_FLUSH_INTERVAL', 10)
+SYNCHRONOUS = getattr(settings, 'BUFFERED_WRITER_SYNCHRONOUS', False)
+
+class BufferedWriter(object):
+    """Buffer items in memory and write them to the DB in the background.
+
+    Subclasses must implement write().  By default items are buffered in a
+    list.  Subclasses can override new_batch() and add_to_batch() to use a
+    different container, for example to merge items with the same key.
+    """
+    max_size = 10000
+
+    def __init__(self, name, flush_interval=None, synchronous=None):
+        self.name = name
+        if flush_interval is None:
+            flush_interval = FLUSH_INTERVAL
+        if synchronous is None:
+            synchronous = SYNCHRONOUS
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self.dropped = 0
+        self.batch = self.new_batch()
+        atexit.register(self.flush)
+
+    def new_batch(self):
+        return []
+
+    def add_to_batch(self, batch, item):
+        batch.append(item)
+
+    def write(self, batch):
+        """Write a batch of items to the DB."""
+        raise NotImplementedError()
+
+    def add(self, item):
+        """Add an item to the buffer.
+
+        Returns True if the item was added and False if it was dropped because
+        the buffer was full.
+        """
+        if self.synchronous:
+            batch = self.new_batch()
+            self.add_to_batch(batch, item)
+            self.write(batch)
+            return True
+        with self.lock:
+            self._ensure_thread()
+            if len(self.batch) >= self.max_size:
+                self.dropped += 1
+                Meter('%s.dropped' % self.name).inc()
+                return False
+            self.add_to_batch(self.batch, item)
+        return True
+
+    def flush(self):
+        """Write all buffered items now."""
+        with self.lock:
+            batch = self.batch
+            self.batch = self.new_batch()
+        if not batch:
+            return
+        try:
+            self.write(batch)
+            transaction.commit_unless_managed()
+        except Exception:
+            logger.error('Error writing %s items', self.name, exc_info=True)
+            transaction.rollback_unless_managed()
+
+    def _ensure_thread(self):
+        if self.pid == os.getpid():
+            return
+        # first call or we're in a forked child.  Either way, anything in the
+        # buffer belongs to the parent, so drop it.
+        self.pid = os.getpid()
+        self.batch = self.new_batch()
+        self.thread = threading.Thread(target=self._run,
+                                       name='%s-writer' % self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            # The DB connections belong to this thread.  Close them rather
+            # than letting them sit idle until the next flush.
+            close_connection()
@@ -16,11 +16,96 @@
 # You should have received a copy of the GNU Affero General Public License along
 # with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
 
-from itertools import chain
-from django.core.paginator import Paginator
+"""utils.chunkediter -- Iterate over large querysets in chunks.
 
+chunkediter() used to page through querysets with a Paginator.  That means a
+COUNT(*) query, then a LIMIT/OFFSET query for each chunk.  The database has
+to skip over all of the rows before the offset, so walking a big table gets
+slower with every chunk.
+
+keyset_iter() walks a queryset by a unique, ordered column (the primary key
+by default) instead:
+
+    SELECT ... WHERE id > <last id> ORDER BY id LIMIT <chunk_size>
+
+Each chunk is an index range scan, no matter how far into the table we are,
+and we only keep 1 chunk in memory at a time.
+"""
+
+from django.db.models.query import QuerySet
+
+def _chunk_filter(key, last_value):
+    if key.startswith('-'):
+        return {'%s__lt' % key[1:]: last_value}
+    else:
+        return {'%s__gt' % key: last_value}
+
+def keyset_chunks(queryset, chunk_size=200, key='pk', select_related=None,
+                  prefetch=None):
+    """Iterate over a queryset in chunks, ordered by key.
+
+    key must be a unique field of the model.  Prefix it with "-" to walk the
+    table in descending order.  Any ordering already on the queryset is
+    replaced.
+
+    select_related is a list of relations to pass to select_related().
+    prefetch is a function that gets called with each chunk (a list of
+    objects) before it's returned, which can be used to fetch related data
+    for the whole chunk at once.
+
+    Yields lists of objects.
+    """
+    queryset = queryset.order_by(key)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    attr = key.lstrip('-')
+    last_value = None
+    while True:
+        if last_value is None:
+            qs = queryset
+        else:
+            qs = queryset.filter(**_chunk_filter(key, last_value))
+        chunk = list(qs[:chunk_size])
+        if not chunk:
+            return
+        if prefetch is not None:
+            prefetch(chunk)
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_value = getattr(chunk[-1], attr)
+
+def keyset_iter(queryset, chunk_size=200, key='pk', select_related=None,
+                prefetch=None):
+    """Iterate over the objects in a queryset, fetching them in chunks.
+
+    See keyset_chunks() for the arguments.
+    """
+    for chunk in keyset_chunks(queryset, chunk_size, key, select_related,
+                               prefetch):
+        for obj in chunk:
+            yield obj
+
+def _sliced_iter(objects, chunk_size):
+    start = 0
+    while True:
+        chunk = list(objects[start:start+chunk_size])
+        for obj in chunk:
+            yield obj
+        if len(chunk) < chunk_size:
+            return
+        start += chunk_size
 
 def chunkediter(objects, chunk_size=200):
-    pages = Paginator(objects, chunk_size)
-    return chain.from_iterable(pages.page(i).object_list
-                               for i in pages.page_range)
+    """Iterate over objects, fetching chunk_size of them at a time.
+
+    Querysets without an explicit order_by() get walked by primary key with
+    keyset_iter().  For querysets that were ordered some other way we have to
+    keep their order, so we fall back to slicing them (same for querysets that
+    were already sliced).  objects can also be a list or any other sliceable
+    sequence.
+    """
+    if (isinstance(objects, QuerySet) and not objects.query.order_by and
+        objects.query.can_filter()):
+        return keyset_iter(objects, chunk_size)
+    return _sliced_iter(objects, chunk_size)
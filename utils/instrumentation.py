@@ -0,0 +1,276 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""utils.instrumentation -- Count DB queries and cache operations.
+
+This module wraps the DB cursor and the default cache backend so that we can
+count how many queries and cache operations a unit of work (a request or a
+celery task) makes.  The counts are kept in thread-local OperationStats
+objects:
+
+    - start(kind, name) starts counting for a unit of work
+    - finish() stops counting, reports the stats and returns them
+
+Units of work can be nested (for example a benchmark that makes requests with
+the test client).  The counts for the inner unit also get added to the outer
+one when it finishes.
+
+The stats are sent to Riemann as histograms named after the URL name or the
+task name.  You can also set budgets for individual URLs/tasks in the
+OPERATION_BUDGETS setting, for example:
+
+    OPERATION_BUDGETS = {
+        'videos:video': {'queries': 40, 'cache_ops': 20},
+        'videos.tasks.video_changed_tasks': {'queries': 100},
+    }
+
+If a unit of work goes over its budget, we log a warning.
+
+Call install() once to start instrumenting.  It happens at startup since this
+module is listed in STARTUP_MODULES.
+"""
+
+import logging
+import threading
+import time
+
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends import BaseDatabaseWrapper
+
+from utils.metrics import Histogram
+
+logger = logging.getLogger('instrumentation')
+
+_local = threading.local()
+_installed = False
+_MISSING = object()
+
+class OperationStats(object):
+    """Counts for a single unit of work."""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_gets = 0
+        self.cache_get_keys = 0
+        self.cache_hits = 0
+        self.cache_sets = 0
+        self.cache_deletes = 0
+
+    @property
+    def cache_ops(self):
+        return self.cache_gets + self.cache_sets + self.cache_deletes
+
+    @property
+    def cache_hit_ratio(self):
+        if not self.cache_get_keys:
+            return None
+        return float(self.cache_hits) / self.cache_get_keys
+
+    def add(self, other):
+        """Add the counts from another OperationStats object to ours."""
+        for attr in ('queries', 'query_time', 'cache_gets', 'cache_get_keys',
+                     'cache_hits', 'cache_sets', 'cache_deletes'):
+            setattr(self, attr, getattr(self, attr) + getattr(other, attr))
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+def current():
+    """Get the OperationStats for the current unit of work.
+
+    Returns None if we aren't inside one.
+    """
+    stack = _stack()
+    if stack:
+        return stack[-1]
+    else:
+        return None
+
+def start(kind, name=None):
+    """Start counting operations.
+
+    kind is the type of work we're doing ("requests" or "tasks").  name
+    identifies it and can also be set later by calling set_name().  If name is
+    None when we finish, the stats won't get reported.
+    """
+    stats = OperationStats(kind, name)
+    _stack().append(stats)
+    return stats
+
+def set_name(name):
+    stats = current()
+    if stats is not None:
+        stats.name = name
+
+def finish():
+    """Stop counting operations, report the stats and return them."""
+    stack = _stack()
+    if not stack:
+        return None
+    stats = stack.pop()
+    if stack:
+        stack[-1].add(stats)
+    if stats.name is not None:
+        report(stats)
+        check_budget(stats)
+    return stats
+
+def report(stats):
+    prefix = '%s.%s' % (stats.kind, stats.name)
+    Histogram(prefix + '.db-queries').record(stats.queries)
+    Histogram(prefix + '.db-query-time').record(stats.query_time)
+    Histogram(prefix + '.cache-gets').record(stats.cache_gets)
+    Histogram(prefix + '.cache-sets').record(stats.cache_sets)
+    Histogram(prefix + '.cache-deletes').record(stats.cache_deletes)
+    if stats.cache_hit_ratio is not None:
+        Histogram(prefix + '.cache-hit-ratio').record(stats.cache_hit_ratio)
+
+def check_budget(stats):
+    budgets = getattr(settings, 'OPERATION_BUDGETS', {})
+    budget = budgets.get(stats.name)
+    if not budget:
+        return
+    for key in ('queries', 'cache_ops'):
+        if key in budget and getattr(stats, key) > budget[key]:
+            logger.warn('%s %s over budget: %s %s (budget: %s)',
+                        stats.kind, stats.name, getattr(stats, key), key,
+                        budget[key])
+
+class InstrumentedCursor(object):
+    """Wraps a DB cursor to count the queries executed with it."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def _record(self, start, count):
+        stats = current()
+        if stats is not None:
+            stats.queries += count
+            stats.query_time += (time.time() - start) * 1000
+
+    def execute(self, sql, params=()):
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self._record(start, 1)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self._record(start, len(param_list))
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+class _CacheWrapper(object):
+    """Wraps the methods of the default cache to count operations.
+
+    Backends often implement methods using other methods (for example
+    get_many() calling get() for each key), we only count the outermost call.
+    """
+    def __init__(self):
+        self.depth = threading.local()
+
+    def wrap(self, method, record):
+        def wrapper(*args, **kwargs):
+            depth = getattr(self.depth, 'value', 0)
+            self.depth.value = depth + 1
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.depth.value = depth
+            stats = current()
+            if depth == 0 and stats is not None:
+                record(stats, result, *args, **kwargs)
+            return result
+        return wrapper
+
+    def wrap_get(self, method):
+        # call get() with our own default so that we can tell hits from misses
+        def get(key, version=None):
+            return method(key, _MISSING, version=version)
+        def record(stats, value, *args, **kwargs):
+            stats.cache_gets += 1
+            stats.cache_get_keys += 1
+            if value is not _MISSING:
+                stats.cache_hits += 1
+        counted_get = self.wrap(get, record)
+        def wrapper(key, default=None, version=None):
+            value = counted_get(key, version=version)
+            if value is _MISSING:
+                return default
+            return value
+        return wrapper
+
+    def install(self, cache):
+        def record_get_many(stats, result, keys, *args, **kwargs):
+            stats.cache_gets += 1
+            stats.cache_get_keys += len(keys)
+            stats.cache_hits += len(result)
+        def record_set(stats, result, *args, **kwargs):
+            stats.cache_sets += 1
+        def record_delete(stats, result, *args, **kwargs):
+            stats.cache_deletes += 1
+
+        cache.get = self.wrap_get(cache.get)
+        cache.get_many = self.wrap(cache.get_many, record_get_many)
+        for name in ('set', 'set_many', 'add', 'incr', 'decr'):
+            setattr(cache, name, self.wrap(getattr(cache, name), record_set))
+        for name in ('delete', 'delete_many'):
+            setattr(cache, name, self.wrap(getattr(cache, name),
+                                           record_delete))
+
+def _instrumented_cursor(original_cursor):
+    def cursor(self):
+        return InstrumentedCursor(original_cursor(self))
+    return cursor
+
+def _on_task_prerun(sender=None, task=None, **kwargs):
+    start('tasks', task.name)
+
+def _on_task_postrun(sender=None, task=None, **kwargs):
+    finish()
+
+def install():
+    """Start instrumenting the DB cursor and the cache."""
+    global _installed
+    if _installed:
+        return
+    BaseDatabaseWrapper.cursor = _instrumented_cursor(
+        BaseDatabaseWrapper.cursor)
+    _CacheWrapper().install(cache)
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
+    _installed = True
+
+install()
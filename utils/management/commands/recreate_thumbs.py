@@ -16,39 +16,71 @@
 # along with this program.  If not, see 
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from optparse import make_option
+
 from django.core.management.base import BaseCommand, CommandError
 from django.db.models.loading import get_model
 
+from utils.tasks import generate_thumbnails
+
 class Command(BaseCommand):
     args = '<app name> <model_name> <field_name>'
     help = u'Recreate thumbnails'
-    CHUNK_SIZE =25 # max number of objects to select at once
-    
-    def handle(self, *args, **kwargs):
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=500,
+                    help='Number of objects to fetch at once'),
+        make_option('--async', dest='async', action='store_true',
+                    default=False,
+                    help='Create the thumbnails in celery tasks'),
+    )
+
+    def handle(self, *args, **options):
         if len(args) != 3:
             raise CommandError("Usage: recreate_thumbs <app name> "
                                "<model_name> field_name>")
         Model = get_model(args[0], args[1])
+        if Model is None:
+            raise CommandError("Unknown model: %s.%s" % (args[0], args[1]))
         field_name = args[2]
+        field = Model._meta.get_field(field_name)
+        opts = Model._meta
+        verbosity = int(options.get('verbosity', 1))
 
+        # We only need the file names, so just fetch those instead of the
+        # full objects
+        qs = (Model.objects.filter(**{"%s__isnull" % field_name: False})
+              .exclude(**{field_name: ''}).order_by('id'))
         last_id = None
+        count = 0
         while True:
-            qs = Model.objects.filter(**{
-                "%s__isnull" % field_name: False,
-            }).order_by('id')
+            chunk = qs
             if last_id is not None:
-                qs = qs.filter(id__gt=last_id)
-
-            found_obj = False
-            for obj in qs[:self.CHUNK_SIZE]:
-                found_obj = True
-                last_id = obj.id
+                chunk = chunk.filter(id__gt=last_id)
+            rows = list(chunk.values_list('id', field_name)
+                        [:options['chunk_size']])
+            if not rows:
+                break
+            for obj_id, name in rows:
+                if options['async']:
+                    generate_thumbnails.delay(opts.app_label,
+                                              opts.object_name, field_name,
+                                              name)
+                    continue
                 try:
-                    getattr(obj, field_name).recreate_all_thumbnails()
+                    field.attr_class(None, field, name).recreate_all_thumbnails()
                 except StandardError, e:
                     self.stdout.write("Error recreating thumbnails for "
-                                      "%s: %s\n" % (obj, e))
+                                      "%s %s: %s\n" % (opts.object_name,
+                                                        obj_id, e))
                 else:
-                    self.stdout.write("Recreated thumbnails for %s\n" % (obj,))
-            if not found_obj:
-                break
+                    count += 1
+            last_id = rows[-1][0]
+            if verbosity >= 1:
+                if options['async']:
+                    self.stdout.write("Queued thumbnails up to %s %s\n" % (
+                        opts.object_name, last_id))
+                else:
+                    self.stdout.write("Recreated thumbnails up to %s %s "
+                                      "(%s done)\n" % (opts.object_name,
+                                                        last_id, count))
@@ -16,7 +16,12 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+import atexit
+import math
+import os
+import random
 import socket
+import threading
 import time as _time
 from contextlib import contextmanager
 from functools import wraps
@@ -80,22 +85,120 @@ def find_branch():
 
 BRANCH = find_branch()
 
-def send(service, tag, metric=None):
-    data = {
-        'host': HOST + BRANCH,
-        'service': service,
-        'tags': [tag, ENV_TAG]
-    }
-
-    if metric:
-        data['metric'] = metric
-
-    if ENABLED:
+# How often to flush aggregated metrics to Riemann, in seconds.
+FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+# Max number of samples to keep for each timer/histogram between flushes.
+# After this we switch to reservoir sampling.
+MAX_SAMPLES = 1000
+PERCENTILES = (50, 95, 99)
+
+def percentile(sorted_values, p):
+    """Get the p-th percentile from a sorted list using the nearest-rank
+    method."""
+    index = int(math.ceil(p / 100.0 * len(sorted_values))) - 1
+    return sorted_values[min(max(index, 0), len(sorted_values) - 1)]
+
+class Aggregator(object):
+    """Aggregates metrics in-process and sends them to Riemann in batches.
+
+    Recording a metric only takes a lock and updates a dict, so it's cheap to
+    do on the request path.  A background thread flushes the aggregated values
+    every FLUSH_INTERVAL seconds:
+
+        - meters send the total for the interval
+        - occurrences send the number of times they were marked
+        - gauges send the last value reported
+        - timers and histograms send their count, max and percentiles, as
+          separate services (for example "response-time.p95")
+
+    The background thread gets started lazily, and restarted if we notice that
+    we've forked (celery workers do this).
+    """
+    def __init__(self, client, flush_interval=FLUSH_INTERVAL):
+        self.client = client
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self._reset()
+
+    def _reset(self):
+        self.counts = {}
+        self.gauges = {}
+        self.samples = {}
+
+    def _ensure_thread(self):
+        if self.pid == os.getpid():
+            return
+        # first call or we're in a forked child.  Either way, any data we have
+        # was recorded by the parent, so drop it.
+        self.pid = os.getpid()
+        self._reset()
+        self.thread = threading.Thread(target=self._run,
+                                       name='metrics-flusher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            _time.sleep(self.flush_interval)
+            self.flush()
+
+    def add(self, service, tag, metric=None):
+        with self.lock:
+            self._ensure_thread()
+            key = (service, tag)
+            if tag in ('timer', 'histogram'):
+                samples = self.samples.setdefault(key, [0, []])
+                samples[0] += 1
+                if len(samples[1]) < MAX_SAMPLES:
+                    samples[1].append(metric)
+                else:
+                    i = random.randint(0, samples[0] - 1)
+                    if i < MAX_SAMPLES:
+                        samples[1][i] = metric
+            elif tag == 'gauge':
+                self.gauges[key] = metric
+            else:
+                if metric is None:
+                    metric = 1
+                self.counts[key] = self.counts.get(key, 0) + metric
+
+    def flush(self):
+        with self.lock:
+            counts, gauges, samples = self.counts, self.gauges, self.samples
+            self._reset()
+        for (service, tag), value in counts.items():
+            self._send(service, tag, value)
+        for (service, tag), value in gauges.items():
+            self._send(service, tag, value)
+        for (service, tag), (count, values) in samples.items():
+            values.sort()
+            self._send(service + '.count', tag, count)
+            self._send(service + '.max', tag, values[-1])
+            for p in PERCENTILES:
+                self._send('%s.p%s' % (service, p), tag,
+                           percentile(values, p))
+
+    def _send(self, service, tag, metric):
+        data = {
+            'host': HOST + BRANCH,
+            'service': service,
+            'tags': [tag, ENV_TAG],
+            'metric': metric,
+        }
         try:
-            c.send(data)
+            self.client.send(data)
         except:
             pass
 
+aggregator = Aggregator(c)
+atexit.register(aggregator.flush)
+
+def send(service, tag, metric=None):
+    if ENABLED:
+        aggregator.add(service, tag, metric)
+
 
 class Metric(object):
     def __init__(self, name):
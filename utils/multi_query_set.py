@@ -1,30 +1,52 @@
-from django.db.models import ObjectDoesNotExist
+"""utils.multi_query_set -- Concatenate querysets for paginated listings.
 
-from teams.models import TeamVideo
+MultiQuerySet makes several querysets (or haystack SearchQuerySets) look like
+a single one to Paginator.  It never evaluates a whole part just to get a
+page out of it:
+
+    - count() is the sum of a COUNT query for each part.  The counts are
+      cached, so each part only gets counted once.
+    - Slices get translated into a LIMIT/OFFSET slice of each part that
+      overlaps them.  Parts before the slice are skipped using their counts,
+      parts after it don't get queried at all.
+
+The prefetch argument is a function that gets called with the list of items
+for each slice, which can be used to fetch related data for a page with a
+constant number of queries.
+"""
 
 
 class MultiQuerySet(object):
-    def __init__(self, *args, **kwargs):
-        self.querysets = args
+    def __init__(self, *querysets, **kwargs):
+        self.querysets = querysets
+        self.prefetch = kwargs.pop('prefetch', None)
+        if kwargs:
+            raise TypeError("unexpected keyword arguments: %s" %
+                            ', '.join(kwargs))
         self._count = None
+        self._part_counts = {}
+
+    def _part_count(self, index):
+        if index not in self._part_counts:
+            self._part_counts[index] = self.querysets[index].count()
+        return self._part_counts[index]
 
     def count(self):
-        if not self._count:
-            """ this can be an expensive calculation. try to set_count first
-            if there's a cheaper way to determine the count. """
-            self._count = sum(qs.count() for qs in self.querysets)
+        if self._count is None:
+            self._count = sum(self._part_count(i)
+                              for i in xrange(len(self.querysets)))
         return self._count
 
     def set_count(self, count):
         self._count = count
 
     def _clone(self):
-        mqs = MultiQuerySet(*self.querysets)
-        mqs.set_count(self.count())
+        mqs = self.__class__(*self.querysets, prefetch=self.prefetch)
+        mqs._count = self._count
+        mqs._part_counts = self._part_counts.copy()
         return mqs
 
     def __len__(self):
-        """ expensive. try not to call. """
         return self.count()
 
     def __iter__(self):
@@ -32,165 +54,46 @@ class MultiQuerySet(object):
             for item in qs.all():
                 yield item
 
-    def __getitem__(self, item):
-        if isinstance(item, (int, long)):
-            offset, stop = item, item + 1
-        else: # slice
-            offset, stop = item.start, item.stop
+    def _fetch(self, start, stop):
+        """Get the items from start to stop, across all of the parts."""
         items = []
-        total_len = stop - offset
-        for qs in self.querysets:
-            if len(qs) < offset:
-                offset -= len(qs)
-            else:
-                items += list(qs[offset:stop])
-                if len(items) >= total_len:
-                    break
-                else:
-                    offset = 0
-                    stop = total_len - len(items)
+        offset = start
+        for i, qs in enumerate(self.querysets):
+            wanted = stop - start - len(items)
+            if wanted <= 0:
+                break
+            if offset > 0:
+                count = self._part_count(i)
+                if offset >= count:
+                    offset -= count
                     continue
-        return items[:total_len]
-
-class MultyQuerySet(object):
-    """
-    Proxy-object for few QuerySet to be used in Paginator.
-    Support only QuerySets for same model.
-    """
-
-    def __init__(self, *args):
-        self.lists = args
-        self.model = self.lists[0].model
-
-        self._obj_ids = []
-        self._cache = {}
-
-        for l in self.lists:
-            self._obj_ids.extend(l.values_list('pk', flat=True))
-
-    def __len__(self):
-        return len(self._obj_ids)
-
-    def __getitem__(self, k):
-        if not isinstance(k, (slice, int, long)):
-            raise TypeError
-
-        cache_key = k
-        if isinstance(k, slice):
-            cache_key = '%s:%s:%s' % (k.start, k.stop, k.step)
-
-        try:
-            return self._cache[cache_key]
-        except KeyError:
-            pass
-
-        val = None
-
-        if isinstance(k, (int, long)):
-            try:
-                val = id._model._default_manager.get(pk=id)
-            except ObjectDoesNotExist:
-                pass
-        else:
-            ids = self._obj_ids[k]
-            qs = self.get_objects_qs(ids)
-            result = dict((obj.pk, obj) for obj in qs)
-            val = []
-            for id in ids:
-                val.append(result[id])
-
-        self._cache[cache_key] = val
-        return val
-
-    def _clone(self):
-        return self
+            items.extend(qs[offset:offset+wanted])
+            offset = 0
+        return items
 
-    def get_objects_qs(self, ids):
-        return self.model._default_manager.filter(pk__in=ids)
+    def _run_prefetch(self, items):
+        if self.prefetch is not None:
+            self.prefetch(items)
+        return items
 
-class TeamMultyQuerySet(object):
-    def __init__(self, *args):
-        self.lists = args
-        self._cache = {}
-
-    def get_qs_count(self, qs):
-        if not hasattr(qs, '_length'):
-            qs._length = qs.count()
-        return qs._length
-
-    def __len__(self):
-        if not hasattr(self, '_length'):
-            self._length = sum([self.get_qs_count(qs) for qs in self.lists])
-        return self._length
-
-    def __getitem__(self, k):
-        #support only [n] or [n:m], not [:m] or [n:]
-        if not isinstance(k, (slice, int, long)):
-            raise TypeError
-
-        cache_key = k
-        if isinstance(k, slice):
-            cache_key = '%s:%s:%s' % (k.start, k.stop, k.step)
-
-        try:
-            return self._cache[cache_key]
-        except KeyError:
-            pass
-
-        val = None
-
-        if isinstance(k, (int, long)):
-            list_sum = 0
-            for qs in self.lists:
-                if k < list_sum + self.get_qs_count(qs):
-                    cur_index =  list_sum - k
-                    val = qs.all()[ k - list_sum ]
-                    break
-                list_sum += self.get_qs_count(qs)
+    def __getitem__(self, item):
+        if isinstance(item, (int, long)):
+            if item < 0:
+                item += self.count()
+            items = self._fetch(item, item + 1) if item >= 0 else []
+            if not items:
+                raise IndexError("MultiQuerySet index out of range")
+            return self._run_prefetch(items)[0]
+        elif isinstance(item, slice):
+            if item.step not in (None, 1):
+                raise ValueError("MultiQuerySet doesn't support steps")
+            start, stop = item.start, item.stop
+            if start is None or start < 0 or stop is None or stop < 0:
+                # we need the count to resolve the slice
+                start, stop, step = item.indices(self.count())
+            if stop <= start:
+                return []
+            return self._run_prefetch(self._fetch(start, stop))
         else:
-            selected = []
-
-            k_start = k.start #because readonly
-            k_stop = k.stop #because readonly
-
-            number = k.stop-k.start
-
-            cur_index = 0
-            qs_list = []
-            for i, qs in enumerate(self.lists):
-                if k_start < (cur_index+self.get_qs_count(qs)):
-                    qs_list = self.lists[i:]
-                    break
-                cur_index += self.get_qs_count(qs)
-
-            k_start -= cur_index
-            k_stop = k_start+number
-
-            for qs in qs_list:
-                tl = qs[k_start:k_stop]
-                selected.extend(tl)
-                k_start = 0
-                k_stop = number - len(selected)
-                if k_stop <= 0:
-                    break
-
-            val = []
-            videos = []
-            for obj in selected:
-                if hasattr(obj, "team_video") and obj.team_video_id not in videos:
-                    videos.append(obj.team_video_id)
-                    val.append(obj.team_video)
-                elif isinstance(obj, TeamVideo) and obj.id not in videos:
-                    videos.append(obj.id)
-                    val.append(obj)
-
-        self._cache[cache_key] = val
-        if val is None:
-            raise StopIteration
-        return val
-
-    def _clone(self):
-        return self
-
-    def get_objects_qs(self, ids):
-        return self.model._default_manager.filter(pk__in=ids)
+            raise TypeError("MultiQuerySet indices must be integers or "
+                            "slices")
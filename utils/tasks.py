@@ -27,3 +27,8 @@ def send_templated_email_async(to, subject, body_template, body_dict,
     return send_templated_email(
         to,subject, body_template, body_dict, from_email=None, ct="html",
         fail_silently=False, check_user_preference=check_user_preference)
+
+@task
+def generate_thumbnails(app_label, model_name, field_name, name):
+    from utils.amazon.fields import create_thumbnails
+    create_thumbnails(app_label, model_name, field_name, name)
@@ -4,3 +4,7 @@ from utils.tests.chunkediter import *
 from utils.tests.bleech import *
 from utils.tests.compress import *
 from utils.tests.multiqueryset import *
+from utils.tests.instrumentation import *
+from utils.tests.metrics import *
+from utils.tests.buffered_writer import *
+from utils.tests.thumbnails import *
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.test import TestCase
+
+from utils.buffered_writer import BufferedWriter
+
+class ListWriter(BufferedWriter):
+    max_size = 3
+
+    def __init__(self, *args, **kwargs):
+        super(ListWriter, self).__init__(*args, **kwargs)
+        self.written = []
+
+    def write(self, batch):
+        self.written.append(batch)
+
+class BufferedWriterTest(TestCase):
+    def test_buffering(self):
+        writer = ListWriter('test', flush_interval=3600, synchronous=False)
+        writer.add(1)
+        writer.add(2)
+        self.assertEquals(writer.written, [])
+        writer.flush()
+        self.assertEquals(writer.written, [[1, 2]])
+        # flushing an empty buffer shouldn't call write()
+        writer.flush()
+        self.assertEquals(writer.written, [[1, 2]])
+
+    def test_bounded(self):
+        writer = ListWriter('test', flush_interval=3600, synchronous=False)
+        for i in xrange(5):
+            writer.add(i)
+        self.assertEquals(writer.dropped, 2)
+        writer.flush()
+        self.assertEquals(writer.written, [[0, 1, 2]])
+
+    def test_synchronous(self):
+        writer = ListWriter('test', synchronous=True)
+        writer.add(1)
+        self.assertEquals(writer.written, [[1]])
@@ -17,9 +17,12 @@
 # along with this program. If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from datetime import datetime, timedelta
+
 from django.test import TestCase
 
-from utils.chunkediter import chunkediter
+from auth.models import Announcement
+from utils.chunkediter import chunkediter, keyset_chunks, keyset_iter
 
 class ChunkedIterTest(TestCase):
     def test_iterate(self):
@@ -52,3 +55,62 @@ class ChunkedIterTest(TestCase):
         for i in chunkediter(data, 1):
             sum += i
         self.assertEqual(sum, 0)
+
+class KeysetIterTest(TestCase):
+    def setUp(self):
+        now = datetime.now()
+        # create the announcements so that the default ordering (-created)
+        # is different from the primary key order
+        self.announcements = [
+            Announcement.objects.create(content='announcement %s' % i,
+                                        created=now - timedelta(days=i),
+                                        hidden=bool(i % 3 == 0))
+            for i in xrange(10)
+        ]
+        self.ids = [a.id for a in self.announcements]
+
+    def test_keyset_iter(self):
+        for chunk_size in (1, 3, 5, 10, 20):
+            self.assertEqual([a.id for a in keyset_iter(
+                Announcement.objects.all(), chunk_size)], self.ids)
+
+    def test_filter(self):
+        qs = Announcement.objects.filter(hidden=False)
+        self.assertEqual([a.id for a in keyset_iter(qs, 2)],
+                         [a.id for a in self.announcements if not a.hidden])
+
+    def test_descending(self):
+        self.assertEqual([a.id for a in keyset_iter(
+            Announcement.objects.all(), 3, key='-pk')],
+            list(reversed(self.ids)))
+
+    def test_queries(self):
+        # 1 query per chunk, plus 1 to find out that the last full chunk was
+        # the last one
+        with self.assertNumQueries(3):
+            list(keyset_iter(Announcement.objects.all(), 5))
+        with self.assertNumQueries(3):
+            list(keyset_iter(Announcement.objects.all(), 4))
+        with self.assertNumQueries(0):
+            list(chunkediter(self.announcements, 4))
+
+    def test_chunks(self):
+        chunks = list(keyset_chunks(Announcement.objects.all(), 4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+    def test_prefetch(self):
+        prefetched = []
+        def prefetch(chunk):
+            prefetched.append([a.id for a in chunk])
+        list(keyset_iter(Announcement.objects.all(), 4, prefetch=prefetch))
+        self.assertEqual(prefetched,
+                         [self.ids[:4], self.ids[4:8], self.ids[8:]])
+
+    def test_chunkediter_queryset(self):
+        # unordered querysets get walked by primary key
+        self.assertEqual([a.id for a in chunkediter(
+            Announcement.objects.all(), 3)], self.ids)
+        # explicit orderings are kept
+        qs = Announcement.objects.order_by('created')
+        self.assertEqual([a.id for a in chunkediter(qs, 3)],
+                         list(reversed(self.ids)))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.core.cache import cache
+from django.test import TestCase
+import mock
+
+from auth.models import CustomUser as User
+from utils import instrumentation
+
+class InstrumentationTest(TestCase):
+    def test_count_queries(self):
+        instrumentation.start('test')
+        list(User.objects.all())
+        User.objects.count()
+        stats = instrumentation.finish()
+        self.assertEquals(stats.queries, 2)
+        self.assertEquals(instrumentation.current(), None)
+
+    def test_count_cache_operations(self):
+        cache.set('instrumentation-test', 1)
+        instrumentation.start('test')
+        self.assertEquals(cache.get('instrumentation-test'), 1)
+        self.assertEquals(cache.get('instrumentation-missing', 2), 2)
+        cache.get_many(['instrumentation-test', 'instrumentation-missing'])
+        cache.set('instrumentation-test', 3)
+        cache.delete('instrumentation-test')
+        stats = instrumentation.finish()
+        self.assertEquals(stats.cache_gets, 3)
+        self.assertEquals(stats.cache_sets, 1)
+        self.assertEquals(stats.cache_deletes, 1)
+        self.assertEquals(stats.cache_ops, 5)
+        self.assertEquals(stats.cache_hit_ratio, 0.5)
+
+    def test_nesting(self):
+        instrumentation.start('outer')
+        User.objects.count()
+        instrumentation.start('inner')
+        User.objects.count()
+        inner = instrumentation.finish()
+        outer = instrumentation.finish()
+        self.assertEquals(inner.queries, 1)
+        self.assertEquals(outer.queries, 2)
+
+    @mock.patch('utils.instrumentation.logger')
+    def test_budget(self, logger):
+        budgets = {'test-view': {'queries': 1}}
+        with self.settings(OPERATION_BUDGETS=budgets):
+            instrumentation.start('requests', 'test-view')
+            User.objects.count()
+            instrumentation.finish()
+            self.assertEquals(logger.warn.call_count, 0)
+            instrumentation.start('requests', 'test-view')
+            User.objects.count()
+            User.objects.count()
+            instrumentation.finish()
+            self.assertEquals(logger.warn.call_count, 1)
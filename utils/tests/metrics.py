@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.test import TestCase
+import mock
+
+from utils.metrics import Aggregator, MAX_SAMPLES
+
+class AggregatorTest(TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.aggregator = Aggregator(self.client, flush_interval=3600)
+
+    def sent_metrics(self):
+        return dict((call[0][0]['service'], call[0][0]['metric'])
+                    for call in self.client.send.call_args_list)
+
+    def test_flush(self):
+        self.aggregator.add('requests', 'meter', 1)
+        self.aggregator.add('requests', 'meter', 2)
+        self.aggregator.add('errors', 'occurrence')
+        self.aggregator.add('errors', 'occurrence')
+        self.aggregator.add('queue', 'gauge', 5)
+        self.aggregator.add('queue', 'gauge', 3)
+        for ms in xrange(1, 101):
+            self.aggregator.add('response-time', 'timer', ms)
+        # nothing should be sent until we flush
+        self.assertEquals(self.client.send.call_count, 0)
+        self.aggregator.flush()
+        self.assertEquals(self.sent_metrics(), {
+            'requests': 3,
+            'errors': 2,
+            'queue': 3,
+            'response-time.count': 100,
+            'response-time.max': 100,
+            'response-time.p50': 50,
+            'response-time.p95': 95,
+            'response-time.p99': 99,
+        })
+        # flushing again should send nothing new
+        self.client.send.reset_mock()
+        self.aggregator.flush()
+        self.assertEquals(self.client.send.call_count, 0)
+
+    def test_samples_are_bounded(self):
+        for i in xrange(MAX_SAMPLES * 2):
+            self.aggregator.add('response-time', 'timer', i)
+        count, samples = self.aggregator.samples['response-time', 'timer']
+        self.assertEquals(count, MAX_SAMPLES * 2)
+        self.assertEquals(len(samples), MAX_SAMPLES)
@@ -114,4 +114,41 @@ class MultiQuerySetTest(TestCase):
                          list(mqs[3:7]),
                          "MQS[3:7] (out-of-bounds endpoint) failed.")
 
-
+    def test_count(self):
+        count = Video.objects.count()
+        mqs = MultiQuerySet(Video.objects.all(), Video.objects.none(),
+                            Video.objects.all())
+        # 1 COUNT query per part, then it's cached
+        with self.assertNumQueries(2):
+            self.assertEqual(mqs.count(), count * 2)
+            self.assertEqual(len(mqs), count * 2)
+
+    def test_slice_queries(self):
+        count = Video.objects.count()
+        qs = list(Video.objects.all()) * 2
+        mqs = MultiQuerySet(Video.objects.all(), Video.objects.all())
+        # slices in the first part don't need to count anything
+        with self.assertNumQueries(1):
+            self.assertEqual(list(mqs[0:1]), qs[0:1])
+        # slices that start in the second part count the first part, then
+        # only query the second part
+        with self.assertNumQueries(2):
+            self.assertEqual(list(mqs[count:count+1]), qs[count:count+1])
+        # slices that span parts query both of them
+        with self.assertNumQueries(2):
+            self.assertEqual(list(mqs[1:count+1]), qs[1:count+1])
+
+    def test_index(self):
+        qs = list(Video.objects.all()) * 2
+        mqs = MultiQuerySet(Video.objects.all(), Video.objects.all())
+        for i in xrange(len(qs)):
+            self.assertEqual(mqs[i], qs[i])
+        self.assertEqual(mqs[-1], qs[-1])
+        self.assertRaises(IndexError, lambda: mqs[len(qs)])
+
+    def test_prefetch(self):
+        pages = []
+        mqs = MultiQuerySet(Video.objects.all(), Video.objects.all(),
+                            prefetch=pages.append)
+        page = mqs[1:3]
+        self.assertEqual(pages, [page])
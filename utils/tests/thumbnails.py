@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase
+from PIL import Image
+import mock
+
+from auth.models import CustomUser as User
+from utils import test_factories
+from utils.amazon.fields import S3ImageFieldFile, create_thumbnails
+
+def make_image_file(size=(400, 300), format='PNG'):
+    data = StringIO()
+    Image.new('RGB', size, 'red').save(data, format=format)
+    return ContentFile(data.getvalue())
+
+class ThumbnailTest(TestCase):
+    def setUp(self):
+        self.field = User._meta.get_field('picture')
+        self.old_storage = self.field.storage
+        self.media_dir = tempfile.mkdtemp()
+        self.field.storage = FileSystemStorage(location=self.media_dir,
+                                               base_url='/media/')
+        self.user = test_factories.create_user()
+
+    def tearDown(self):
+        self.field.storage = self.old_storage
+        shutil.rmtree(self.media_dir)
+
+    def thumbnail_names(self):
+        return [self.user.picture._get_thumbnail_name(size)
+                for size in self.field.thumb_sizes]
+
+    def storage_has(self, name):
+        return self.field.storage.exists(name)
+
+    def save_picture(self, format='PNG'):
+        self.user.picture.save('picture.%s' % format.lower(),
+                               make_image_file(format=format))
+
+    @mock.patch('utils.tasks.generate_thumbnails')
+    def test_save_schedules_thumbnails(self, mock_task):
+        self.save_picture()
+        picture = self.user.picture
+        self.assertTrue(self.storage_has(picture.name))
+        # saving only stores the original
+        for name in self.thumbnail_names():
+            self.assertFalse(self.storage_has(name))
+        mock_task.delay.assert_called_once_with(
+            'auth', 'CustomUser', 'picture', picture.name)
+        # until the thumbnails exist, we use the original image
+        self.assertEquals(picture.thumb_url(100, 100),
+                          self.field.storage.url(picture.name))
+
+        create_thumbnails(*mock_task.delay.call_args[0])
+        for name in self.thumbnail_names():
+            self.assertTrue(self.storage_has(name))
+        picture = User.objects.get(pk=self.user.pk).picture
+        self.assertEquals(picture.thumb_url(100, 100),
+                          self.field.storage.url(
+                              picture._get_thumbnail_name((100, 100))))
+
+    def test_thumb_url_doesnt_use_cache(self):
+        self.save_picture()
+        picture = User.objects.get(pk=self.user.pk).picture
+        with mock.patch('utils.amazon.fields.cache') as mock_cache:
+            self.assertEquals(picture.thumb_url(100, 100),
+                              self.field.storage.url(
+                                  picture._get_thumbnail_name((100, 100))))
+        self.assertFalse(mock_cache.get.called)
+
+    def test_thumbnail_sizes(self):
+        # celery runs the task right away in the tests
+        self.save_picture(format='JPEG')
+        for size in self.field.thumb_sizes:
+            name = self.user.picture._get_thumbnail_name(size)
+            image = Image.open(self.field.storage.open(name))
+            self.assertEquals(image.size, size)
+            self.assertEquals(image.format, 'JPEG')
+
+    def test_single_decode(self):
+        with mock.patch.object(S3ImageFieldFile, '_open_image',
+                               autospec=True,
+                               side_effect=S3ImageFieldFile._open_image) as (
+                                   open_image):
+            self.save_picture()
+        self.assertEquals(open_image.call_count, 1)
+        for name in self.thumbnail_names():
+            self.assertTrue(self.storage_has(name))
+
+    @mock.patch('utils.tasks.generate_thumbnails')
+    def test_missing_thumbnail(self, mock_task):
+        self.user.picture.name = self.field.storage.save(
+            'pictures/picture.png', make_image_file())
+        picture = self.user.picture
+        # we shouldn't create the thumbnail while handling the request
+        self.assertEquals(picture.thumb_url(100, 100),
+                          self.field.storage.url(picture.name))
+        self.assertEquals(mock_task.delay.call_count, 1)
+        for name in self.thumbnail_names():
+            self.assertFalse(self.storage_has(name))
+        # the job is pending, so we shouldn't schedule another one
+        picture.thumb_url(100, 100)
+        self.assertEquals(mock_task.delay.call_count, 1)
+
+    def test_delete(self):
+        self.save_picture()
+        names = [self.user.picture.name] + self.thumbnail_names()
+        self.user.picture.delete()
+        for name in names:
+            self.assertFalse(self.storage_has(name))
+
+    def test_recreate_thumbs_command(self):
+        self.save_picture()
+        for name in self.thumbnail_names():
+            self.field.storage.delete(name)
+        call_command('recreate_thumbs', 'auth', 'CustomUser', 'picture',
+                     verbosity=0)
+        for name in self.thumbnail_names():
+            self.assertTrue(self.storage_has(name))
+
+    @mock.patch('utils.tasks.generate_thumbnails')
+    def test_recreate_thumbs_command_async(self, mock_task):
+        self.save_picture()
+        mock_task.reset_mock()
+        call_command('recreate_thumbs', 'auth', 'CustomUser', 'picture',
+                     async=True, verbosity=0)
+        mock_task.delay.assert_called_once_with(
+            'auth', 'CustomUser', 'picture', self.user.picture.name)